@@ -8,6 +8,7 @@ import torch.nn as nn
 import torch.onnx
 import numpy as np
 import pickle
+import copy
 import gan.discriminator_model as discriminator
 import gan.judge_model as judge
 import gan.data as data
@@ -17,6 +18,10 @@ import env_settings
 from metrics import metrics_handler
 import output_handler
 import dataset.gan_load_dataset as dataset
+from dataset.options import add_data_arguments, vocab_limits_from_args
+from dataset.shards import distributed_rank, rank_file
+from accumulation import GradientAccumulator
+from precision import FLOAT32, autocast, delta_report
 
 parser = argparse.ArgumentParser(description='PyTorch RNN/LSTM classification Model')
 parser.add_argument('--data', type=str, default=os.getcwd()+'/ag_news_csv/',
@@ -41,6 +46,9 @@ parser.add_argument('--epochs', type=int, default=400,
                     help='upper epoch limit')
 parser.add_argument('--batch_size', type=int, default=4, metavar='N',
                     help='batch size')
+parser.add_argument('--eval_batch_size', type=int, default=64,
+                    help='batch size of the validation and test passes')
+add_data_arguments(parser)
 parser.add_argument('--bptt', type=int, default=35,
                     help='sequence length')
 parser.add_argument('--dropout_em', type=float, default=0.5,
@@ -73,6 +81,11 @@ parser.add_argument('--output_file', type=str,
                     default='~/fake-news-master/results/gan-glove_specific.txt', help='metrics output file')
 
 args = parser.parse_args()
+vocab_limits = vocab_limits_from_args(args, parser)
+tokenizer = None
+if args.subword:
+    from dataset.subword import SubwordTokenizer
+    tokenizer = SubwordTokenizer(args.subword)
 
 # create the directory to save model if the directory is not exist
 if not os.path.exists(args.save):
@@ -91,7 +104,12 @@ if torch.cuda.is_available():
         print("WARNING: You have a CUDA device, so you should probably run with --cuda")
 
 metrics_handler.metricsHandler = metrics_handler.MetricsHandler()
-output_handler.outputFileHandler = output_handler.OutputHandler(args.output_file)
+# in a distributed job every rank trains a model of its own and logs its metrics to a file of its own
+output_handler.outputFileHandler = output_handler.OutputHandler(rank_file(args.output_file))
+output_handler.outputFileHandler.write(f'Length policy: {args.length_policy}\n')
+output_handler.outputFileHandler.write(f'Vocabulary limits: {vocab_limits}\n')
+output_handler.outputFileHandler.write(f'Tokenizer: {tokenizer or "words"}\n')
+output_handler.outputFileHandler.write(f'Precision: {args.precision}\n')
 
 ###############################################################################
 # Build the model
@@ -99,17 +117,13 @@ output_handler.outputFileHandler = output_handler.OutputHandler(args.output_file
 dis_learning_rate = args.lr
 judge_learning_rate = args.lr
 
-def cycle(iterable):
-    while True:
-        for x in iterable:
-            yield x
+ntokens, embedding_vectors, labeled_train_loader, unlabeled_train_loader, valid_loader, test_loader, labeled_data_length, unlabeled_data_length, valid_length, test_length = dataset.load(args.embedding, batch_size=args.batch_size, eval_batch_size=args.eval_batch_size, max_tokens=args.max_tokens, num_workers=args.num_workers, policy=args.length_policy, limits=vocab_limits, tokenizer=tokenizer)
+# the loaders batch by length, so count batches rather than dividing the number of examples by the batch size
+labeled_batches, unlabeled_batches = len(labeled_train_loader), len(unlabeled_train_loader)
 
-ntokens, embedding_vectors, labeled_train_loader, unlabeled_train_loader, valid_loader, test_loader, labeled_data_length, unlabeled_data_length, valid_length, test_length = dataset.load(args.embedding, batch_size=args.batch_size)
-
-labeled_train_loader = iter(cycle(labeled_train_loader))
-unlabeled_train_loader = iter(cycle(unlabeled_train_loader))
-valid_loader = iter(cycle(valid_loader))
-test_loader = iter(cycle(test_loader))
+# the training loaders never run out, iterate them once so their workers keep prefetching across epochs
+labeled_train_loader = iter(labeled_train_loader)
+unlabeled_train_loader = iter(unlabeled_train_loader)
 
 discriminator = discriminator.RNNModel(args.model, ntokens, args.emsize, args.nhid,
                        args.nlayers, args.nclass, embedding_vectors, args.dropout_em, 
@@ -145,33 +159,37 @@ def one_hot_embedding(labels, num_classes):
     return y[labels]
 
 
-def dis_pre_train_step():
-    discriminator.train()
+def clip_gradient(model):
+    # `clip_grad_norm` helps prevent the exploding gradient problem in RNNs / LSTMs.
+    torch.nn.utils.clip_grad_norm_(model.parameters(), args.clip)
+
+def labeled_batch():
     lab_batch = next(labeled_train_loader)
     lab_token_seqs = lab_batch.content[0]
     lab_seq_lengths = np.array([len(seq) for seq in lab_token_seqs])
     labels = lab_batch.label
     lab_token_seqs = torch.from_numpy(np.transpose(lab_token_seqs.numpy())).cuda(env_settings.CUDA_DEVICE)
     labels = torch.from_numpy(np.transpose(labels.numpy())).cuda(env_settings.CUDA_DEVICE)
-    num_lab_sample = lab_token_seqs.shape[1]
-    lab_hidden = discriminator.init_hidden(num_lab_sample)
-    lab_output = discriminator(lab_token_seqs, lab_hidden, lab_seq_lengths)
-    lab_element_loss = criterion(lab_output, labels)
-    lab_loss = torch.mean(lab_element_loss)
-    # Before the backward pass, use the optimizer object to zero all of the
-    # gradients for the variables it will update (which are the learnable
-    # weights of the model). This is because by default, gradients are
-    # accumulated in buffers( i.e, not overwritten) whenever .backward()
-    # is called.
-    dis_optimizer.zero_grad()
-
-    lab_loss.backward()
+    return lab_token_seqs, lab_seq_lengths, labels
 
-    # `clip_grad_norm` helps prevent the exploding gradient problem in RNNs / LSTMs.
-    torch.nn.utils.clip_grad_norm_(discriminator.parameters(), args.clip)
-    dis_optimizer.step()
+def dis_pre_train_step():
+    discriminator.train()
+    # the gradients of --accumulation_steps batches are summed, then averaged and clipped before the step
+    accumulator = GradientAccumulator(dis_optimizer, discriminator, args.accumulation_steps, clip=clip_gradient)
+    total_loss = 0
+    for _ in range(args.accumulation_steps):
+        lab_token_seqs, lab_seq_lengths, labels = labeled_batch()
+        num_lab_sample = lab_token_seqs.shape[1]
+        lab_hidden = discriminator.init_hidden(num_lab_sample)
+        with autocast(args.precision, lab_token_seqs.device):
+            lab_output = discriminator(lab_token_seqs, lab_hidden, lab_seq_lengths)
+        # the losses and their gradients are computed in float32
+        lab_element_loss = criterion(lab_output.float(), labels)
+        lab_loss = torch.mean(lab_element_loss)
+        accumulator.backward(lab_loss, num_lab_sample)
+        total_loss += lab_loss.item()
 
-    return lab_loss
+    return total_loss / args.accumulation_steps
 
 def repackage_hidden(h):
     """Wraps hidden states in new Tensors, to detach them from their history."""
@@ -185,24 +203,21 @@ def adv_train_step(judge_only=True):
     judger.train()
 
     # {token_seqs, next_token_seqs, importance_seqs, labels, seq_lengths, pad_length}
-    # Sample m labeled instances from DL
-    lab_batch = next(labeled_train_loader)
-    lab_token_seqs = lab_batch.content[0]
-    lab_seq_lengths = np.array([len(seq) for seq in lab_token_seqs])
-    labels = lab_batch.label
-    lab_token_seqs = torch.from_numpy(np.transpose(lab_token_seqs.numpy())).cuda(env_settings.CUDA_DEVICE)
-    labels = torch.from_numpy(np.transpose(labels.numpy())).cuda(env_settings.CUDA_DEVICE)
-    num_lab_sample = lab_token_seqs.shape[1]
-    
-    # Sample m labeled instances from DU and predict their corresponding label
-    unl_batch = next(unlabeled_train_loader)
-    unl_token_seqs = unl_batch.content[0]
-    unl_seq_lengths = np.array([len(seq) for seq in unl_token_seqs])
-    unl_token_seqs = torch.from_numpy(np.transpose(unl_token_seqs.numpy())).cuda(env_settings.CUDA_DEVICE)
-    num_unl_sample = unl_token_seqs.shape[1]
-    unl_hidden = discriminator.init_hidden(num_unl_sample)
-    unl_output = discriminator(unl_token_seqs, unl_hidden, unl_seq_lengths)
-    _, fake_labels = torch.max(unl_output, 1)
+    # Sample m labeled instances from DL and m unlabeled instances from DU and predict their corresponding label,
+    # --accumulation_steps times: the gradients of all of them are summed before every update
+    batches = []
+    for _ in range(args.accumulation_steps):
+        lab_token_seqs, lab_seq_lengths, labels = labeled_batch()
+        unl_batch = next(unlabeled_train_loader)
+        unl_token_seqs = unl_batch.content[0]
+        unl_seq_lengths = np.array([len(seq) for seq in unl_token_seqs])
+        unl_token_seqs = torch.from_numpy(np.transpose(unl_token_seqs.numpy())).cuda(env_settings.CUDA_DEVICE)
+        num_unl_sample = unl_token_seqs.shape[1]
+        unl_hidden = discriminator.init_hidden(num_unl_sample)
+        with autocast(args.precision, unl_token_seqs.device):
+            unl_output = discriminator(unl_token_seqs, unl_hidden, unl_seq_lengths)
+        _, fake_labels = torch.max(unl_output, 1)
+        batches.append((lab_token_seqs, lab_seq_lengths, labels, unl_token_seqs, unl_seq_lengths, fake_labels))
 
     if judge_only:
         k = 1
@@ -212,60 +227,65 @@ def adv_train_step(judge_only=True):
     for _k in range(k):
         # Update the judge model
         ###############################################################################
-        lab_judge_hidden = judger.init_hidden(num_lab_sample)
-        one_hot_label = one_hot_embedding(labels, args.nclass).cuda(env_settings.CUDA_DEVICE)  # one hot encoder
-        lab_judge_prob = judger(lab_token_seqs, lab_judge_hidden, lab_seq_lengths, one_hot_label)
-        lab_labeled = torch.ones(num_lab_sample).cuda(env_settings.CUDA_DEVICE)
-
-        unl_judge_hidden = judger.init_hidden(num_unl_sample)
-        one_hot_unl = one_hot_embedding(fake_labels, args.nclass).cuda(env_settings.CUDA_DEVICE)  # one hot encoder
-        unl_judge_prob = judger(unl_token_seqs, unl_judge_hidden, unl_seq_lengths, one_hot_unl)
-        unl_labeled = torch.zeros(num_unl_sample).cuda(env_settings.CUDA_DEVICE)
-        
-        if_labeled = torch.cat((lab_labeled, unl_labeled))
-        all_judge_prob = torch.cat((lab_judge_prob, unl_judge_prob))
-        all_judge_prob = all_judge_prob.view(-1)
-        judge_loss = criterion_judge(all_judge_prob, if_labeled)
-        judge_optimizer.zero_grad()
-
-        judge_loss.backward()
-
-        # `clip_grad_norm` helps prevent the exploding gradient problem in RNNs / LSTMs.
-        torch.nn.utils.clip_grad_norm_(judger.parameters(), args.clip)
-        judge_optimizer.step()
+        judge_accumulator = GradientAccumulator(judge_optimizer, judger, args.accumulation_steps, clip=clip_gradient)
+        judge_loss_value = 0.0
+        unl_judge_probs = []
+        for lab_token_seqs, lab_seq_lengths, labels, unl_token_seqs, unl_seq_lengths, fake_labels in batches:
+            num_lab_sample = lab_token_seqs.shape[1]
+            num_unl_sample = unl_token_seqs.shape[1]
+            lab_judge_hidden = judger.init_hidden(num_lab_sample)
+            one_hot_label = one_hot_embedding(labels, args.nclass).cuda(env_settings.CUDA_DEVICE)  # one hot encoder
+            with autocast(args.precision, lab_token_seqs.device):
+                lab_judge_prob = judger(lab_token_seqs, lab_judge_hidden, lab_seq_lengths, one_hot_label).float()
+            lab_labeled = torch.ones(num_lab_sample).cuda(env_settings.CUDA_DEVICE)
+
+            unl_judge_hidden = judger.init_hidden(num_unl_sample)
+            one_hot_unl = one_hot_embedding(fake_labels, args.nclass).cuda(env_settings.CUDA_DEVICE)  # one hot encoder
+            with autocast(args.precision, unl_token_seqs.device):
+                unl_judge_prob = judger(unl_token_seqs, unl_judge_hidden, unl_seq_lengths, one_hot_unl).float()
+            unl_labeled = torch.zeros(num_unl_sample).cuda(env_settings.CUDA_DEVICE)
+
+            if_labeled = torch.cat((lab_labeled, unl_labeled))
+            all_judge_prob = torch.cat((lab_judge_prob, unl_judge_prob))
+            all_judge_prob = all_judge_prob.view(-1)
+            judge_loss = criterion_judge(all_judge_prob, if_labeled)
+            judge_accumulator.backward(judge_loss, num_lab_sample + num_unl_sample)
+            judge_loss_value += judge_loss.item() / len(batches)
+            unl_judge_probs.append(repackage_hidden(unl_judge_prob))
 
         unl_loss_value = 0.0
         lab_loss_value = 0.0
-        fake_labels = repackage_hidden(fake_labels)
-        unl_judge_prob = repackage_hidden(unl_judge_prob)
         if not judge_only:
             # Update the predictor
             ###############################################################################
-            lab_hidden = discriminator.init_hidden(num_lab_sample)
-            lab_output = discriminator(lab_token_seqs, lab_hidden, lab_seq_lengths)
-            lab_element_loss = criterion(lab_output, labels)
-            lab_loss = torch.mean(lab_element_loss)
-
-            # calculate loss for unlabeled instances
-            unl_hidden = discriminator.init_hidden(num_unl_sample)
-            unl_output = discriminator(unl_token_seqs, unl_hidden, unl_seq_lengths)
-            unl_element_loss = criterion(unl_output, fake_labels)
-            unl_loss = unl_element_loss.dot(unl_judge_prob.view(-1))/num_unl_sample
-            # do not include this in version 1 
-            if _k<int(k/2):
-                lab_unl_loss = lab_loss+unl_loss
-            else:
-                lab_unl_loss = unl_loss
-            dis_optimizer.zero_grad()
-            lab_unl_loss.backward()
-            # `clip_grad_norm` helps prevent the exploding gradient problem in RNNs / LSTMs.
-            torch.nn.utils.clip_grad_norm_(discriminator.parameters(), args.clip)
-            dis_optimizer.step()
-            
-            unl_loss_value = unl_loss.item()
-            lab_loss_value = lab_loss.item()
-
-    return judge_loss, unl_loss_value, lab_loss_value
+            dis_accumulator = GradientAccumulator(dis_optimizer, discriminator, args.accumulation_steps, clip=clip_gradient)
+            for (lab_token_seqs, lab_seq_lengths, labels, unl_token_seqs, unl_seq_lengths, fake_labels), unl_judge_prob in zip(batches, unl_judge_probs):
+                num_lab_sample = lab_token_seqs.shape[1]
+                num_unl_sample = unl_token_seqs.shape[1]
+                lab_hidden = discriminator.init_hidden(num_lab_sample)
+                with autocast(args.precision, lab_token_seqs.device):
+                    lab_output = discriminator(lab_token_seqs, lab_hidden, lab_seq_lengths)
+                lab_element_loss = criterion(lab_output.float(), labels)
+                lab_loss = torch.mean(lab_element_loss)
+
+                # calculate loss for unlabeled instances
+                unl_hidden = discriminator.init_hidden(num_unl_sample)
+                with autocast(args.precision, unl_token_seqs.device):
+                    unl_output = discriminator(unl_token_seqs, unl_hidden, unl_seq_lengths)
+                unl_element_loss = criterion(unl_output.float(), fake_labels)
+                unl_loss = unl_element_loss.dot(unl_judge_prob.view(-1))/num_unl_sample
+                # do not include this in version 1 
+                if _k<int(k/2):
+                    lab_unl_loss = lab_loss+unl_loss
+                else:
+                    lab_unl_loss = unl_loss
+                # the loss is of two averages, so weighting it by the examples of the batches is exact when they are of equal size
+                dis_accumulator.backward(lab_unl_loss, num_lab_sample + num_unl_sample)
+
+                unl_loss_value += unl_loss.item() / len(batches)
+                lab_loss_value += lab_loss.item() / len(batches)
+
+    return judge_loss_value, unl_loss_value, lab_loss_value
 
 
 ###############################################################################
@@ -275,12 +295,12 @@ def adv_train_step(judge_only=True):
 def train(epoch=None, phase=None):
     # 1. pre_train discriminator.
     if phase == 'discriminator_only':#30
-        num_iter = labeled_data_length // args.batch_size
+        # every step takes --accumulation_steps batches
+        num_iter = math.ceil(labeled_batches / args.accumulation_steps)
         start_time = time.time()
         total_loss = 0
         for i_iter in range(num_iter):
-            dis_loss = dis_pre_train_step()
-            total_loss += dis_loss.item()
+            total_loss += dis_pre_train_step()
         elapsed = time.time() - start_time
         cur_loss = total_loss/num_iter
         print('Pre_train discriminator labeled_data only | epoch {:3d} | ms/batch {:5.2f} | '
@@ -295,14 +315,14 @@ def train(epoch=None, phase=None):
         else:
             judge_only = False
             current_process = 'Adv train: '
-        num_iter = unlabeled_data_length // args.batch_size
+        num_iter = math.ceil(unlabeled_batches / args.accumulation_steps)
         start_time = time.time()
         total_judge_loss = 0
         total_unl_loss = 0
         total_lab_loss = 0
         for i_iter in range(num_iter):
             judge_loss, unl_loss_value, lab_loss_value = adv_train_step(judge_only=judge_only)
-            total_judge_loss += judge_loss.item()
+            total_judge_loss += judge_loss
             total_unl_loss += unl_loss_value
             total_lab_loss += lab_loss_value
 
@@ -328,31 +348,41 @@ def train(epoch=None, phase=None):
 def evaluate(test=False):
     # Turn on evaluate mode which disables dropout.
     correct = 0
+    float32_correct = 0
     total = 0
+    # the float32 comparison doubles the cost of a pass, so only the test pass makes it
+    compare_float32 = test and args.precision != FLOAT32
     discriminator.eval()
     current_loader = valid_loader
-    current_length = valid_length
     if test:
         current_loader = test_loader
-        current_length = test_length
     with torch.no_grad():
-        for i_batch in range(current_length):
-            sample_batched = next(current_loader)
+        for sample_batched in current_loader:
             token_seqs = sample_batched.content[0]
             seq_lengths = np.array([len(seq) for seq in token_seqs])
             labels = sample_batched.label
             token_seqs = torch.from_numpy(np.transpose(token_seqs.numpy())).cuda(env_settings.CUDA_DEVICE)
             labels = torch.from_numpy(np.transpose(labels.numpy())).cuda(env_settings.CUDA_DEVICE)
             hidden = discriminator.init_hidden(token_seqs.shape[1])
-            output = discriminator(token_seqs, hidden, seq_lengths)
+            with autocast(args.precision, token_seqs.device):
+                output = discriminator(token_seqs, hidden, seq_lengths)
             _, predict_class = torch.max(output,1)
             total += labels.size(0)
             correct += (predict_class == labels).sum().item()
+            if compare_float32:
+                # the same batch in float32, to report what the lower precision costs in accuracy
+                _, float32_class = torch.max(discriminator(token_seqs, discriminator.init_hidden(token_seqs.shape[1]), seq_lengths), 1)
+                float32_correct += (float32_class == labels).sum().item()
 
             for i_metric in range(list(predict_class.size())[0]):
                 metrics_handler.metricsHandler.update((predict_class.data)[i_metric].item(), (labels.data)[i_metric].item())
+        # every rank of a distributed job evaluates its own model on its own shards
         test_acc = 100 * correct / total
         print('Accuracy of the classifier on the test data is : {:5.4f}'.format(test_acc))
+        if compare_float32:
+            report = delta_report(args.precision, correct, float32_correct, total)
+            print(report)
+            output_handler.outputFileHandler.write(report + '\n')
 
         if test:
             output_handler.outputFileHandler.write(f'Test Acc: {test_acc:.2f}%\n')
@@ -368,6 +398,38 @@ def evaluate(test=False):
 ###############################################################################
 # The learning process
 ###############################################################################
+rank = distributed_rank()[0]
+best_models = {}
+
+def save_best(name, obj):
+    # only rank 0 writes to args.save, the other ranks train models of their own and keep their best ones in memory
+    if rank == 0:
+        with open(os.path.join(args.save, name), 'wb') as f:
+            torch.save(obj, f)
+    else:
+        best_models[name] = copy.deepcopy(obj)
+
+def load_best(name):
+    if rank == 0:
+        return torch.load(os.path.join(args.save, name))
+    return copy.deepcopy(best_models[name])
+
+def save_checkpoint():
+    if rank != 0:
+        return
+    all_result_df.to_csv(result_file, index=False, header=True)
+    torch.save(
+        {'epoch': epoch,
+         'model_state_dict': discriminator.state_dict(),
+         'scheduler': dis_scheduler,
+         'optimizer': dis_optimizer.state_dict()
+         }, dis_resume_file)
+    torch.save(
+        {'model_state_dict': judger.state_dict(),
+         'scheduler': judge_scheduler,
+         'optimizer': judge_optimizer.state_dict()
+         }, judge_resume_file)
+
 epoch = 0
 dis_resume_file = os.path.join(resume, 'discriminator_checkpoint.pth.tar')
 judge_resume_file = os.path.join(resume, 'judger_checkpoint.pth.tar')
@@ -439,49 +501,33 @@ try:
         # Save the model if the validation loss is the best we've seen so far.
         if current_accuracy > best_accuracy and abs(current_accuracy - best_accuracy) > 0.001:
             best_accuracy = current_accuracy
-            with open(os.path.join(args.save, 'discriminator.pt'), 'wb') as f:
-                torch.save(discriminator, f)
-            with open(os.path.join(args.save, 'discriminator-optimizer.pt'), 'wb') as f:
-                torch.save(dis_optimizer, f)
-            with open(os.path.join(args.save, 'judger.pt'), 'wb') as f:
-                torch.save(judger, f)
-            with open(os.path.join(args.save, 'judger-optimizer.pt'), 'wb') as f:
-                torch.save(judge_optimizer, f)
+            save_best('discriminator.pt', discriminator)
+            save_best('discriminator-optimizer.pt', dis_optimizer)
+            save_best('judger.pt', judger)
+            save_best('judger-optimizer.pt', judge_optimizer)
             patience = patience_threshold
         
         if patience == 0:
             if phase == 'discriminator_only':
-                discriminator = torch.load(os.path.join(args.save, 'discriminator.pt'))
-                dis_optimizer = torch.load(os.path.join(args.save, 'discriminator-optimizer.pt'))
+                discriminator = load_best('discriminator.pt')
+                dis_optimizer = load_best('discriminator-optimizer.pt')
                 phase = 'judge_only'
                 patience = patience_threshold
             elif phase == 'judge_only':
-                judge = torch.load(os.path.join(args.save, 'judger.pt'))
-                judge_optimizer = torch.load(os.path.join(args.save, 'judger-optimizer.pt'))
+                judge = load_best('judger.pt')
+                judge_optimizer = load_best('judger-optimizer.pt')
                 phase = 'adversarial_training'
                 patience = patience_threshold
             else:
                 break
 
     metrics_handler.metricsHandler.reset()
-    discriminator = torch.load(os.path.join(args.save, 'discriminator.pt'))
-    judge = torch.load(os.path.join(args.save, 'judger.pt'))
+    discriminator = load_best('discriminator.pt')
+    judge = load_best('judger.pt')
     evaluate(test=True)
 ###############################################################################
 # save the result and the final checkpoint
-    all_result_df.to_csv(result_file, index=False, header=True)
-
-    torch.save(
-        {'epoch': epoch,
-         'model_state_dict': discriminator.state_dict(),
-         'scheduler': dis_scheduler,
-         'optimizer': dis_optimizer.state_dict()
-         }, dis_resume_file)
-    torch.save(
-        {'model_state_dict': judger.state_dict(),
-         'scheduler': judge_scheduler,
-         'optimizer': judge_optimizer.state_dict()
-         }, judge_resume_file)
+    save_checkpoint()
 
     print('-' * 89)
     print("save the check point to '{}' and '{}'".
@@ -494,19 +540,8 @@ except KeyboardInterrupt:
     print("Exiting from training early")
     print("save the check point to '{}' and '{}'".
           format(dis_resume_file, judge_resume_file))
-    torch.save(
-        {'epoch': epoch,
-         'model_state_dict': discriminator.state_dict(),
-         'scheduler': dis_scheduler,
-         'optimizer': dis_optimizer.state_dict()
-         }, dis_resume_file)
-    torch.save(
-        {'model_state_dict': judger.state_dict(),
-         'scheduler': judge_scheduler,
-         'optimizer': judge_optimizer.state_dict()
-         }, judge_resume_file)
     print("save the current result to '{}'".format(result_file))
-    all_result_df.to_csv(result_file, index=False, header=True)
+    save_checkpoint()
 
 print('=' * 89)
 print('End of training and evaluation')
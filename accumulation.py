@@ -0,0 +1,43 @@
+class GradientAccumulator():
+    """
+    Sums the gradients of several batches before every optimizer step.
+
+    Every batch calls backward with its loss, averaged over the batch, and its
+    weight, the number of examples (or tokens) the loss is averaged over. The
+    gradients are summed weighted, and before the step they are divided by the
+    total weight, so they are the average over all the examples of the
+    accumulated batches, also when the batches differ in size. clip is called
+    with the model once per step, on the averaged gradients. After `steps`
+    batches backward steps by itself; step() makes a smaller step of the
+    batches left, e.g. at the end of an epoch.
+    """
+    def __init__(self, optimizer, model, steps=1, clip=None):
+        if steps < 1:
+            raise ValueError('the accumulation steps have to be at least 1, got %r' % steps)
+        self.optimizer = optimizer
+        self.model = model
+        self.steps = steps
+        self.clip = clip
+        self.batches = 0
+        self.weight = 0
+        self.optimizer.zero_grad()
+
+    def backward(self, loss, weight):
+        (loss * weight).backward()
+        self.batches += 1
+        self.weight += weight
+        if self.batches == self.steps:
+            self.step()
+
+    def step(self):
+        if not self.batches:
+            return
+        for p in self.model.parameters():
+            if p.grad is not None:
+                p.grad.data.div_(self.weight)
+        if self.clip is not None:
+            self.clip(self.model)
+        self.optimizer.step()
+        self.optimizer.zero_grad()
+        self.batches = 0
+        self.weight = 0
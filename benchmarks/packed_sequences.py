@@ -0,0 +1,104 @@
+import argparse
+import time
+import numpy as np
+import torch
+import torch.nn.functional as F
+from dataset.batching import TokenBudgetBatchSampler
+from dataset.length_policy import LengthPolicy
+from dataset.token_store import TokenStore
+from model.lstm_model import LSTMClassifier
+from model.gru_model import GRUClassifier
+from model.rnn_model_bidirectional import BiRNN
+from model.rcnn_model import RCNN
+from model.lstm_attention_model import AttentionModel
+
+# usage: python -m benchmarks.packed_sequences [--store .corpus_cache/<collection>] [--cuda]
+# Trains and evaluates every model on the same random batches, once over the
+# padded batches and once packed with their lengths, and prints the documents
+# per second of both.
+
+MODELS = {
+    'lstm': LSTMClassifier,
+    'gru': GRUClassifier,
+    'birnn': BiRNN,
+    'rcnn': RCNN,
+    'lstm-attn': AttentionModel,
+}
+
+parser = argparse.ArgumentParser(description='Throughput of the recurrent models on padded and on packed batches')
+parser.add_argument('--store', type=str, default=None,
+                    help='take the document lengths from a token store, e.g. a corpus cache directory, instead of drawing them')
+parser.add_argument('--documents', type=int, default=2048,
+                    help='number of documents per pass')
+parser.add_argument('--median_length', type=int, default=400,
+                    help='median length of the drawn documents, which are log-normal like news articles')
+parser.add_argument('--length_policy', type=LengthPolicy.parse, default=LengthPolicy('truncate', 2000),
+                    help='cap on the document length, as in the loaders')
+parser.add_argument('--batch_size', type=int, default=32,
+                    help='documents per batch')
+parser.add_argument('--hidden_size', type=int, default=256,
+                    help='hidden size of the models')
+parser.add_argument('--models', type=str, nargs='+', default=list(MODELS), choices=list(MODELS),
+                    help='models to benchmark')
+parser.add_argument('--cuda', action='store_true',
+                    help='run on the GPU')
+parser.add_argument('--seed', type=int, default=1111,
+                    help='random seed')
+args = parser.parse_args()
+
+torch.manual_seed(args.seed)
+random = np.random.RandomState(args.seed)
+device = torch.device('cuda' if args.cuda else 'cpu')
+vocab_size = 20000
+embedding_length = 300
+
+if args.store:
+    lengths = TokenStore(args.store).lengths()
+    lengths = lengths[random.permutation(len(lengths))[:args.documents]]
+else:
+    # a sigma of 0.8 gives the long tail of news lengths: a tenth of the articles are over 2.8 times the median
+    lengths = np.maximum(1, random.lognormal(np.log(args.median_length), 0.8, args.documents).astype(np.int64))
+lengths = args.length_policy.lengths(lengths)
+print('{} documents, length median {}, mean {:.0f}, max {}'.format(len(lengths), int(np.median(lengths)), lengths.mean(), lengths.max()))
+
+# batches of similar lengths like the loaders build them, the padding left is what packing saves
+sampler = TokenBudgetBatchSampler(lengths, batch_size=args.batch_size)
+batches = []
+for indices in sampler:
+    batch_lengths = torch.from_numpy(lengths[indices])
+    text = torch.randint(2, vocab_size, (len(indices), int(batch_lengths.max())))
+    text[torch.arange(text.size(1)).unsqueeze(0) >= batch_lengths.unsqueeze(1)] = 1
+    batches.append((text.to(device), batch_lengths, torch.randint(0, 10, (len(indices),), device=device)))
+print('{} batches, {:.1f}% padding'.format(len(batches), 100 * sampler.padding_ratio))
+
+def step(model, optimizer, batch, packed, train):
+    text, batch_lengths, target = batch
+    with torch.set_grad_enabled(train):
+        prediction = model(text, lengths=batch_lengths if packed else None)
+        if train:
+            optimizer.zero_grad()
+            F.cross_entropy(prediction, target).backward()
+            optimizer.step()
+
+def run(model, packed, train):
+    model.train(train)
+    optimizer = torch.optim.Adam(filter(lambda p: p.requires_grad, model.parameters()))
+    # the first batch warms up the allocator and the kernels and is not timed
+    step(model, optimizer, batches[0], packed, train)
+    if args.cuda:
+        torch.cuda.synchronize()
+    start = time.time()
+    for batch in batches:
+        step(model, optimizer, batch, packed, train)
+    if args.cuda:
+        torch.cuda.synchronize()
+    return len(lengths) / (time.time() - start)
+
+weights = torch.randn(vocab_size, embedding_length)
+for name in args.models:
+    model = MODELS[name](10, args.hidden_size, vocab_size, embedding_length, weights).to(device)
+    for train in (True, False):
+        padded = run(model, False, train)
+        packed = run(model, True, train)
+        print('{:10} {:5}  padded {:8.1f} docs/s  packed {:8.1f} docs/s  {:.2f}x'.format(
+            name, 'train' if train else 'eval', padded, packed, packed / padded))
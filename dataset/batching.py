@@ -0,0 +1,155 @@
+import random
+from functools import partial
+import numpy as np
+from torch.utils.data import DataLoader, Sampler
+from torchtext import data
+
+BUCKET_SIZE = 1000
+PREFETCH_FACTOR = 4
+
+class TokenBudgetBatchSampler(Sampler):
+    """
+    Batches dataset indices by length instead of by a fixed example count.
+
+    The shuffled indices are cut into buckets of bucket_size examples and every
+    bucket is sorted by length and packed into batches of examples of similar
+    length, then the order of the batches is shuffled. With max_tokens a batch
+    grows while batch size x padded length stays within the budget (a single
+    example longer than the budget gets a batch of its own), otherwise every
+    batch holds batch_size examples.
+
+    The batches of an epoch are planned when it starts; padding_ratio is the
+    fraction of padding in the padded batches of the last planned epoch.
+    """
+    def __init__(self, lengths, max_tokens=None, batch_size=None, bucket_size=BUCKET_SIZE, shuffle=True):
+        if max_tokens is None and batch_size is None:
+            raise ValueError('Either max_tokens or batch_size has to be set')
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.max_tokens = max_tokens
+        self.batch_size = batch_size
+        self.bucket_size = bucket_size
+        self.shuffle = shuffle
+        self.padding_ratio = 0.0
+        self._plan = None
+
+    def _pack(self, bucket):
+        batches = []
+        batch = []
+        longest = 0
+        for index in bucket:
+            length = max(longest, self.lengths[index])
+            if batch and self.max_tokens is not None and (len(batch) + 1) * length > self.max_tokens:
+                batches.append(batch)
+                batch = []
+                length = self.lengths[index]
+            elif self.max_tokens is None and len(batch) == self.batch_size:
+                batches.append(batch)
+                batch = []
+                length = self.lengths[index]
+            batch.append(index)
+            longest = length
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _make_plan(self):
+        indices = np.arange(len(self.lengths))
+        if self.shuffle:
+            np.random.shuffle(indices)
+        batches = []
+        for start in range(0, len(indices), self.bucket_size):
+            bucket = indices[start:start + self.bucket_size]
+            # the stable sort keeps the shuffled order between examples of the same length
+            bucket = bucket[np.argsort(self.lengths[bucket], kind='stable')]
+            batches.extend(self._pack(bucket.tolist()))
+        if self.shuffle:
+            random.shuffle(batches)
+
+        padded = sum(len(batch) * self.lengths[batch].max() for batch in batches)
+        self.padding_ratio = 1.0 - float(self.lengths.sum()) / padded if padded else 0.0
+        return batches
+
+    def __iter__(self):
+        # the plan is taken when the first batch is asked for and stays the current one until the epoch ends,
+        # so a len() in between (list() asks for one after iter()) counts the batches that are iterated
+        if self._plan is None:
+            self._plan = self._make_plan()
+        try:
+            yield from self._plan
+        finally:
+            self._plan = None
+
+    def __len__(self):
+        if self._plan is None:
+            self._plan = self._make_plan()
+        return len(self._plan)
+
+class InfiniteBatchSampler(Sampler):
+    """
+    Repeats a batch sampler forever, planning a new epoch whenever one ends.
+
+    A DataLoader over it is iterated once, so its worker processes and their
+    prefetched batches carry on from one epoch to the next instead of being
+    torn down and restarted. len() is the number of batches of one epoch.
+    """
+    def __init__(self, batch_sampler):
+        self.batch_sampler = batch_sampler
+
+    def __iter__(self):
+        while True:
+            for batch in self.batch_sampler:
+                yield batch
+
+    def __len__(self):
+        return len(self.batch_sampler)
+
+def loader_options(num_workers=0, prefetch_factor=PREFETCH_FACTOR, pin_memory=False):
+    # DataLoader arguments that build batches in worker processes while the model trains,
+    # each worker keeping up to prefetch_factor batches ready
+    if not num_workers:
+        return {}
+    return {'num_workers': num_workers, 'prefetch_factor': prefetch_factor, 'persistent_workers': True, 'pin_memory': pin_memory}
+
+def eval_max_tokens(max_tokens, batch_size, eval_batch_size):
+    # evaluation keeps no activations for a backward pass, so its token budget grows like its batch size
+    if max_tokens is None:
+        return None
+    return max_tokens * max(1, eval_batch_size // batch_size)
+
+def store_example(token_ids, label):
+    # token_ids is a view into a memory-mapped token store, so bypass Example.fromdict and the Field preprocessing
+    example = data.Example()
+    example.content = token_ids
+    example.label = label
+    return example
+
+def examples_batch(dataset, examples, remap=None):
+    batch = data.Batch(examples, dataset)
+    if remap is not None:
+        # token ids of a full vocabulary to the ids of its pruned version, see dataset/vocab_pruning.py
+        tokens, lengths = batch.content
+        batch.content = (remap[tokens], lengths)
+    # only the tensors are sent back from the workers, not the dataset and its fields
+    batch.dataset = None
+    batch.fields = list(batch.fields)
+    return batch
+
+def example_loader(dataset, batch_size, max_tokens=None, shuffle=True, infinite=False, num_workers=0, remap=None):
+    """
+    Iterates a torchtext Dataset in token budget batches.
+
+    Yields the same torchtext Batch objects as a BucketIterator, so batch.content
+    is (padded token ids, lengths) and batch.label the labels. An infinite
+    loader starts a new epoch by itself and should be iterated only once.
+    remap, a LongTensor indexed by the token ids, maps them to the ids of a
+    pruned vocabulary.
+    """
+    lengths = [len(example.content) for example in dataset.examples]
+    if max_tokens is not None:
+        batch_size = None
+    sampler = TokenBudgetBatchSampler(lengths, max_tokens=max_tokens, batch_size=batch_size, shuffle=shuffle)
+    if infinite:
+        sampler = InfiniteBatchSampler(sampler)
+    # index the example list, torchtext's Dataset answers every unknown attribute with a generator
+    return DataLoader(dataset.examples, batch_sampler=sampler, collate_fn=partial(examples_batch, dataset, remap=remap),
+                      **loader_options(num_workers))
@@ -0,0 +1,109 @@
+import csv
+import os
+import sys
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+csv.field_size_limit(sys.maxsize)
+
+SCHEMA = pa.schema([('label', pa.int32()), ('content', pa.string()), ('tokens', pa.int32())])
+COMPRESSION = 'zstd'
+PERMUTATION_SUFFIX = '.perm.npy'
+
+class TableWriter():
+    """
+    Writes a split of the corpus as parquet, one row group per write() call.
+
+    label is the 1-based class, as in the csv files, and tokens the number of
+    split_by_punct tokens of the content. close() writes a random permutation
+    of the rows next to the file, which readers use instead of the file being
+    shuffled.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.writer = pq.ParquetWriter(path + '.tmp', SCHEMA, compression=COMPRESSION)
+
+    def write(self, labels, contents, tokens):
+        self.writer.write_table(pa.table({'label': labels, 'content': contents, 'tokens': tokens}, schema=SCHEMA))
+        self.rows += len(labels)
+
+    def close(self):
+        self.writer.close()
+        with open(self.path + PERMUTATION_SUFFIX + '.tmp', 'wb') as file:
+            np.save(file, np.random.permutation(self.rows))
+        os.replace(self.path + '.tmp', self.path)
+        os.replace(self.path + PERMUTATION_SUFFIX + '.tmp', self.path + PERMUTATION_SUFFIX)
+
+def is_parquet(path):
+    return path.endswith('.parquet')
+
+def data_file(directory, name):
+    # prefer the parquet export of a table over its csv
+    parquet_file = os.path.join(directory, name + '.parquet')
+    return parquet_file if os.path.isfile(parquet_file) else os.path.join(directory, name + '.csv')
+
+def permutation(path):
+    permutation_file = path + PERMUTATION_SUFFIX
+    if os.path.isfile(permutation_file):
+        return np.load(permutation_file, mmap_mode='r')
+    return None
+
+def read_table(path, columns=('label', 'content')):
+    """Reads the columns of a parquet export in the order of its permutation."""
+    table = pq.read_table(path, columns=list(columns))
+    order = permutation(path)
+    return table if order is None else table.take(pa.array(order))
+
+def read_rows(path, header=False):
+    """
+    Yields the [label, content] rows of a csv file or a parquet export, labels as
+    strings in both cases. header=True skips the first csv row.
+    """
+    if is_parquet(path):
+        table = read_table(path)
+        for label, content in zip(table.column('label').to_pylist(), table.column('content').to_pylist()):
+            yield [str(label), content]
+        return
+    with open(path, newline='') as file:
+        reader = csv.reader(file)
+        if header:
+            next(reader)
+        for row in reader:
+            yield row
+
+def read_labels(path, header=False):
+    """The labels of read_rows, without reading the contents of a parquet export."""
+    if is_parquet(path):
+        return [str(label) for label in read_table(path, columns=('label',)).column('label').to_pylist()]
+    return [row[0] for row in read_rows(path, header)]
+
+def stream_rows(path, header=False, rows=None):
+    """
+    Like read_rows, but a parquet export is read one row group at a time in
+    random order, for readers that shuffle with a buffer of their own. rows
+    selects rows by their position in read_rows.
+    """
+    if not is_parquet(path):
+        selected = None if rows is None else set(int(row) for row in rows)
+        for index, row in enumerate(read_rows(path, header)):
+            if selected is None or index in selected:
+                yield row
+        return
+    parquet_file = pq.ParquetFile(path)
+    selected = None
+    if rows is not None:
+        # positions in read_rows are positions in the permutation, map them back to rows of the file
+        order = permutation(path)
+        selected = np.zeros(parquet_file.metadata.num_rows, dtype=bool)
+        selected[rows if order is None else order[rows]] = True
+    starts = np.cumsum([0] + [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)])
+    for group in np.random.permutation(parquet_file.num_row_groups):
+        table = parquet_file.read_row_group(int(group), columns=['label', 'content'])
+        group_rows = zip(table.column('label').to_pylist(), table.column('content').to_pylist())
+        if selected is not None:
+            mask = selected[starts[group]:starts[group + 1]]
+            group_rows = (row for row, keep in zip(group_rows, mask) if keep)
+        for label, content in group_rows:
+            yield [str(label), content]
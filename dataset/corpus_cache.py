@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import pickle
+import re
+import shutil
+import types
+from pymongo.errors import OperationFailure
+
+CACHE_VERSION = 4
+CACHE_DIR = '.corpus_cache'
+META_FILE = 'meta.json'
+
+def collection_fingerprint(collection):
+    # dbHash lets mongod hash the collection contents server side; fall back to
+    # the document count and the newest _id when the command is not permitted
+    try:
+        result = collection.database.command('dbHash', collections=[collection.name])
+        return result['collections'].get(collection.name, '')
+    except OperationFailure:
+        last = collection.find_one(sort=[('_id', -1)], projection={'_id': 1})
+        return '%d:%s' % (collection.count_documents({}), last['_id'] if last is not None else '')
+
+def _stable_repr(value):
+    # a repr that is the same in every process: set order follows the string hash seed
+    if isinstance(value, (set, frozenset)):
+        return '{' + ', '.join(sorted(_stable_repr(item) for item in value)) + '}'
+    if isinstance(value, tuple):
+        return '(' + ', '.join(_stable_repr(item) for item in value) + ')'
+    if isinstance(value, re.Pattern):
+        return repr((value.pattern, value.flags))
+    return repr(value)
+
+def _code_digest(digest, code, names):
+    # the repr of a nested code object (a comprehension, a lambda) has its memory
+    # address in it, so nested code is hashed the same way instead
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode('utf-8'))
+    names.update(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _code_digest(digest, const, names)
+        else:
+            digest.update(_stable_repr(const).encode('utf-8'))
+
+def tokenizer_fingerprint(tokenizer):
+    # a tokenizer object such as a SubwordTokenizer fingerprints its own model
+    if hasattr(tokenizer, 'fingerprint'):
+        return tokenizer.fingerprint()
+    digest = hashlib.sha1()
+    names = set()
+    _code_digest(digest, tokenizer.__code__, names)
+    # module level constants the tokenizer uses, such as precompiled patterns and stop words
+    for name in sorted(names):
+        value = tokenizer.__globals__.get(name)
+        if value is not None and not callable(value) and not isinstance(value, types.ModuleType):
+            digest.update(_stable_repr(value).encode('utf-8'))
+    return digest.hexdigest()
+
+def cache_key(collection, tokenizer):
+    parts = {
+        'version': CACHE_VERSION,
+        'collection': collection.full_name,
+        'contents': collection_fingerprint(collection),
+        'tokenizer': tokenizer_fingerprint(tokenizer)
+    }
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+def corpus_key(collection, tokenizer):
+    # the contents are left out, the cache records how far into the collection it has read instead
+    parts = {
+        'version': CACHE_VERSION,
+        'collection': collection.full_name,
+        'tokenizer': tokenizer_fingerprint(tokenizer)
+    }
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+def files_key(paths, tokenizer):
+    # files are identified by their size and modification time, like the ingest checkpoint
+    parts = {
+        'version': CACHE_VERSION,
+        'files': [[path, os.path.getsize(path), os.path.getmtime(path)] for path in paths],
+        'tokenizer': tokenizer_fingerprint(tokenizer)
+    }
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+class CorpusCache():
+    """
+    Versioned on-disk cache of a tokenized corpus.
+
+    Every cache lives in its own directory under CACHE_DIR and holds a meta.json
+    with the key it was built for. The meta file is written last, so a cache
+    that was interrupted while being written, or that was built for an older
+    version of the collection or tokenizer, is reported as stale and
+    gets rebuilt.
+    """
+    def __init__(self, name, key):
+        self.path = os.path.join(CACHE_DIR, name)
+        self.key = key
+
+    def file(self, filename):
+        return os.path.join(self.path, filename)
+
+    def meta(self):
+        # the info of the last commit, None when there is no valid cache
+        meta_file = self.file(META_FILE)
+        if not os.path.isfile(meta_file):
+            return None
+        with open(meta_file, 'r') as file:
+            meta = json.load(file)
+        if meta.get('version') != CACHE_VERSION or meta.get('key') != self.key:
+            return None
+        return meta
+
+    def is_valid(self):
+        return self.meta() is not None
+
+    def reset(self):
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.path)
+
+    def load(self, filename):
+        with open(self.file(filename), 'rb') as file:
+            return pickle.load(file)
+
+    def save(self, filename, obj):
+        tmp_file = self.file(filename + '.tmp')
+        with open(tmp_file, 'wb') as file:
+            pickle.dump(obj, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, self.file(filename))
+
+    def commit(self, **info):
+        meta = dict(info, version=CACHE_VERSION, key=self.key)
+        tmp_file = self.file(META_FILE + '.tmp')
+        with open(tmp_file, 'w') as file:
+            json.dump(meta, file)
+        os.replace(tmp_file, self.file(META_FILE))
@@ -0,0 +1,66 @@
+import argparse
+import os
+from database_connection import collection
+from tokenization import split_by_punct
+from columnar import TableWriter
+from parallel_reader import read_parallel
+
+LABEL = 'label'
+CONTENT = 'content'
+
+TRAIN_PER_LABEL = 7000
+CURSOR_BATCH = 5000
+ROW_GROUP_SIZE = 10000
+
+def export_rows(documents):
+    # runs on the decode processes of read_parallel
+    return [(document[LABEL], document[CONTENT], len(split_by_punct(document[CONTENT]))) for document in documents]
+
+def export(output, train_per_label=TRAIN_PER_LABEL):
+    """
+    Streams the collection into train.parquet and test.parquet.
+
+    The first train_per_label documents of every label, in _id order, go to
+    train and the rest to test. The collection is read by read_parallel, which
+    also computes the token counts on its decode processes, and the documents
+    are written in row groups of ROW_GROUP_SIZE as they arrive, so memory is
+    bounded by one row group per split.
+    """
+    labels = collection.distinct(LABEL)
+    labels_map = {label: i + 1 for i, label in enumerate(labels)}
+    no_examples = {label: 0 for label in labels}
+    with open(os.path.join(output, 'labels.txt'), 'w') as labels_file:
+        for label in labels:
+            labels_file.write('%s\n' % label)
+
+    writers = {split: TableWriter(os.path.join(output, split + '.parquet')) for split in ('train', 'test')}
+    groups = {split: ([], [], []) for split in writers}
+    def flush(split):
+        writers[split].write(*groups[split])
+        groups[split] = ([], [], [])
+
+    for rows in read_parallel(collection, projection={LABEL: 1, CONTENT: 1}, transform=export_rows, batch_size=CURSOR_BATCH):
+        for current_label, content, tokens in rows:
+            no_examples[current_label] += 1
+            split = 'train' if no_examples[current_label] <= train_per_label else 'test'
+            groups[split][0].append(labels_map[current_label])
+            groups[split][1].append(content)
+            groups[split][2].append(tokens)
+            if len(groups[split][0]) >= ROW_GROUP_SIZE:
+                flush(split)
+    for split in writers:
+        if groups[split][0]:
+            flush(split)
+        writers[split].close()
+    return {split: writer.rows for split, writer in writers.items()}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the MongoDB corpus to parquet files for the GAN and classifier scripts')
+    parser.add_argument('--output', type=str, default='.',
+                        help='directory to write train.parquet, test.parquet and labels.txt to')
+    parser.add_argument('--train_per_label', type=int, default=TRAIN_PER_LABEL,
+                        help='documents of every label that go to the train split')
+    args = parser.parse_args()
+
+    rows = export(args.output, args.train_per_label)
+    print(f'Exported {rows["train"]} train and {rows["test"]} test documents.')
@@ -1,72 +1,92 @@
 import torch
 import gensim.models.keyedvectors as word2vec
-import re
+from collections import Counter
+from functools import partial
 from torchtext import data
-from torchtext.vocab import Vectors, GloVe
+from .corpus_cache import CorpusCache, files_key
+from .token_store import TokenStore, TokenStoreWriter
+from .tokenization import extract_words, tokenize_corpus, build_field_vocab
+from .batching import example_loader, store_example, eval_max_tokens
+from .columnar import data_file, read_rows
+from .splits import split_manifest, SPLIT_SEED
+from .length_policy import LengthPolicy
+from .shards import ShardedLoader, distributed_rank, shard_split, shard_loader, wait_for, from_rank0
+from .vocab_pruning import VocabLimits, pruned_vectors
 
-import csv
+DATA_DIR = 'ag_news_csv'
+# the stratified 0.8 / 0.2 test split, 0.2 of train for validation and 0.7 of the rest labeled
+SPLITS = (('labeled', 0.448), ('unlabeled', 0.192), ('valid', 0.16), ('test', 0.2))
 
-def extract_words(sentence):
-    ignore = ['a', "the", "is"]
-    words = re.sub("[^\w]", " ",  sentence).split()
-    cleaned_text = [w.lower() for w in words if w not in ignore]
-    return cleaned_text
-
-def load(embedding, batch_size=4):
-    TEXT = data.Field(sequential=True, tokenize=extract_words, lower=True, include_lengths=True, batch_first=True)
+def load(embedding, batch_size=4, max_tokens=None, num_workers=0, seed=SPLIT_SEED, policy=None, limits=None, tokenizer=None, eval_batch_size=None):
+    policy = policy or LengthPolicy()
+    eval_batch_size = eval_batch_size or batch_size
+    if limits is None:
+        limits = VocabLimits()
+    if tokenizer is None:
+        tokenizer = extract_words
+    TEXT = data.Field(sequential=True, tokenize=tokenizer, lower=True, include_lengths=True, batch_first=True)
     LABEL = data.LabelField(dtype=torch.long)
 
-    examples = []
-    with open('ag_news_csv/train.csv', 'r') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            document = {
-                'content': row[1],
-                'label': row[0]
-            }
-            example = data.Example.fromdict(document, fields={'content': ('content', TEXT), 'label': ('label', LABEL)})
-            examples.append(example)
-    with open('ag_news_csv/test.csv', 'r') as file:
-        reader = csv.reader(file)
-        for row in reader:
-            document = {
-                'content': row[1],
-                'label': row[0]
-            }
-            example = data.Example.fromdict(document, fields={'content': ('content', TEXT), 'label': ('label', LABEL)})
-            examples.append(example)
-    dataset = data.Dataset(examples, [('content', TEXT), ('label', LABEL)])
+    paths = [data_file(DATA_DIR, name) for name in ('train', 'test')]
+    # the other ranks wait for the cache under the key of rank 0, which tokenizes the corpus
+    cache = CorpusCache(DATA_DIR, from_rank0(files_key(paths, tokenizer)))
+    rank, world_size = distributed_rank()
+    if rank != 0:
+        # in a distributed job only rank 0 tokenizes the corpus, the other ranks read its cache
+        wait_for(cache.is_valid)
+    if cache.is_valid():
+        print("Loading tokenized corpus from " + cache.path)
+        TEXT.vocab, LABEL.vocab = cache.load('vocab.pkl')
+    else:
+        texts = []
+        labels = []
+        for path in paths:
+            for row in read_rows(path):
+                texts.append(row[1])
+                labels.append(row[0])
+        contents, counts = tokenize_corpus(texts, tokenizer)
+        del texts
+
+        build_field_vocab(TEXT, counts)
+        build_field_vocab(LABEL, Counter(labels))
+
+        cache.reset()
+        writer = TokenStoreWriter(cache.path)
+        for content, label in zip(contents, labels):
+            writer.add([TEXT.vocab.stoi[word] for word in content], LABEL.vocab.stoi[label])
+        writer.close()
+        cache.save('vocab.pkl', (TEXT.vocab, LABEL.vocab))
+        cache.commit(documents=len(labels))
+        print("Saved tokenized corpus to " + cache.path)
+        del contents, labels
 
-    if embedding == 'glove_specific':
-        vectors = Vectors(name='glove.vec', cache='specific-embeddings')
-        TEXT.build_vocab(dataset, vectors=vectors)
-    elif embedding == 'glove_generic':
-        TEXT.build_vocab(dataset, vectors=GloVe(name='6B', dim=300, cache='.vector_cache'))
-    elif embedding == 'fasttext_specific':
-        fasttext_vectors = Vectors(name="fasttext.vec", cache="specific-embeddings")
-        TEXT.build_vocab(dataset, vectors=fasttext_vectors)
-    elif embedding == 'fasttext_generic':
-        fasttext_vectors = Vectors(name="crawl-300d-2M.vec", cache=".fasttext_cache")
-        TEXT.build_vocab(dataset, vectors=fasttext_vectors)
-    elif embedding == 'word2vec_specific':
-        word2vectors = Vectors(name='word2vec.vec', cache='specific-embeddings')
-        TEXT.build_vocab(dataset, vectors=word2vectors)
-    elif embedding == 'word2vec_generic':
-        word2vectors = Vectors(name='embeddings.vec', cache='.word2vec_cache')
-        TEXT.build_vocab(dataset, vectors=word2vectors)
+    remap = pruned_vectors(TEXT, embedding, limits)
 
-    LABEL.build_vocab(dataset)
+    TOKENS = data.Field(sequential=True, use_vocab=False, pad_token=TEXT.vocab.stoi[TEXT.pad_token], include_lengths=True, batch_first=True)
+    store = TokenStore(cache.path)
+    fields = [('content', TOKENS), ('label', LABEL)]
 
     word_embeddings = TEXT.vocab.vectors
     print ("Length of Text Vocabulary: " + str(len(TEXT.vocab)))
     print ("Vector size of Text Vocabulary: ", TEXT.vocab.vectors.size())
     print ("Label Length: " + str(len(LABEL.vocab)))
 
-    train_data, test_data = dataset.split(stratified=True, split_ratio=0.8)
-    train_data, valid_data = train_data.split(stratified=True, split_ratio=0.8)
-    labeled_data, unlabeled_data = train_data.split(stratified=True, split_ratio=0.7) # Further splitting of training_data to create new training_data & validation_data
-    labeled_data_iter, unlabeled_data_iter, valid_iter, test_iter = data.BucketIterator.splits((labeled_data, unlabeled_data, valid_data, test_data), batch_size=batch_size, sort_key=lambda x: len(x.content), repeat=False, shuffle=True)
+    # split on the csv labels, so the manifest is the same one as before the corpus was cached
+    splits = split_manifest([LABEL.vocab.itos[label] for label in store.labels], SPLITS, seed)
+    if world_size > 1:
+        # every rank only reads the shards assigned to it, see dataset/shards.py
+        make_loader = partial(shard_loader, fields, LABEL.vocab.itos, policy, batch_size=batch_size, max_tokens=max_tokens, num_workers=num_workers, remap=remap)
+        labeled_data_iter, unlabeled_data_iter = [ShardedLoader(shard_split(store, name, splits[name]), make_loader, seed, infinite=True) for name in ('labeled', 'unlabeled')]
+        make_loader = partial(make_loader, batch_size=eval_batch_size, max_tokens=eval_max_tokens(max_tokens, batch_size, eval_batch_size), shuffle=False)
+        valid_iter, test_iter = [ShardedLoader(shard_split(store, name, splits[name]), make_loader, seed) for name in ('valid', 'test')]
+    else:
+        labeled_data, unlabeled_data, valid_data, test_data = [
+            data.Dataset([store_example(sequence, LABEL.vocab.itos[store.labels[i]]) for i in splits[name] for sequence in policy.apply(store[i])], fields)
+            for name, _ in SPLITS]
+        # the training loaders run through epochs on their own, the adversarial steps draw from both at their own pace
+        labeled_data_iter, unlabeled_data_iter = [example_loader(split, batch_size, max_tokens=max_tokens, infinite=True, num_workers=num_workers, remap=remap) for split in (labeled_data, unlabeled_data)]
+        valid_iter, test_iter = [example_loader(split, eval_batch_size, max_tokens=eval_max_tokens(max_tokens, batch_size, eval_batch_size), shuffle=False, num_workers=num_workers, remap=remap) for split in (valid_data, test_data)]
 
     vocab_size = len(TEXT.vocab)
 
-    return vocab_size, word_embeddings, labeled_data_iter, unlabeled_data_iter, valid_iter, test_iter, len(labeled_data), len(unlabeled_data), len(valid_data), len(test_data)
\ No newline at end of file
+    return vocab_size, word_embeddings, labeled_data_iter, unlabeled_data_iter, valid_iter, test_iter, len(splits['labeled']), len(splits['unlabeled']), len(splits['valid']), len(splits['test'])
@@ -0,0 +1,75 @@
+import numpy as np
+
+NONE = 'none'
+TRUNCATE = 'truncate'
+HEAD_TAIL = 'head_tail'
+CHUNK = 'chunk'
+MODES = (NONE, TRUNCATE, HEAD_TAIL, CHUNK)
+
+class LengthPolicy():
+    """
+    Caps the number of tokens of a document, so one long article cannot make a
+    whole batch pad to its length.
+
+    truncate keeps the first max_length tokens. head_tail keeps the first head
+    tokens and the last max_length - head (a quarter of max_length from the
+    head by default), since the end of an article often sums it up. chunk
+    splits a document into pieces of up to max_length tokens that all keep the
+    label of the document, so nothing is dropped but a document can give
+    several examples.
+    """
+    def __init__(self, mode=NONE, max_length=None, head=None):
+        if mode not in MODES:
+            raise ValueError('unknown length policy %r, expected one of %s' % (mode, ', '.join(MODES)))
+        if mode != NONE and not max_length:
+            raise ValueError('the %s length policy needs a maximum length' % mode)
+        self.mode = mode
+        self.max_length = max_length
+        self.head = head if head is not None else (max_length // 4 if max_length else None)
+        if mode == HEAD_TAIL and not 0 <= self.head < max_length:
+            raise ValueError('the head of the head_tail length policy has to be at least 0 and less than its maximum length %d, got %d' % (max_length, self.head))
+
+    @classmethod
+    def parse(cls, text):
+        """Policy from its command line form: none, truncate:<max>, head_tail:<max>[:<head>] or chunk:<max>."""
+        if text is None:
+            return cls()
+        parts = text.split(':')
+        return cls(parts[0], *[int(part) for part in parts[1:]])
+
+    def __str__(self):
+        if self.mode == NONE:
+            return NONE
+        if self.mode == HEAD_TAIL:
+            return '%s:%d:%d' % (self.mode, self.max_length, self.head)
+        return '%s:%d' % (self.mode, self.max_length)
+
+    def apply(self, token_ids):
+        """The sequences a document becomes, views of token_ids except for head_tail."""
+        if self.mode == NONE or len(token_ids) <= self.max_length:
+            return [token_ids]
+        if self.mode == TRUNCATE:
+            return [token_ids[:self.max_length]]
+        if self.mode == HEAD_TAIL:
+            return [np.concatenate([token_ids[:self.head], token_ids[len(token_ids) - (self.max_length - self.head):]])]
+        return [token_ids[start:start + self.max_length] for start in range(0, len(token_ids), self.max_length)]
+
+    def pieces(self, lengths):
+        """Number of sequences apply() gives for documents of the given lengths."""
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if self.mode != CHUNK:
+            return np.ones(len(lengths), dtype=np.int64)
+        return np.maximum(1, -(-lengths // self.max_length))
+
+    def lengths(self, lengths):
+        """Lengths of all the sequences apply() gives for documents of the given lengths, in order."""
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if self.mode == NONE:
+            return lengths
+        if self.mode != CHUNK:
+            return np.minimum(lengths, self.max_length)
+        pieces = self.pieces(lengths)
+        # every piece is full but the last of its document
+        starts = np.repeat(np.cumsum(pieces) - pieces, pieces)
+        piece = np.arange(pieces.sum()) - starts
+        return np.minimum(np.repeat(lengths, pieces) - piece * self.max_length, self.max_length)
@@ -1,57 +1,311 @@
-from .database_connection import collection
+from . import database_connection
 from .news_model import NewsObject
+from .corpus_cache import CorpusCache, cache_key, corpus_key
+from .token_store import TokenStore, TokenStoreWriter
+from .tokenization import tokenize_batch, tokenize_corpus, build_field_vocab, extend_vocab, SHARD_SIZE
+from .batching import example_loader, examples_batch, store_example, eval_max_tokens
+from .streaming import StreamingDataset, budget_batches, split_of, SPLITS
+from .splits import split_manifest, stratified_split
+from .parallel_reader import read_parallel
+from .shards import ShardedLoader, distributed_rank, shard_split, shard_loader, wait_for, from_rank0
+from .vocab_pruning import pruned_vectors
+import env_settings
+from bson import json_util
 import torch
+import numpy as np
+from collections import Counter
+from functools import partial
+from torch.utils.data import DataLoader
 import gensim.models.keyedvectors as word2vec
-import re
 from torchtext import data
-from torchtext.vocab import Vectors, GloVe
 
-def extract_words(sentence):
-    ignore = ['a', "the", "is"]
-    words = re.sub("[^\w]", " ",  sentence).split()
-    cleaned_text = [w.lower() for w in words if w not in ignore]
-    return cleaned_text
+READ_BATCH = 1000
 
-def load(embedding='glove_specific', batch_size=4):
-    TEXT = data.Field(sequential=True, tokenize=extract_words, lower=True, include_lengths=True, batch_first=True)
+def example_length(example):
+    return len(example.content)
+
+def read_split(collection, split):
+    # a fresh cursor on every pass, the documents of the other splits are skipped before tokenization
+    for document in collection.find({}, {'content': 1, 'label': 1}, batch_size=READ_BATCH):
+        if split_of(document['_id']) == split:
+            yield document
+
+def encode_document(tokenizer, stoi, LABEL, policy, document):
+    token_ids = np.array([stoi[word] for word in tokenizer(document['content'])], dtype=np.int32)
+    label = LABEL.preprocess(document['label'])
+    return [store_example(sequence, label) for sequence in policy.apply(token_ids)]
+
+def tokenize_documents(tokenizer, documents):
+    # runs on the decode processes of read_parallel, only the tokens are sent back
+    tokens = tokenize_batch(tokenizer, [document['content'] for document in documents])
+    counts = Counter()
+    for words in tokens:
+        counts.update(words)
+    return tokens, [document['label'] for document in documents], counts, documents[-1]['_id']
+
+def count_words(tokenizer, documents):
+    counts = Counter()
+    for words in tokenize_batch(tokenizer, [document['content'] for document in documents]):
+        counts.update(words)
+    return [document['label'] for document in documents], counts
+
+def high_water_mark(meta):
+    return json_util.loads(meta['last_id'])
+
+def is_current(collection, meta):
+    # nothing was added after the newest _id of the cache, and nothing added or removed before it
+    if meta is None:
+        return False
+    last_id = high_water_mark(meta)
+    if last_id is None:
+        return collection.count_documents({}) == 0
+    return collection.count_documents({'_id': {'$gt': last_id}}) == 0 and collection.count_documents({'_id': {'$lte': last_id}}) == meta['documents']
+
+def sync_corpus(collection, TEXT, LABEL):
+    """
+    Brings the tokenized corpus in the cache up to date with the collection.
+
+    The cache remembers the newest _id it holds. Only the documents after it are
+    read, tokenized and appended to the token store, and their new words and
+    labels are added at the end of the vocabularies, so the ids in the store stay
+    valid. The collection is only read in full when there is no cache, or when
+    the number of documents up to the newest _id changed, i.e. documents were
+    removed or inserted out of order, which the high-water mark cannot see.
+    Returns the cache, with the vocabularies set on the fields.
+    """
+    cache = CorpusCache(collection.full_name, corpus_key(collection, TEXT.tokenize))
+    meta = cache.meta()
+    query = {}
+    if meta is not None:
+        last_id = high_water_mark(meta)
+        if (last_id is not None and collection.count_documents({'_id': {'$lte': last_id}}) != meta['documents']) \
+                or TokenStore(cache.path).meta['documents'] != meta['documents']:
+            print("Documents were removed or inserted out of order, rebuilding " + cache.path)
+            meta = None
+        elif last_id is not None:
+            query = {'_id': {'$gt': last_id}}
+
+    contents = []
+    labels = []
+    counts = Counter()
+    last_id = None if meta is None else high_water_mark(meta)
+    # the documents are read by _id ranges in parallel and tokenized where they are decoded
+    for batch_contents, batch_labels, batch_counts, last_id in read_parallel(collection, query, {'content': 1, 'label': 1}, transform=partial(tokenize_documents, TEXT.tokenize)):
+        contents.extend(batch_contents)
+        labels.extend(LABEL.preprocess(label) for label in batch_labels)
+        counts.update(batch_counts)
+    if meta is not None:
+        TEXT.vocab, LABEL.vocab = cache.load('vocab.pkl')
+        if not contents:
+            print("Loading tokenized corpus from " + cache.path)
+            return cache
+
+    if meta is None:
+        # The vocabulary covers the whole corpus so that the cache does not depend on the random split.
+        # The pre-trained embeddings are frozen in every model, so no label information leaks to the test set.
+        build_field_vocab(TEXT, counts)
+        LABEL.build_vocab(labels)
+        cache.reset()
+        segments = []
+    else:
+        extend_vocab(TEXT.vocab, counts)
+        extend_vocab(LABEL.vocab, Counter(labels))
+        segments = meta['segments']
+
+    writer = TokenStoreWriter(cache.path, append=meta is not None)
+    for content, label in zip(contents, labels):
+        writer.add([TEXT.vocab.stoi[word] for word in content], LABEL.vocab.stoi[label])
+    writer.close()
+    cache.save('vocab.pkl', (TEXT.vocab, LABEL.vocab))
+    cache.commit(documents=writer.documents, last_id=json_util.dumps(last_id), segments=segments + [writer.documents])
+    if meta is None:
+        print("Saved tokenized corpus to " + cache.path)
+    else:
+        print("Appended %d documents to the tokenized corpus in %s" % (len(labels), cache.path))
+    return cache
+
+def streaming_vocab(collection, TEXT, LABEL):
+    # reuse the vocabulary of the tokenized corpus when it is up to date, otherwise count the words in one streaming pass
+    cache = CorpusCache(collection.full_name, corpus_key(collection, TEXT.tokenize))
+    if not is_current(collection, cache.meta()):
+        cache = CorpusCache(collection.full_name + '.vocab', cache_key(collection, TEXT.tokenize))
+    if cache.is_valid():
+        print("Loading vocabulary from " + cache.path)
+        TEXT.vocab, LABEL.vocab = cache.load('vocab.pkl')
+        return
+
+    label_counts = Counter()
+    counts = Counter()
+    for labels, batch_counts in read_parallel(collection, projection={'content': 1, 'label': 1}, transform=partial(count_words, TEXT.tokenize)):
+        label_counts.update(LABEL.preprocess(label) for label in labels)
+        counts.update(batch_counts)
+    build_field_vocab(TEXT, counts)
+    build_field_vocab(LABEL, label_counts)
+
+    cache.reset()
+    cache.save('vocab.pkl', (TEXT.vocab, LABEL.vocab))
+    cache.commit(documents=sum(label_counts.values()))
+    print("Saved vocabulary to " + cache.path)
+
+def load_streaming(collection, embedding, batch_size, eval_batch_size, max_tokens, policy, limits, tokenizer):
+    """
+    Streaming version of load for corpora that do not fit in memory.
+
+    Only the vocabulary is built up front. Every epoch reads the collection
+    again, tokenizes the documents as they arrive and shuffles them through a
+    bounded buffer. The splits are assigned by a hash of the document id
+    instead of a stratified split.
+    """
+    TEXT = data.Field(sequential=True, tokenize=tokenizer, lower=True, include_lengths=True, batch_first=True)
     LABEL = data.LabelField(dtype=torch.float)
+    streaming_vocab(collection, TEXT, LABEL)
+    # the documents are encoded with the full vocabulary, the batches map the ids to the pruned one
+    stoi = TEXT.vocab.stoi
+    remap = pruned_vectors(TEXT, embedding, limits)
+
+    TOKENS = data.Field(sequential=True, use_vocab=False, pad_token=TEXT.vocab.stoi[TEXT.pad_token], include_lengths=True, batch_first=True)
+    fields = data.Dataset([], [('content', TOKENS), ('label', LABEL)])
+    encode = partial(encode_document, tokenizer, stoi, LABEL, policy)
+    train_batch = partial(budget_batches, length=example_length, batch_size=None if max_tokens else batch_size, max_tokens=max_tokens)
+    eval_batch = partial(budget_batches, length=example_length, batch_size=None if max_tokens else eval_batch_size,
+                         max_tokens=eval_max_tokens(max_tokens, batch_size, eval_batch_size))
+    train_iter, valid_iter, test_iter = [
+        DataLoader(StreamingDataset(partial(read_split, collection, split), encode, shuffle=split == 'train', batch=train_batch if split == 'train' else eval_batch),
+                   batch_size=None, collate_fn=partial(examples_batch, fields, remap=remap))
+        for split in ('train', 'valid', 'test')]
+
+    word_embeddings = TEXT.vocab.vectors
+    print ("Length of Text Vocabulary: " + str(len(TEXT.vocab)))
+    print ("Vector size of Text Vocabulary: ", TEXT.vocab.vectors.size())
+    print ("Label Length: " + str(len(LABEL.vocab)))
+
+    vocab_size = len(TEXT.vocab)
+
+    return TEXT, vocab_size, word_embeddings, train_iter, valid_iter, test_iter
+
+def sample_per_label(collection, number_per_label):
+    """
+    Up to number_per_label random documents of every label, sampled by the server.
+
+    The label index serves distinct() and the $match of every label, and only the
+    sampled documents, projected on content and label, are sent over the wire.
+    """
+    collection.create_index('label')
+    for label in collection.distinct('label'):
+        pipeline = [{'$match': {'label': label}}, {'$sample': {'size': number_per_label}}, {'$project': {'content': 1, 'label': 1}}]
+        for document in collection.aggregate(pipeline, batchSize=READ_BATCH):
+            yield document
+
+def load_sample(collection, embedding, batch_size, eval_batch_size, max_tokens, policy, limits, tokenizer, number_per_label, seed, num_workers):
+    """
+    Version of load for quick experiments on number_per_label documents of every
+    label, sampled by the server. A new sample is drawn on every run, so nothing
+    is cached; the vocabulary only covers the sample.
+    """
+    TEXT = data.Field(sequential=True, tokenize=tokenizer, lower=True, include_lengths=True, batch_first=True)
+    LABEL = data.LabelField(dtype=torch.float)
+
+    texts = []
+    labels = []
+    for document in sample_per_label(collection, number_per_label):
+        texts.append(document['content'])
+        labels.append(LABEL.preprocess(document['label']))
+    contents, counts = tokenize_corpus(texts, tokenizer, processes=1 if len(texts) <= SHARD_SIZE else None)
+    del texts
+    build_field_vocab(TEXT, counts)
+    LABEL.build_vocab(labels)
+    # encoded with the full vocabulary like the cached corpus, the batches map the ids to the pruned one
+    token_ids = [np.array([TEXT.vocab.stoi[word] for word in content], dtype=np.int32) for content in contents]
+    remap = pruned_vectors(TEXT, embedding, limits)
+
+    TOKENS = data.Field(sequential=True, use_vocab=False, pad_token=TEXT.vocab.stoi[TEXT.pad_token], include_lengths=True, batch_first=True)
+    fields = [('content', TOKENS), ('label', LABEL)]
+    splits = stratified_split(labels, SPLITS, seed)
+    train_data, valid_data, test_data = [
+        data.Dataset([store_example(sequence, labels[i]) for i in splits[name] for sequence in policy.apply(token_ids[i])], fields)
+        for name, _ in SPLITS]
+    train_iter = example_loader(train_data, batch_size, max_tokens=max_tokens, num_workers=num_workers, remap=remap)
+    valid_iter, test_iter = [example_loader(split, eval_batch_size, max_tokens=eval_max_tokens(max_tokens, batch_size, eval_batch_size), shuffle=False, num_workers=num_workers, remap=remap)
+                             for split in (valid_data, test_data)]
+
+    word_embeddings = TEXT.vocab.vectors
+    print ("Length of Text Vocabulary: " + str(len(TEXT.vocab)))
+    print ("Vector size of Text Vocabulary: ", TEXT.vocab.vectors.size())
+    print ("Label Length: " + str(len(LABEL.vocab)))
+
+    vocab_size = len(TEXT.vocab)
+
+    return TEXT, vocab_size, word_embeddings, train_iter, valid_iter, test_iter
+
+def load(embedding='glove_specific', batch_size=4, max_tokens=None, streaming=None, seed=None, num_workers=None, policy=None,
+         per_label=None, collection=None, limits=None, tokenizer=None, eval_batch_size=None):
+    if max_tokens is None:
+        max_tokens = env_settings.MAX_TOKENS
+    if num_workers is None:
+        num_workers = env_settings.NUM_WORKERS
+    if seed is None:
+        seed = env_settings.SPLIT_SEED
+    if streaming is None:
+        streaming = env_settings.STREAMING
+    if policy is None:
+        policy = env_settings.LENGTH_POLICY
+    if per_label is None:
+        per_label = env_settings.PER_LABEL
+    if limits is None:
+        limits = env_settings.VOCAB_LIMITS
+    if tokenizer is None:
+        tokenizer = env_settings.TOKENIZER
+    if eval_batch_size is None:
+        eval_batch_size = env_settings.EVAL_BATCH_SIZE
+    if collection is None:
+        collection = database_connection.collection
+    if per_label:
+        return load_sample(collection, embedding, batch_size, eval_batch_size, max_tokens, policy, limits, tokenizer, per_label, seed, num_workers)
+    if streaming:
+        return load_streaming(collection, embedding, batch_size, eval_batch_size, max_tokens, policy, limits, tokenizer)
+    TEXT = data.Field(sequential=True, tokenize=tokenizer, lower=True, include_lengths=True, batch_first=True)
+    LABEL = data.LabelField(dtype=torch.float)
+
+    rank, world_size = distributed_rank()
+    if rank == 0:
+        cache = sync_corpus(collection, TEXT, LABEL)
+        from_rank0(cache.key)
+    else:
+        # in a distributed job only rank 0 reads the collection, the other ranks read its cache under the key it used
+        cache = CorpusCache(collection.full_name, from_rank0(corpus_key(collection, tokenizer)))
+        wait_for(cache.is_valid)
+        TEXT.vocab, LABEL.vocab = cache.load('vocab.pkl')
+
+    remap = pruned_vectors(TEXT, embedding, limits)
 
-    examples = []
-    for document in collection.find():
-        example = data.Example.fromdict(document, fields={'content': ('content', TEXT), 'label': ('label', LABEL)})
-        examples.append(example)
-    dataset = data.Dataset(examples, [('content', TEXT), ('label', LABEL)])
-
-    train_data, test_data = dataset.split(stratified=True, split_ratio=0.8)
-
-    if embedding == 'glove_specific':
-        vectors = Vectors(name='glove.vec', cache='specific-embeddings')
-        TEXT.build_vocab(train_data, vectors=vectors)
-    elif embedding == 'glove_generic':
-        TEXT.build_vocab(train_data, vectors=GloVe(name='6B', dim=300, cache='.vector_cache'))
-    elif embedding == 'fasttext_specific':
-        fasttext_vectors = Vectors(name="fasttext.vec", cache="specific-embeddings")
-        TEXT.build_vocab(train_data, vectors=fasttext_vectors)
-    elif embedding == 'fasttext_generic':
-        fasttext_vectors = Vectors(name="crawl-300d-2M.vec", cache=".fasttext_cache")
-        TEXT.build_vocab(train_data, vectors=fasttext_vectors)
-    elif embedding == 'word2vec_specific':
-        word2vectors = Vectors(name='word2vec.vec', cache='specific-embeddings')
-        TEXT.build_vocab(train_data, vectors=word2vectors)
-    elif embedding == 'word2vec_generic':
-        word2vectors = Vectors(name='embeddings.vec', cache='.word2vec_cache')
-        TEXT.build_vocab(train_data, vectors=word2vectors)
-
-    LABEL.build_vocab(train_data)
+    # Batches are built straight from the token ids in the store, the vocabulary is only needed to pick the padding id
+    TOKENS = data.Field(sequential=True, use_vocab=False, pad_token=TEXT.vocab.stoi[TEXT.pad_token], include_lengths=True, batch_first=True)
+    store = TokenStore(cache.path)
+    fields = [('content', TOKENS), ('label', LABEL)]
 
     word_embeddings = TEXT.vocab.vectors
     print ("Length of Text Vocabulary: " + str(len(TEXT.vocab)))
     print ("Vector size of Text Vocabulary: ", TEXT.vocab.vectors.size())
     print ("Label Length: " + str(len(LABEL.vocab)))
 
-    train_data, valid_data = train_data.split(stratified=True, split_ratio=0.8) # Further splitting of training_data to create new training_data & validation_data
-    train_iter, valid_iter, test_iter = data.BucketIterator.splits((train_data, valid_data, test_data), batch_size=batch_size, sort_key=lambda x: len(x.content), repeat=False, shuffle=True)
+    # the same stratified 0.64 / 0.16 / 0.2 split for every run with this seed, the examples are views of the selected rows;
+    # the documents of every sync are split on their own, so the documents the cache had keep their split
+    splits = split_manifest(store.labels, SPLITS, seed, segments=cache.meta()['segments'])
+    if world_size > 1:
+        # every rank only reads the shards assigned to it, see dataset/shards.py
+        make_loader = partial(shard_loader, fields, LABEL.vocab.itos, policy, batch_size=batch_size, max_tokens=max_tokens, num_workers=num_workers, remap=remap)
+        train_iter = ShardedLoader(shard_split(store, 'train', splits['train']), make_loader, seed)
+        make_loader = partial(make_loader, batch_size=eval_batch_size, max_tokens=eval_max_tokens(max_tokens, batch_size, eval_batch_size), shuffle=False)
+        valid_iter, test_iter = [ShardedLoader(shard_split(store, name, splits[name]), make_loader, seed) for name in ('valid', 'test')]
+    else:
+        train_data, valid_data, test_data = [
+            data.Dataset([store_example(sequence, LABEL.vocab.itos[store.labels[i]]) for i in splits[name] for sequence in policy.apply(store[i])], fields)
+            for name, _ in SPLITS]
+        train_iter = example_loader(train_data, batch_size, max_tokens=max_tokens, num_workers=num_workers, remap=remap)
+        # evaluation runs without gradients, so it takes larger batches
+        valid_iter, test_iter = [example_loader(split, eval_batch_size, max_tokens=eval_max_tokens(max_tokens, batch_size, eval_batch_size), shuffle=False, num_workers=num_workers, remap=remap)
+                                 for split in (valid_data, test_data)]
 
     vocab_size = len(TEXT.vocab)
 
-    return TEXT, vocab_size, word_embeddings, train_iter, valid_iter, test_iter
\ No newline at end of file
+    return TEXT, vocab_size, word_embeddings, train_iter, valid_iter, test_iter
@@ -0,0 +1,101 @@
+import hashlib
+import re
+import zlib
+import numpy as np
+
+# signatures are stored with the documents, so changing any of these means recomputing them
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+SIMILARITY = 0.8
+PRIME = (1 << 31) - 1
+_random = np.random.RandomState(20190601)
+_A = _random.randint(1, PRIME, NUM_PERM).astype(np.uint64)
+_B = _random.randint(0, PRIME, NUM_PERM).astype(np.uint64)
+
+WORD = re.compile(r"\w+")
+SIGNATURE = 'minhash'
+BANDS_FIELD = 'lsh_bands'
+
+def shingles(content):
+    words = WORD.findall(content.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def minhash(content):
+    """MinHash signature of the word 5-gram shingles of content, None when it has no words."""
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) % PRIME for shingle in shingles(content)), dtype=np.uint64)
+    if len(hashes) == 0:
+        return None
+    # a * x + b stays below 2^62, so the universal hash family never overflows uint64
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % PRIME).min(axis=1).astype(np.uint32)
+
+def band_keys(signature):
+    # one signed 64 bit key per band, the band number is hashed in so equal rows of different bands do not collide
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(bytes([band]) + signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+def lsh_fields(content):
+    """The fields a document is stored with so that later documents can be checked against it."""
+    signature = minhash(content)
+    if signature is None:
+        return {}
+    return {SIGNATURE: signature.tobytes(), BANDS_FIELD: band_keys(signature)}
+
+def similarity(signature, other):
+    # the fraction of equal minima estimates the Jaccard similarity of the shingle sets
+    return float(np.mean(signature == other))
+
+class NearDuplicateIndex():
+    """
+    LSH index of the documents in a collection, for dropping near duplicates as they are ingested.
+
+    Two documents whose signatures agree on a whole band are candidates, and a
+    candidate is a near duplicate when the signatures estimate a Jaccard
+    similarity of at least SIMILARITY. The band keys are stored in the
+    documents under a multikey index, so every batch is checked with one query
+    for the keys of the batch instead of a scan of the collection. load()
+    fetches the candidates of a batch; add() registers documents of the batch
+    that are kept, so they are checked against each other as well.
+    """
+    def __init__(self, collection, threshold=SIMILARITY):
+        self.collection = collection
+        self.threshold = threshold
+        self.buckets = {}
+        collection.create_index(BANDS_FIELD)
+
+    def load(self, documents):
+        self.buckets = {}
+        keys = sorted({key for document in documents for key in document.get(BANDS_FIELD, ())})
+        if not keys:
+            return
+        for match in self.collection.find({BANDS_FIELD: {'$in': keys}}, {SIGNATURE: 1, BANDS_FIELD: 1, 'source_id': 1}):
+            self._register(match)
+
+    def _register(self, document):
+        for key in document[BANDS_FIELD]:
+            self.buckets.setdefault(key, []).append(document)
+
+    def match(self, document):
+        """A stored or added document that document is a near duplicate of, or None."""
+        if BANDS_FIELD not in document:
+            return None
+        signature = np.frombuffer(document[SIGNATURE], dtype=np.uint32)
+        seen = set()
+        for key in document[BANDS_FIELD]:
+            for candidate in self.buckets.get(key, ()):
+                if id(candidate) in seen:
+                    continue
+                seen.add(id(candidate))
+                if similarity(signature, np.frombuffer(candidate[SIGNATURE], dtype=np.uint32)) >= self.threshold:
+                    return candidate
+        return None
+
+    def add(self, document):
+        if BANDS_FIELD in document:
+            self._register(document)
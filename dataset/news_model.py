@@ -1,4 +1,7 @@
 class NewsObject(object):
-    def __init__(self, content, label):
+    def __init__(self, content, label, source_id=None):
         self.content = content
-        self.label = label
\ No newline at end of file
+        self.label = label
+        if source_id is not None:
+            # id of the article in news_cleaned.csv, unique so that a resumed ingest skips it
+            self.source_id = source_id
@@ -0,0 +1,38 @@
+import argparse
+from precision import FLOAT32, PRECISIONS
+from .length_policy import LengthPolicy
+from .vocab_pruning import VocabLimits
+
+def accumulation_steps(value):
+    steps = int(value)
+    if steps < 1:
+        raise argparse.ArgumentTypeError('the accumulation steps have to be at least 1, got %r' % steps)
+    return steps
+
+def add_data_arguments(parser):
+    # the options of the batches, the vocabulary and the precision that the argparse scripts share,
+    # main.py takes the same ones through getopt
+    parser.add_argument('--max_tokens', type=int, default=None,
+                        help='batch by a budget of batch size x padded length instead of batch_size')
+    parser.add_argument('--length_policy', type=LengthPolicy.parse, default=LengthPolicy(),
+                        help='cap on the document length: none, truncate:<max>, head_tail:<max>[:<head>] or chunk:<max>')
+    parser.add_argument('--min_freq', type=int, default=1,
+                        help='drop the words seen fewer times from the vocabulary, they become unknown words')
+    parser.add_argument('--max_vocab', type=int, default=None,
+                        help='keep only this many of the most frequent words in the vocabulary')
+    parser.add_argument('--vocab_coverage', type=float, default=None,
+                        help='keep the fewest most frequent words that make up this fraction of the tokens')
+    parser.add_argument('--subword', type=str, default=None,
+                        help='SentencePiece model trained by python -m dataset.subword to tokenize into subword pieces instead of words')
+    parser.add_argument('--precision', type=str, default=FLOAT32, choices=PRECISIONS,
+                        help='precision of the forward passes, bfloat16 autocasts them and keeps the weights in float32')
+    parser.add_argument('--accumulation_steps', type=accumulation_steps, default=1,
+                        help='batches whose gradients are summed before every optimizer step, for an effective batch that many times larger')
+    parser.add_argument('--num_workers', type=int, default=0,
+                        help='worker processes that build batches ahead of the training steps (0 = build them in the main process)')
+
+def vocab_limits_from_args(args, parser):
+    try:
+        return VocabLimits(args.min_freq, args.max_vocab, args.vocab_coverage)
+    except ValueError as error:
+        parser.error(str(error))
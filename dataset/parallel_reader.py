@@ -0,0 +1,116 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+READ_BATCH = 1000
+READ_THREADS = 8
+RANGES_PER_THREAD = 4
+# ids sampled per range to place the range boundaries
+SAMPLES_PER_RANGE = 16
+RAW_BSON = CodecOptions(document_class=RawBSONDocument)
+
+def id_ranges(collection, query, partitions):
+    """
+    Splits the _id space of the documents matching query into about partitions
+    ranges of similar size, as _id filters in _id order. The boundaries are
+    quantiles of a $sample of the ids, so no pass over the collection is needed.
+    """
+    count = collection.count_documents(query)
+    if count == 0:
+        return []
+    if partitions <= 1 or count <= 2 * READ_BATCH:
+        return [None]
+    pipeline = [{'$match': query}, {'$sample': {'size': min(count, partitions * SAMPLES_PER_RANGE)}}, {'$project': {'_id': 1}}]
+    ids = sorted(document['_id'] for document in collection.aggregate(pipeline))
+    bounds = []
+    for i in range(1, partitions):
+        bound = ids[i * len(ids) // partitions]
+        if not bounds or bound > bounds[-1]:
+            bounds.append(bound)
+    ranges = [{'$lt': bounds[0]}]
+    ranges.extend({'$gte': low, '$lt': high} for low, high in zip(bounds, bounds[1:]))
+    ranges.append({'$gte': bounds[-1]})
+    return ranges
+
+def _range_query(query, id_range):
+    if id_range is None:
+        return query
+    return {'$and': [query, {'_id': id_range}]} if query else {'_id': id_range}
+
+def _read_range(collection, query, projection, batch_size, id_range):
+    # runs on the reader threads: the documents stay undecoded BSON, one bytes object per batch
+    batches = []
+    batch = []
+    # every thread gets its own copy, a driver may modify the projection it is given
+    projection = dict(projection) if projection is not None else None
+    for document in collection.find(_range_query(query, id_range), projection, sort=[('_id', 1)], batch_size=batch_size):
+        batch.append(document.raw)
+        if len(batch) >= batch_size:
+            batches.append(b''.join(batch))
+            batch = []
+    if batch:
+        batches.append(b''.join(batch))
+    return batches
+
+def _decode(raw, transform):
+    # runs on the decode processes, transform can reduce the documents before they are sent back
+    documents = bson.decode_all(raw)
+    return documents if transform is None else transform(documents)
+
+def read_parallel(collection, query=None, projection=None, transform=None, threads=READ_THREADS, processes=None, batch_size=READ_BATCH):
+    """
+    Reads the documents matching query in batches, in _id order.
+
+    The _id space is cut into ranges that threads read concurrently over the
+    connection pool of the client, as raw BSON. The batches are decoded on a
+    process pool, where transform, a picklable function of a list of documents,
+    is applied as well, so tokenizing or counting happens next to the decoding
+    and only its result is sent back. Yields transform(documents), or the
+    documents, for every batch. A few ranges per thread and a couple of batches
+    per process are in flight at a time, so memory stays bounded. A small
+    result is read with one cursor in this process.
+    """
+    query = query or {}
+    ranges = id_ranges(collection, query, threads * RANGES_PER_THREAD)
+    if len(ranges) <= 1:
+        documents = []
+        for document in collection.find(query, projection, sort=[('_id', 1)], batch_size=batch_size):
+            documents.append(document)
+            if len(documents) >= batch_size:
+                yield documents if transform is None else transform(documents)
+                documents = []
+        if documents:
+            yield documents if transform is None else transform(documents)
+        return
+
+    processes = processes or os.cpu_count()
+    raw_collection = collection.with_options(codec_options=RAW_BSON)
+    ranges = iter(ranges)
+    with ThreadPoolExecutor(threads) as executor, Pool(processes) as pool:
+        reads = deque()
+        decodes = deque()
+        def read_ahead():
+            while len(reads) < 2 * threads:
+                id_range = next(ranges, None)
+                if id_range is None:
+                    return
+                reads.append(executor.submit(_read_range, raw_collection, query, projection, batch_size, id_range))
+        read_ahead()
+        while reads:
+            for raw in reads.popleft().result():
+                decodes.append(pool.apply_async(_decode, (raw, transform)))
+                if len(decodes) > 2 * processes:
+                    yield decodes.popleft().get()
+            read_ahead()
+        while decodes:
+            yield decodes.popleft().get()
+
+def read_documents(collection, query=None, projection=None, threads=READ_THREADS, processes=None, batch_size=READ_BATCH):
+    """read_parallel one document at a time."""
+    for documents in read_parallel(collection, query, projection, threads=threads, processes=processes, batch_size=batch_size):
+        for document in documents:
+            yield document
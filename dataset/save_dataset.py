@@ -1,49 +1,232 @@
+import argparse
 import csv
+import io
+import json
+import os
+import re
+import sys
+from collections import deque
+from multiprocessing import Pool
+from pymongo.errors import BulkWriteError
 from database_connection import collection
 from news_model import NewsObject
+from near_duplicates import NearDuplicateIndex, lsh_fields
+
+csv.field_size_limit(sys.maxsize)
 
 MAX_LINE_COUNT = 10000
 data_tags = {
-    'fake': 0, 
-    'satire': 0, 
-    'bias': 0, 
-    'conspiracy': 0, 
-    'junksci': 0, 
-    'hate': 0, 
-    'clickbait': 0, 
-    'unreliable': 0, 
-    'political': 0, 
+    'fake': 0,
+    'satire': 0,
+    'bias': 0,
+    'conspiracy': 0,
+    'junksci': 0,
+    'hate': 0,
+    'clickbait': 0,
+    'unreliable': 0,
+    'political': 0,
     'reliable': 0
 }
 dataset_file = './dataset/news_cleaned.csv'
 
-with open(dataset_file, mode='r', encoding='UTF-8') as csv_file:
-    csv_reader = csv.DictReader(csv_file)
-    line_count = 0
-    for row in csv_reader:
-        if line_count == 0:
-            line_count = line_count + 1
+CHUNK_SIZE = 64 << 20
+INSERT_BATCH = 1000
+MAX_ROW_BYTES = 16 << 20
+# every row of news_cleaned.csv starts with its integer index
+RECORD_START = re.compile(rb'\d+,')
+DUPLICATE_KEY = 11000
+
+def read_header(path):
+    with open(path, 'rb') as file:
+        line = file.readline()
+        return next(csv.reader([line.decode('utf-8')])), file.tell()
+
+def _parses_as_row(file, line, width):
+    def lines():
+        yield line
+        size = len(line)
+        while size < MAX_ROW_BYTES:
+            more = file.readline()
+            if not more:
+                return
+            size += len(more)
+            yield more
+    try:
+        row = next(csv.reader(part.decode('utf-8', 'replace') for part in lines()))
+    except (csv.Error, StopIteration):
+        return False
+    return len(row) == width
+
+def record_start(file, offset, width):
+    # the first row that starts after offset; article contents span several lines,
+    # so a line only counts as the start of a row when a whole row parses from it
+    file.seek(offset)
+    file.readline()
+    while True:
+        position = file.tell()
+        line = file.readline()
+        if not line:
+            return position
+        if RECORD_START.match(line) and _parses_as_row(file, line, width):
+            return position
+        file.seek(position + len(line))
+
+def chunks(path, start, chunk_size, width):
+    size = os.path.getsize(path)
+    with open(path, 'rb') as file:
+        while start < size:
+            end = record_start(file, start + chunk_size, width) if start + chunk_size < size else size
+            yield start, end
+            start = end
+
+def parse_chunk(task):
+    """
+    Parses the rows in a byte range, keeping every row of the given tags in file order.
+
+    The rows are not cut at what the quotas still need: some of them may turn
+    out to be near duplicates, and the rows after them have to take their place.
+    """
+    path, start, end, fieldnames, tags = task
+    with open(path, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+    documents = []
+    for row in csv.DictReader(io.StringIO(text, newline=''), fieldnames=fieldnames):
+        tag = row['type']
+        if tag in tags:
+            document = NewsObject(row['content'], tag, row.get('id')).__dict__
+            # the signatures are computed here, on the parser processes
+            document.update(lsh_fields(row['content']))
+            documents.append(document)
+    return end, documents
+
+def insert(documents):
+    # unordered bulk writes; rows already inserted by an interrupted run are rejected by the source_id index
+    for i in range(0, len(documents), INSERT_BATCH):
+        try:
+            collection.insert_many(documents[i:i + INSERT_BATCH], ordered=False)
+        except BulkWriteError as error:
+            if any(write_error['code'] != DUPLICATE_KEY for write_error in error.details['writeErrors']):
+                raise
+
+def deduplicate(index, documents, counts):
+    """
+    Keeps the documents of a parsed range that are not near duplicates of the
+    collection or of each other, up to the quota of every tag.
+
+    The documents are taken in file order, whatever their tag, so the quotas
+    and the copy of a near duplicate that is kept are the ones of a single pass
+    over the file. A document that matches one with its own source_id was
+    inserted by an interrupted run, so it is counted towards the quota but not
+    inserted again. Returns the documents to insert and the number of near
+    duplicates per tag.
+    """
+    documents = [document for document in documents if counts[document['label']] < MAX_LINE_COUNT]
+    index.load(documents)
+    batch = []
+    duplicates = dict.fromkeys(counts, 0)
+    for document in documents:
+        tag = document['label']
+        if counts[tag] >= MAX_LINE_COUNT:
             continue
+        match = index.match(document)
+        if match is None:
+            index.add(document)
+            batch.append(document)
+            counts[tag] += 1
+        elif 'source_id' in document and match.get('source_id') == document['source_id']:
+            counts[tag] += 1
         else:
-            isFull = True
-            for key, value in data_tags.items():
-                if value < MAX_LINE_COUNT:
-                    isFull = False
-            if isFull:
+            duplicates[tag] += 1
+    return batch, duplicates
+
+def read_checkpoint(checkpoint_file, source):
+    if not os.path.isfile(checkpoint_file):
+        return None
+    with open(checkpoint_file, 'r') as file:
+        checkpoint = json.load(file)
+    if checkpoint.get('source') != source or checkpoint.get('max_line_count') != MAX_LINE_COUNT:
+        return None
+    return checkpoint
+
+def write_checkpoint(checkpoint_file, source, offset, counts, duplicates):
+    tmp_file = checkpoint_file + '.tmp'
+    with open(tmp_file, 'w') as file:
+        json.dump({'source': source, 'max_line_count': MAX_LINE_COUNT, 'offset': offset, 'counts': counts, 'duplicates': duplicates}, file)
+    os.replace(tmp_file, checkpoint_file)
+
+def ingest(path, processes=None, chunk_size=CHUNK_SIZE, restart=False):
+    """
+    Saves up to MAX_LINE_COUNT articles of every tag in data_tags to MongoDB.
+
+    The csv is cut into byte ranges at row boundaries, parsed on a process pool
+    and written in bulk. Quotas are applied in file order, so the documents are
+    the ones a single pass over the file would pick. Near duplicates of
+    documents already in the collection are dropped and do not count towards
+    the quotas, see near_duplicates.py. After every range the offset and counts
+    are checkpointed next to the csv, and an interrupted run resumes from there.
+    """
+    fieldnames, data_start = read_header(path)
+    stat = os.stat(path)
+    source = {'size': stat.st_size, 'mtime': stat.st_mtime}
+    checkpoint_file = path + '.ingest.json'
+    checkpoint = None if restart else read_checkpoint(checkpoint_file, source)
+    if checkpoint is not None:
+        offset, counts = checkpoint['offset'], checkpoint['counts']
+        duplicates = checkpoint.get('duplicates', dict(data_tags))
+        print(f'Resuming at byte {offset} of {stat.st_size}')
+    else:
+        offset, counts, duplicates = data_start, dict(data_tags), dict(data_tags)
+    collection.create_index('source_id', unique=True, partialFilterExpression={'source_id': {'$exists': True}})
+    index = NearDuplicateIndex(collection)
+
+    processes = processes or os.cpu_count()
+    ranges = chunks(path, offset, chunk_size, len(fieldnames))
+    with Pool(processes) as pool:
+        pending = deque()
+        while True:
+            # keep a couple of ranges per process in flight, asking each for the tags whose quotas are not full yet
+            while len(pending) < 2 * processes:
+                next_range = next(ranges, None)
+                if next_range is None:
+                    break
+                tags = frozenset(tag for tag, count in counts.items() if count < MAX_LINE_COUNT)
+                pending.append(pool.apply_async(parse_chunk, ((path,) + next_range + (fieldnames, tags),)))
+            if not pending:
+                break
+            end, documents = pending.popleft().get()
+            batch, range_duplicates = deduplicate(index, documents, counts)
+            for tag, count in range_duplicates.items():
+                duplicates[tag] += count
+            insert(batch)
+            write_checkpoint(checkpoint_file, source, end, counts, duplicates)
+            print(f'Processed {end} of {stat.st_size} bytes, inserted {len(batch)} documents, dropped {sum(range_duplicates.values())} near duplicates: {counts}')
+            if all(count >= MAX_LINE_COUNT for count in counts.values()):
                 break
+    return counts, duplicates
+
+def duplicates_report(counts, duplicates):
+    lines = []
+    for tag in data_tags:
+        seen = counts[tag] + duplicates[tag]
+        lines.append(f'{tag}: dropped {duplicates[tag]} of {seen} documents ({100.0 * duplicates[tag] / max(seen, 1):.2f}%)')
+    seen = sum(counts.values()) + sum(duplicates.values())
+    lines.append(f'total: dropped {sum(duplicates.values())} of {seen} documents ({100.0 * sum(duplicates.values()) / max(seen, 1):.2f}%)')
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Save a balanced sample of news_cleaned.csv to MongoDB')
+    parser.add_argument('--file', type=str, default=dataset_file,
+                        help='location of the FakeNewsCorpus csv')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='parser processes (default: one per cpu)')
+    parser.add_argument('--chunk_size', type=int, default=CHUNK_SIZE >> 20,
+                        help='size in MB of the byte ranges handed to the parsers')
+    parser.add_argument('--restart', action='store_true',
+                        help='ignore the checkpoint of an earlier run and start from the top of the file')
+    args = parser.parse_args()
 
-            tag = row['type']
-            try:
-                mock = data_tags[tag]
-            except:
-                continue
-
-            if data_tags[tag] >= MAX_LINE_COUNT:
-                continue
-            else:
-                print("insert: " + tag)
-                data_tags[tag] = data_tags[tag] + 1
-                document = NewsObject(row['content'], tag)
-                document_id = collection.insert_one(document.__dict__)
-            
-    print(f'Processed {line_count} lines.')
\ No newline at end of file
+    counts, duplicates = ingest(args.file, args.processes, args.chunk_size << 20, args.restart)
+    print(f'Saved {sum(counts.values())} documents.')
+    print('Near duplicates:')
+    print(duplicates_report(counts, duplicates))
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import time
+from collections import Counter
+from itertools import count
+import numpy as np
+import torch.distributed as dist
+from torchtext import data
+from .token_store import TokenStore, TokenStoreWriter
+from .batching import example_loader, store_example
+from .splits import SPLIT_SEED
+
+MANIFEST_FILE = 'manifest.json'
+SHARDS_PER_RANK = 4
+POLL_INTERVAL = 1.0
+
+def distributed_rank():
+    """(rank, world size) of this process, from torch.distributed or the RANK and WORLD_SIZE variables of torchrun."""
+    if dist.is_available() and dist.is_initialized():
+        return dist.get_rank(), dist.get_world_size()
+    return int(os.environ.get('RANK', 0)), int(os.environ.get('WORLD_SIZE', 1))
+
+def wait_for(ready):
+    # the other ranks wait for rank 0 to write shared files, which are always committed last
+    while not ready():
+        time.sleep(POLL_INTERVAL)
+
+def from_rank0(value):
+    """The value of rank 0 on every rank, when there is a process group, such as the key of a cache rank 0 writes."""
+    if not (dist.is_available() and dist.is_initialized()):
+        return value
+    values = [value]
+    dist.broadcast_object_list(values, src=0)
+    return values[0]
+
+def rank_file(filename):
+    # every rank of a distributed job trains a model of its own and writes its own log
+    rank, world_size = distributed_rank()
+    return filename if world_size == 1 else '%s.rank%d' % (filename, rank)
+
+def read_manifest(directory):
+    with open(os.path.join(directory, MANIFEST_FILE), 'r') as file:
+        return json.load(file)
+
+def has_manifest(directory):
+    return os.path.isfile(os.path.join(directory, MANIFEST_FILE))
+
+def shard_directory(path, name, rows, num_shards):
+    # a split of a store is sharded once for every set of rows and shard count
+    key = hashlib.sha1(np.ascontiguousarray(rows, dtype=np.int64).tobytes() + str(num_shards).encode('utf-8')).hexdigest()
+    return os.path.join(path, 'shards', name + '-' + key[:16])
+
+def default_shards():
+    # a few shards per rank, so the assignment has something to reshuffle every epoch
+    return SHARDS_PER_RANK * distributed_rank()[1]
+
+def write_shards(store, rows, directory, num_shards):
+    """
+    Writes the given rows of a TokenStore to num_shards token stores plus a manifest.
+
+    Rows are dealt round robin in label order, so every shard gets about the
+    same number of documents and the same label mix. The manifest lists the documents,
+    tokens and label counts of every shard and is written last.
+    """
+    shards = ['shard-%05d' % i for i in range(num_shards)]
+    writers = [TokenStoreWriter(os.path.join(directory, shard)) for shard in shards]
+    label_counts = [Counter() for _ in shards]
+    rows = np.asarray(rows)
+    rows = rows[np.argsort(store.labels[rows], kind='stable')]
+    for position, row in enumerate(rows):
+        label = int(store.labels[row])
+        writers[position % num_shards].add(store[row], label)
+        label_counts[position % num_shards][label] += 1
+    manifest = {'shards': []}
+    for shard, writer, counts in zip(shards, writers, label_counts):
+        writer.close()
+        manifest['shards'].append({'path': shard, 'documents': writer.documents, 'tokens': writer.total,
+                                   'labels': {str(label): n for label, n in sorted(counts.items())}})
+    tmp_file = os.path.join(directory, MANIFEST_FILE + '.tmp')
+    with open(tmp_file, 'w') as file:
+        json.dump(manifest, file)
+    os.replace(tmp_file, os.path.join(directory, MANIFEST_FILE))
+    return manifest
+
+def shard_split(store, name, rows, num_shards=None):
+    """Returns the directory of the given rows of store in shards, written by rank 0 the first time."""
+    num_shards = num_shards or default_shards()
+    directory = shard_directory(store.path, name, rows, num_shards)
+    if not has_manifest(directory):
+        if distributed_rank()[0] == 0:
+            write_shards(store, rows, directory, num_shards)
+        else:
+            wait_for(lambda: has_manifest(directory))
+    return directory
+
+def shard_loader(fields, itos, policy, stores, **loader_args):
+    # the examples of all assigned shards in one example_loader, labels mapped back through the label vocabulary
+    examples = [store_example(sequence, itos[store.labels[i]]) for store in stores for i in range(len(store)) for sequence in policy.apply(store[i])]
+    return example_loader(data.Dataset(examples, fields), **loader_args)
+
+class ShardedLoader():
+    """
+    Batches of the shards assigned to this rank.
+
+    Every epoch the shards are dealt to the ranks in a new order, drawn from the
+    seed and the epoch so that all ranks agree without talking to each other,
+    and each rank only maps its own shards. make_loader builds a loader from a
+    list of TokenStores. An infinite loader moves to the next epoch by itself
+    and should be iterated once; otherwise call set_epoch before every epoch.
+    """
+    def __init__(self, directory, make_loader, seed=SPLIT_SEED, infinite=False):
+        self.directory = directory
+        self.manifest = read_manifest(directory)
+        self.make_loader = make_loader
+        self.seed = seed
+        self.infinite = infinite
+        self.rank, self.world_size = distributed_rank()
+        self.epoch = 0
+        self.loader = None
+
+    def assigned_shards(self, epoch):
+        shards = self.manifest['shards']
+        order = np.random.RandomState(self.seed + epoch).permutation(len(shards))
+        return [shards[i] for i in order[self.rank::self.world_size]]
+
+    def set_epoch(self, epoch):
+        if epoch != self.epoch:
+            self.epoch = epoch
+            self.loader = None
+
+    def _loader(self):
+        if self.loader is None:
+            stores = [TokenStore(os.path.join(self.directory, shard['path'])) for shard in self.assigned_shards(self.epoch)]
+            self.loader = self.make_loader(stores)
+        return self.loader
+
+    def __iter__(self):
+        if not self.infinite:
+            return iter(self._loader())
+        return self._epochs()
+
+    def _epochs(self):
+        for epoch in count(self.epoch):
+            self.set_epoch(epoch)
+            for batch in self._loader():
+                yield batch
+
+    def __len__(self):
+        return len(self._loader())
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import numpy as np
+from .corpus_cache import CACHE_DIR
+
+SPLIT_DIR = os.path.join(CACHE_DIR, 'splits')
+SPLIT_SEED = 1234
+
+def _labels_digest(labels):
+    digest = hashlib.sha1()
+    for label in labels:
+        digest.update(str(label).encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+def manifest_file(labels, kind, params, directory=SPLIT_DIR):
+    # splits only depend on the labels and the parameters, so the manifest is named after them
+    key = hashlib.sha1(json.dumps([kind, params, _labels_digest(labels)], sort_keys=True).encode('utf-8')).hexdigest()
+    return os.path.join(directory, kind + '-' + key + '.npz')
+
+def save_manifest(path, splits):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # every process of a distributed job computes the same manifest, so each writes its own temporary file
+    tmp_file = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_file, 'wb') as file:
+        np.savez(file, **splits)
+    os.replace(tmp_file, path)
+
+def load_manifest(path):
+    with np.load(path) as manifest:
+        return {name: manifest[name] for name in manifest.files}
+
+def stratified_split(labels, ratios, seed=SPLIT_SEED):
+    """
+    Splits the row indices of every label by ratios, a list of (name, fraction).
+
+    Like torchtext's stratified Dataset.split, but deterministic for a seed.
+    The indices of every split are sorted, so reading them follows the order
+    of the corpus on disk.
+    """
+    labels = np.asarray(labels)
+    random = np.random.RandomState(seed)
+    fractions = np.cumsum([fraction for _, fraction in ratios])
+    fractions /= fractions[-1]
+    splits = {name: [] for name, _ in ratios}
+    for label in np.unique(labels):
+        rows = random.permutation(np.flatnonzero(labels == label))
+        cuts = np.round(fractions * len(rows)).astype(np.int64)
+        for (name, _), start, end in zip(ratios, np.concatenate([[0], cuts[:-1]]), cuts):
+            splits[name].append(rows[start:end])
+    return {name: np.sort(np.concatenate(parts)).astype(np.int64) for name, parts in splits.items()}
+
+def head_split(labels, number_per_class):
+    """Puts the first number_per_class rows of every label in 'labeled' and the rest in 'unlabeled'."""
+    labels = np.asarray(labels)
+    labeled = np.concatenate([np.flatnonzero(labels == label)[:number_per_class] for label in np.unique(labels)])
+    labeled = np.sort(labeled).astype(np.int64)
+    return {'labeled': labeled, 'unlabeled': np.setdiff1d(np.arange(len(labels)), labeled)}
+
+def segmented_split(labels, ratios, seed=SPLIT_SEED, segments=None):
+    """
+    stratified_split of every segment of labels on its own, segments being the
+    ends of the segments. A corpus that grows by appending keeps the split of
+    the rows it had and only the appended rows are split.
+    """
+    splits = {name: [] for name, _ in ratios}
+    for start, end in zip([0] + list(segments[:-1]), segments):
+        for name, rows in stratified_split(labels[start:end], ratios, seed).items():
+            splits[name].append(rows + start)
+    return {name: np.concatenate(parts).astype(np.int64) for name, parts in splits.items()}
+
+def split_manifest(labels, ratios, seed=SPLIT_SEED, directory=SPLIT_DIR, segments=None):
+    """Returns the stratified_split of labels, or its segmented_split, computing it only the first time for the labels, ratios and seed."""
+    params = {'ratios': ratios, 'seed': seed}
+    if segments is not None and len(segments) > 1:
+        params['segments'] = list(segments)
+    path = manifest_file(labels, 'stratified', params, directory)
+    if os.path.isfile(path):
+        return load_manifest(path)
+    if 'segments' in params:
+        splits = segmented_split(np.asarray(labels), ratios, seed, segments)
+    else:
+        splits = stratified_split(labels, ratios, seed)
+    save_manifest(path, splits)
+    return splits
+
+def labeled_manifest(labels, number_per_class, directory=SPLIT_DIR):
+    """Returns the head_split of labels, computing it only the first time for the labels and number_per_class."""
+    path = manifest_file(labels, 'labeled', {'number_per_class': number_per_class}, directory)
+    if os.path.isfile(path):
+        return load_manifest(path)
+    splits = head_split(labels, number_per_class)
+    save_manifest(path, splits)
+    return splits
@@ -0,0 +1,94 @@
+import random
+import zlib
+from itertools import islice
+from torch.utils.data import IterableDataset, get_worker_info
+from .batching import TokenBudgetBatchSampler
+
+SHUFFLE_BUFFER = 4096
+BATCH_WINDOW = 256
+# fractions of the corpus in the train and validation splits, the rest is test;
+# the same 0.64 / 0.16 / 0.2 as the two stratified 0.8 splits of the in-memory mode
+SPLITS = (('train', 0.64), ('valid', 0.16), ('test', 0.2))
+
+def shuffle_buffer(items, size=SHUFFLE_BUFFER):
+    """
+    Shuffles a stream with a buffer of size items.
+
+    Every incoming item replaces a random item of the full buffer, which is
+    yielded. The order is only random within a window of about size items, but
+    memory stays bounded whatever the length of the stream.
+    """
+    buffer = []
+    for item in items:
+        if len(buffer) < size:
+            buffer.append(item)
+            continue
+        index = random.randrange(size)
+        yield buffer[index]
+        buffer[index] = item
+    random.shuffle(buffer)
+    yield from buffer
+
+def split_of(key):
+    """Assigns a record to a split by a hash of its key, so every pass agrees on the splits."""
+    position = (zlib.crc32(str(key).encode('utf-8')) & 0xffffffff) / 2**32
+    for name, fraction in SPLITS:
+        if position < fraction:
+            return name
+        position -= fraction
+    return SPLITS[-1][0]
+
+def worker_shard(records):
+    # every DataLoader worker reads the stream and keeps its own share of the records
+    worker = get_worker_info()
+    if worker is None:
+        return records
+    return islice(records, worker.id, None, worker.num_workers)
+
+def budget_batches(items, length, batch_size=None, max_tokens=None, window=BATCH_WINDOW):
+    """
+    Groups a stream into batches with TokenBudgetBatchSampler.
+
+    The items are taken window batches at a time (window x batch_size items, or
+    window x max_tokens tokens) and the window is bucketed by length, so
+    padding stays low without reading ahead more than one window.
+    """
+    items = iter(items)
+    while True:
+        chunk = []
+        tokens = 0
+        for item in items:
+            chunk.append(item)
+            tokens += length(item)
+            if (max_tokens is None and len(chunk) >= window * batch_size) or (max_tokens is not None and tokens >= window * max_tokens):
+                break
+        if not chunk:
+            return
+        sampler = TokenBudgetBatchSampler([length(item) for item in chunk], max_tokens=max_tokens, batch_size=batch_size, bucket_size=len(chunk))
+        for batch in sampler:
+            yield [chunk[index] for index in batch]
+
+class StreamingDataset(IterableDataset):
+    """
+    Corpus read and tokenized on the fly, for corpora that do not fit in memory.
+
+    read() returns a fresh iterable of raw records on every pass and encode
+    turns a record into a list of training items, empty to drop it. Items pass through
+    a shuffle buffer, and through batch when one is given, so only
+    the buffers are ever held in memory. Both functions are sent to the
+    DataLoader workers, which split the records between them.
+    """
+    def __init__(self, read, encode, shuffle=True, buffer_size=SHUFFLE_BUFFER, batch=None):
+        self.read = read
+        self.encode = encode
+        self.shuffle = shuffle
+        self.buffer_size = buffer_size
+        self.batch = batch
+
+    def __iter__(self):
+        items = (item for record in worker_shard(iter(self.read())) for item in self.encode(record))
+        if self.shuffle:
+            items = shuffle_buffer(items, self.buffer_size)
+        if self.batch is not None:
+            items = self.batch(items)
+        return iter(items)
@@ -0,0 +1,102 @@
+import argparse
+import hashlib
+import os
+import sentencepiece as spm
+
+VOCAB_SIZE = 16000
+MODEL_TYPES = ('unigram', 'bpe')
+# documents are fed to the trainer whole, up to this many bytes each
+MAX_TRAINING_LENGTH = 1 << 16
+# documents sampled by the trainer, it holds them all in memory
+TRAINING_SAMPLE = 1000000
+# SentencePiece marks the pieces that start a word with it
+WORD_START = '▁'
+
+def train_subword_model(texts, model_file, vocab_size=VOCAB_SIZE, model_type='unigram', sample_size=TRAINING_SAMPLE):
+    """
+    Trains a SentencePiece model on texts, an iterable of documents, and saves
+    it to model_file.
+
+    The texts are lowercased like the word tokenizers do. Characters the model
+    has no piece for fall back to their utf-8 bytes, so every text can be
+    encoded without unknown pieces.
+    """
+    tmp_file = model_file + '.tmp'
+    with open(tmp_file, 'wb') as model:
+        spm.SentencePieceTrainer.train(sentence_iterator=(text.lower() for text in texts if text.strip()), model_writer=model,
+                                       vocab_size=vocab_size, model_type=model_type, byte_fallback=True,
+                                       input_sentence_size=sample_size, shuffle_input_sentence=True,
+                                       max_sentence_length=MAX_TRAINING_LENGTH, num_threads=os.cpu_count(),
+                                       bos_id=-1, eos_id=-1, minloglevel=1)
+    os.replace(tmp_file, model_file)
+
+class SubwordTokenizer():
+    """
+    Tokenizer of a trained SentencePiece model, a drop-in for extract_words.
+
+    Splits a text into at most the model's vocabulary size of distinct pieces,
+    so the vocabulary stays fixed however much the corpus grows. It pickles as
+    the path of the model, every process loads the model itself, and its
+    fingerprint is a hash of the model, so caches built with another model are
+    not reused. encode_batch() encodes a whole list of texts in one call.
+    """
+    def __init__(self, model_file):
+        self.model_file = os.path.abspath(model_file)
+        with open(self.model_file, 'rb') as file:
+            self.digest = hashlib.sha1(file.read()).hexdigest()
+        self._processor = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['_processor'] = None
+        return state
+
+    @property
+    def processor(self):
+        if self._processor is None:
+            self._processor = spm.SentencePieceProcessor(model_file=self.model_file)
+        return self._processor
+
+    def __call__(self, text):
+        return self.processor.encode(text.lower(), out_type=str)
+
+    def encode_batch(self, texts):
+        return self.processor.encode([text.lower() for text in texts], out_type=str)
+
+    def fingerprint(self):
+        return 'sentencepiece-' + self.digest
+
+    def vector_words(self, itos):
+        # a piece that starts a word can take the pre-trained vector of that word, the other pieces have none
+        return [piece[1:] if piece.startswith(WORD_START) and len(piece) > 1 else None for piece in itos]
+
+    def __len__(self):
+        return self.processor.get_piece_size()
+
+    def __str__(self):
+        return 'sentencepiece:' + self.model_file
+
+if __name__ == '__main__':
+    # usage: python -m dataset.subword <model file> [--files <csv or parquet file> ...]
+    from .columnar import read_rows
+    parser = argparse.ArgumentParser(description='Train a subword tokenizer on the corpus for the --subword option of the loaders')
+    parser.add_argument('model_file', type=str,
+                        help='file to save the SentencePiece model to')
+    parser.add_argument('--vocab_size', type=int, default=VOCAB_SIZE,
+                        help='number of pieces of the vocabulary')
+    parser.add_argument('--model_type', type=str, choices=MODEL_TYPES, default='unigram',
+                        help='unigram language model or byte pair encoding')
+    parser.add_argument('--files', type=str, nargs='+', default=None,
+                        help='train on the content column of these csv or parquet files instead of the MongoDB collection')
+    parser.add_argument('--header', action='store_true',
+                        help='the csv files start with a header row')
+    args = parser.parse_args()
+
+    if args.files:
+        texts = (row[1] for path in args.files for row in read_rows(path, header=args.header))
+    else:
+        from . import database_connection
+        from .parallel_reader import read_documents
+        texts = (document['content'] for document in read_documents(database_connection.collection, projection={'content': 1}))
+    train_subword_model(texts, args.model_file, args.vocab_size, args.model_type)
+    print('Saved a {} model of {} pieces to {}'.format(args.model_type, len(SubwordTokenizer(args.model_file)), args.model_file))
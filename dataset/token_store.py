@@ -0,0 +1,104 @@
+import json
+import os
+from array import array
+import numpy as np
+
+TOKENS_FILE = 'tokens.i32'
+OFFSETS_FILE = 'offsets.i64'
+LABELS_FILE = 'labels.i64'
+STORE_META = 'store.json'
+FLUSH_SIZE = 1 << 22
+
+def read_meta(path):
+    with open(os.path.join(path, STORE_META), 'r') as file:
+        return json.load(file)
+
+def exists(path):
+    return os.path.isfile(os.path.join(path, STORE_META))
+
+def _map(filename, dtype, count):
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(filename, dtype=dtype, mode='r', shape=(count,))
+
+class TokenStore():
+    """
+    Compact corpus of token ids, memory-mapped read-only from disk.
+
+    All documents are concatenated into one int32 token array. Document i spans
+    tokens[offsets[i]:offsets[i+1]] and has label labels[i]. Indexing returns a
+    view into the mapping, so no per-document Python objects are created and
+    every process that maps the same store shares its pages.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.meta = read_meta(path)
+        documents = self.meta['documents']
+        self.tokens = _map(os.path.join(path, TOKENS_FILE), np.int32, self.meta['tokens'])
+        self.offsets = _map(os.path.join(path, OFFSETS_FILE), np.int64, documents + 1)
+        self.labels = _map(os.path.join(path, LABELS_FILE), np.int64, documents)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, index):
+        return self.tokens[self.offsets[index]:self.offsets[index + 1]]
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+class TokenStoreWriter():
+    """
+    Streams documents into a TokenStore directory.
+
+    Token ids are buffered and appended to the flat files in large chunks. The
+    store meta file is only written by close(), so readers never see a store
+    that is half written. With append=True new documents are added after the
+    ones already in the store, after dropping anything past the last close().
+    """
+    def __init__(self, path, append=False):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if append and exists(path):
+            meta = read_meta(path)
+            self.documents = meta['documents']
+            self.total = meta['tokens']
+            self._truncate(TOKENS_FILE, 4 * self.total)
+            self._truncate(OFFSETS_FILE, 8 * (self.documents + 1))
+            self._truncate(LABELS_FILE, 8 * self.documents)
+            self.offsets = array('q')
+        else:
+            self.documents = 0
+            self.total = 0
+            for filename in (TOKENS_FILE, OFFSETS_FILE, LABELS_FILE):
+                open(os.path.join(path, filename), 'wb').close()
+            self.offsets = array('q', [0])
+        self.tokens = array('i')
+        self.labels = array('q')
+
+    def _truncate(self, filename, size):
+        with open(os.path.join(self.path, filename), 'ab') as file:
+            file.truncate(size)
+
+    def add(self, token_ids, label):
+        self.tokens.extend(token_ids)
+        self.total += len(token_ids)
+        self.offsets.append(self.total)
+        self.labels.append(label)
+        self.documents += 1
+        if len(self.tokens) >= FLUSH_SIZE:
+            self.flush()
+
+    def flush(self):
+        for filename, buffer in ((TOKENS_FILE, self.tokens), (OFFSETS_FILE, self.offsets), (LABELS_FILE, self.labels)):
+            with open(os.path.join(self.path, filename), 'ab') as file:
+                buffer.tofile(file)
+            del buffer[:]
+
+    def close(self, **info):
+        self.flush()
+        meta = dict(info, documents=self.documents, tokens=self.total)
+        tmp_file = os.path.join(self.path, STORE_META + '.tmp')
+        with open(tmp_file, 'w') as file:
+            json.dump(meta, file)
+        os.replace(tmp_file, os.path.join(self.path, STORE_META))
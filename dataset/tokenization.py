@@ -0,0 +1,93 @@
+import os
+import re
+from collections import Counter, OrderedDict, deque
+from itertools import islice
+from multiprocessing import Pool
+
+NON_WORD = re.compile(r"[^\w]")
+PUNCTUATION = re.compile(r"\W+")
+IGNORED_WORDS = frozenset(['a', 'the', 'is'])
+SHARD_SIZE = 500
+
+def extract_words(sentence):
+    words = NON_WORD.sub(" ", sentence).split()
+    return [w.lower() for w in words if w not in IGNORED_WORDS]
+
+def split_by_punct(segment):
+    """Splits str segment by punctuation, filters our empties and spaces."""
+    return [s for s in PUNCTUATION.split(segment) if s and not s.isspace()]
+
+def tokenize_batch(tokenizer, texts):
+    # a tokenizer with encode_batch, such as a SubwordTokenizer, encodes the whole list in one call
+    if hasattr(tokenizer, 'encode_batch'):
+        return tokenizer.encode_batch(texts)
+    return [tokenizer(text) for text in texts]
+
+def _tokenize_shard(task):
+    tokenizer, texts = task
+    tokens = tokenize_batch(tokenizer, texts)
+    counts = Counter()
+    for words in tokens:
+        counts.update(words)
+    return tokens, counts
+
+def _shards(texts, tokenizer, shard_size):
+    texts = iter(texts)
+    shard = list(islice(texts, shard_size))
+    while shard:
+        yield tokenizer, shard
+        shard = list(islice(texts, shard_size))
+
+def tokenize_shards(texts, tokenizer, processes=None, shard_size=SHARD_SIZE):
+    """
+    Tokenizes texts on a process pool.
+
+    texts can be any iterable and is consumed lazily, shard_size texts at a time,
+    with at most two shards per process in flight, so a stream of any size can
+    be tokenized in bounded memory.
+    Yields (tokens, counts) per shard in input order: tokens holds one token
+    list per text and counts the token frequencies of the shard, so merging the
+    counts of all shards gives the counts of the corpus. tokenizer has to be
+    picklable, i.e. a module level function or a functools.partial of one.
+    """
+    processes = processes or os.cpu_count()
+    if processes == 1:
+        for task in _shards(texts, tokenizer, shard_size):
+            yield _tokenize_shard(task)
+        return
+    with Pool(processes) as pool:
+        # Pool.imap would read the whole input ahead, so keep a bounded queue of pending shards
+        pending = deque()
+        for task in _shards(texts, tokenizer, shard_size):
+            pending.append(pool.apply_async(_tokenize_shard, (task,)))
+            if len(pending) > 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+def tokenize_corpus(texts, tokenizer, processes=None, shard_size=SHARD_SIZE):
+    """Returns the token lists of all texts and their merged token frequencies."""
+    tokens = []
+    counts = Counter()
+    for shard_tokens, shard_counts in tokenize_shards(texts, tokenizer, processes, shard_size):
+        tokens.extend(shard_tokens)
+        counts.update(shard_counts)
+    return tokens, counts
+
+def extend_vocab(vocab, counts):
+    """
+    Adds the tokens of counts that a torchtext Vocab does not have yet at its
+    end, most frequent first, so the ids of the tokens it has do not change.
+    """
+    vocab.freqs.update(counts)
+    for token in sorted(counts, key=lambda token: (-counts[token], token)):
+        if token not in vocab.stoi:
+            vocab.stoi[token] = len(vocab.itos)
+            vocab.itos.append(token)
+
+def build_field_vocab(field, counts, **kwargs):
+    """Same as torchtext's Field.build_vocab, from token counts that were already merged."""
+    specials = list(OrderedDict.fromkeys(
+        tok for tok in [field.unk_token, field.pad_token, field.init_token, field.eos_token]
+        if tok is not None))
+    field.vocab = field.vocab_cls(counts, specials=specials, **kwargs)
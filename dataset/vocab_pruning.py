@@ -0,0 +1,121 @@
+from collections import Counter
+import numpy as np
+import torch
+from embeddings.embedding_store import vocabulary_vectors
+from .tokenization import build_field_vocab
+
+FLOAT_BYTES = 4
+
+class VocabLimits():
+    """
+    Limits on the size of a vocabulary, so rare words do not take up rows of
+    the embedding matrix and columns of a softmax over the vocabulary.
+
+    min_freq drops the words seen fewer times in the corpus, max_size keeps
+    only the most frequent words and coverage keeps the fewest most frequent
+    words that make up that fraction of all tokens. The limits that are set
+    all apply, and the words they drop are mapped to the unknown word.
+    """
+    def __init__(self, min_freq=1, max_size=None, coverage=None):
+        if min_freq < 1:
+            raise ValueError('the minimum frequency has to be at least 1, got %r' % min_freq)
+        if max_size is not None and max_size < 1:
+            raise ValueError('the maximum vocabulary size has to be at least 1, got %r' % max_size)
+        if coverage is not None and not 0 < coverage <= 1:
+            raise ValueError('the coverage target has to be in (0, 1], got %r' % coverage)
+        self.min_freq = min_freq
+        self.max_size = max_size
+        self.coverage = coverage
+
+    def __bool__(self):
+        return self.min_freq > 1 or self.max_size is not None or self.coverage is not None
+
+    def __str__(self):
+        limits = []
+        if self.min_freq > 1:
+            limits.append('min_freq=%d' % self.min_freq)
+        if self.max_size is not None:
+            limits.append('max_size=%d' % self.max_size)
+        if self.coverage is not None:
+            limits.append('coverage=%g' % self.coverage)
+        return ', '.join(limits) or 'none'
+
+    def kept(self, counts):
+        """The words of counts, a word to frequency mapping, that are kept, most frequent first."""
+        # the same order as torchtext's Vocab, by frequency and then alphabetically
+        words = sorted(counts, key=lambda word: (-counts[word], word))
+        frequencies = np.array([counts[word] for word in words], dtype=np.int64)
+        size = int(np.searchsorted(-frequencies, -self.min_freq, side='right'))
+        if self.coverage is not None and len(frequencies):
+            covered = np.cumsum(frequencies)
+            size = min(size, int(np.searchsorted(covered, self.coverage * covered[-1])) + 1)
+        if self.max_size is not None:
+            size = min(size, self.max_size)
+        return words[:size]
+
+def pruning_report(limits, words, kept_words, tokens, kept_tokens, dim):
+    return 'Vocabulary pruned by %s: %d -> %d words covering %.2f%% of the tokens, %d-d embeddings %.1f MB -> %.1f MB' % (
+        limits, words, kept_words, 100.0 * kept_tokens / max(tokens, 1), dim,
+        words * dim * FLOAT_BYTES / 2**20, kept_words * dim * FLOAT_BYTES / 2**20)
+
+def prune_field_vocab(field, limits):
+    """
+    Replaces the vocabulary of a torchtext field by the words limits keeps.
+
+    The token ids in a corpus cache refer to the full vocabulary, which is what
+    the cache keeps, so the pruning is redone from its frequencies on every
+    load and a word that becomes frequent enough after a sync is picked up.
+    Returns the full vocabulary and a LongTensor that maps its ids to the ids
+    of the pruned one, which the batches apply, or None for the map when
+    limits is not set.
+    """
+    full = field.vocab
+    if not limits:
+        return full, None
+    build_field_vocab(field, Counter({word: full.freqs[word] for word in limits.kept(full.freqs)}))
+    # stoi is a defaultdict, get() does not add the words that were dropped
+    unk = field.vocab.stoi[field.unk_token]
+    remap = torch.tensor([field.vocab.stoi.get(word, unk) for word in full.itos], dtype=torch.long)
+    return full, remap
+
+def field_pruning_report(limits, full, pruned, dim):
+    return pruning_report(limits, len(full), len(pruned), sum(full.freqs.values()), sum(pruned.freqs.values()), dim)
+
+def prune_dictionary(dictionary, limits):
+    """
+    Ids of the words of a gan Dictionary after pruning, as a LongTensor that
+    maps the dictionary ids to them, and the size of the pruned vocabulary.
+
+    The kept words keep their order and a last id stands for all the dropped
+    words, so the dictionary itself, and everything encoded with it, does not
+    change. Returns (None, len(dictionary)) when limits is not set.
+    """
+    if not limits:
+        return None, len(dictionary)
+    counts = dict(zip(dictionary.idx2word, dictionary.counts))
+    kept = np.zeros(len(dictionary), dtype=bool)
+    kept[[dictionary.word2idx[word] for word in limits.kept(counts)]] = True
+    unk = int(kept.sum())
+    remap = np.full(len(dictionary), unk, dtype=np.int64)
+    remap[kept] = np.arange(unk)
+    return torch.from_numpy(remap), unk + 1
+
+def dictionary_pruning_report(limits, dictionary, remap, size, dim):
+    counts = np.array(dictionary.counts, dtype=np.int64)
+    # the last id is the one of the dropped words
+    kept_tokens = counts[(remap < size - 1).numpy()].sum()
+    return pruning_report(limits, len(dictionary), size, counts.sum(), kept_tokens, dim)
+
+def pruned_vectors(field, embedding, limits):
+    """
+    Prunes the vocabulary of field and loads the embedding vectors of the
+    words that are left, so only the kept rows are ever materialized. Returns
+    the id map of prune_field_vocab.
+    """
+    full, remap = prune_field_vocab(field, limits)
+    # subword pieces are looked up by the word they start, see dataset/subword.py
+    words = field.tokenize.vector_words(field.vocab.itos) if hasattr(field.tokenize, 'vector_words') else None
+    field.vocab.vectors = vocabulary_vectors(embedding, field.vocab.itos, words)
+    if remap is not None:
+        print(field_pruning_report(limits, full, field.vocab, field.vocab.vectors.size(1)))
+    return remap
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+import torch
+from torchtext.vocab import Vectors, GloVe
+
+# embedding choice -> (pre-trained vectors file, directory it is cached in)
+EMBEDDINGS = {
+    'glove_specific': ('glove.vec', 'specific-embeddings'),
+    'glove_generic': ('glove.6B.300d.txt', '.vector_cache'),
+    'fasttext_specific': ('fasttext.vec', 'specific-embeddings'),
+    'fasttext_generic': ('crawl-300d-2M.vec', '.fasttext_cache'),
+    'word2vec_specific': ('word2vec.vec', 'specific-embeddings'),
+    'word2vec_generic': ('embeddings.vec', '.word2vec_cache')
+}
+SUBSET_DIR = '.embedding_subsets'
+
+def store_files(embedding):
+    filename, cache = EMBEDDINGS[embedding]
+    base = os.path.join(cache, filename)
+    return base + '.f32', base + '.words', base + '.json'
+
+def is_converted(embedding):
+    return os.path.isfile(store_files(embedding)[2])
+
+def _write_meta(meta_file, rows, dim):
+    tmp_file = meta_file + '.tmp'
+    with open(tmp_file, 'w') as file:
+        json.dump({'rows': rows, 'dim': dim}, file)
+    os.replace(tmp_file, meta_file)
+
+def _convert_text(source, matrix_file, words_file):
+    rows = 0
+    dim = None
+    with open(source, 'rb') as file, open(matrix_file, 'wb') as matrix, open(words_file, 'w', encoding='utf-8', newline='') as words:
+        for line in file:
+            entries = line.rstrip().split(b' ')
+            word, entries = entries[0], entries[1:]
+            if dim is None and len(entries) > 1:
+                dim = len(entries)
+            elif len(entries) != dim:
+                # the "<rows> <dim>" header of .vec files and malformed lines
+                continue
+            try:
+                word = word.decode('utf-8')
+            except UnicodeDecodeError:
+                continue
+            np.array(entries).astype(np.float32).tofile(matrix)
+            words.write(word + '\n')
+            rows += 1
+    return rows, dim
+
+def _convert_torchtext(cached, matrix_file, words_file):
+    itos, stoi, vectors, dim = torch.load(cached)
+    vectors.numpy().astype(np.float32).tofile(matrix_file)
+    with open(words_file, 'w', encoding='utf-8', newline='') as words:
+        for word in itos:
+            words.write(word + '\n')
+    return len(itos), dim
+
+def convert(embedding):
+    """
+    Converts one of the pre-trained embeddings to a raw float32 matrix plus a
+    word list, reusing the torchtext .pt cache when one already exists.
+    """
+    filename, cache = EMBEDDINGS[embedding]
+    source = os.path.join(cache, filename)
+    matrix_file, words_file, meta_file = store_files(embedding)
+    if not os.path.isfile(source) and not os.path.isfile(source + '.pt'):
+        # let torchtext fetch the file (only GloVe has a download url) and write its cache
+        if embedding == 'glove_generic':
+            GloVe(name='6B', dim=300, cache=cache)
+        else:
+            Vectors(name=filename, cache=cache)
+    print("Converting " + source + " to a memory-mapped embedding store")
+    if os.path.isfile(source + '.pt'):
+        rows, dim = _convert_torchtext(source + '.pt', matrix_file, words_file)
+    else:
+        rows, dim = _convert_text(source, matrix_file, words_file)
+    _write_meta(meta_file, rows, dim)
+
+class MappedVectors(Vectors):
+    """
+    Pre-trained vectors backed by a memory-mapped float32 matrix.
+
+    A drop-in replacement for torchtext.vocab.Vectors in Field.build_vocab.
+    Only the word index is read into memory. The matrix is mapped copy-on-write:
+    the file is never modified and the pages stay shared between every process
+    using the same embedding.
+    """
+    def __init__(self, embedding, unk_init=None):
+        if not is_converted(embedding):
+            convert(embedding)
+        matrix_file, words_file, meta_file = store_files(embedding)
+        with open(meta_file, 'r') as file:
+            meta = json.load(file)
+        with open(words_file, 'r', encoding='utf-8', newline='') as file:
+            self.itos = file.read().split('\n')[:meta['rows']]
+        self.stoi = {word: i for i, word in enumerate(self.itos)}
+        self.name = embedding
+        self.dim = meta['dim']
+        self.unk_init = torch.Tensor.zero_ if unk_init is None else unk_init
+        self.matrix = np.memmap(matrix_file, dtype=np.float32, mode='c', shape=(meta['rows'], meta['dim']))
+        self.vectors = torch.from_numpy(self.matrix)
+
+    def __getitem__(self, token):
+        if token in self.stoi:
+            return self.vectors[self.stoi[token]]
+        else:
+            return self.unk_init(torch.Tensor(self.dim))
+
+def vocabulary_vectors(embedding, itos, words=None):
+    """
+    Returns the embedding matrix of a vocabulary, one row per entry of itos.
+
+    The rows are cached in SUBSET_DIR under a hash of the embedding name and the
+    vocabulary, so later runs read a file the size of the vocabulary instead of
+    the pre-trained embedding. Words without a pre-trained vector get a zero
+    row, like torchtext's default unk_init. words, when given, are the words
+    whose vectors the entries of itos take, None for an entry without one.
+    """
+    if words is not None:
+        itos = [word or '' for word in words]
+    digest = hashlib.sha1('\n'.join([embedding] + list(itos)).encode('utf-8')).hexdigest()
+    subset_file = os.path.join(SUBSET_DIR, embedding + '-' + digest + '.npy')
+    if os.path.isfile(subset_file):
+        return torch.from_numpy(np.load(subset_file))
+
+    vectors = MappedVectors(embedding)
+    rows = np.array([vectors.stoi.get(token.strip(), -1) for token in itos], dtype=np.int64)
+    found = rows >= 0
+    matrix = np.zeros((len(itos), vectors.dim), dtype=np.float32)
+    matrix[found] = vectors.matrix[rows[found]]
+    print("Found pre-trained vectors for {} of {} words".format(int(found.sum()), len(itos)))
+
+    os.makedirs(SUBSET_DIR, exist_ok=True)
+    tmp_file = subset_file + '.tmp'
+    with open(tmp_file, 'wb') as file:
+        np.save(file, matrix)
+    os.replace(tmp_file, subset_file)
+    return torch.from_numpy(matrix)
+
+if __name__ == '__main__':
+    # usage: python -m embeddings.embedding_store [embedding ...], converts all six embeddings by default
+    for embedding in sys.argv[1:] or sorted(EMBEDDINGS):
+        convert(embedding)
@@ -1,14 +1,19 @@
 from pymongo import MongoClient
 import gensim
+from dataset.parallel_reader import read_parallel
 
 client = MongoClient()
 db = client.fake_news
 collection = db.fake_news_corpus
 
 
+def preprocess_documents(documents):
+    # runs on the decode processes of read_parallel
+    return [gensim.utils.simple_preprocess(document.get('content')) for document in documents]
+
 clean_documents = []
-for document in collection.find():
-    clean_documents.append(gensim.utils.simple_preprocess(document.get('content')))
+for documents in read_parallel(collection, projection={'content': 1}, transform=preprocess_documents):
+    clean_documents.extend(documents)
 
 model = gensim.models.Word2Vec(clean_documents, size=300, window=10, min_count=2, workers=10, iter=10)
 
@@ -1,33 +1,37 @@
 import torch
 import gensim
-import torchtext.vocab as vocab
+from embeddings.embedding_store import MappedVectors
+from dataset.length_policy import LengthPolicy
+from dataset.vocab_pruning import VocabLimits
+from dataset.tokenization import extract_words
+from precision import FLOAT32
 
 CUDA_DEVICE = 2
+# batch by a budget of batch size x padded length instead of a fixed batch size, set by main.py --max_tokens
+MAX_TOKENS = None
+# read and tokenize the corpus on the fly instead of loading it up front, set by main.py --streaming
+STREAMING = False
+# seed of the persisted train / validation / test split, set by main.py --split_seed
+SPLIT_SEED = 1234
+# batch size of the validation and test passes, which keep no gradients, set by main.py --eval_batch_size
+EVAL_BATCH_SIZE = 64
+# worker processes per training process that build batches ahead of the model, set by main.py --num_workers
+NUM_WORKERS = 0
+# documents of every label sampled by the server for a quick experiment, all documents when None, set by main.py --per_label
+PER_LABEL = None
+# cap on the length of every document, see dataset/length_policy.py, set by main.py --length_policy
+LENGTH_POLICY = LengthPolicy()
+# pruning of the word vocabulary, see dataset/vocab_pruning.py, set by main.py --min_freq, --max_vocab and --vocab_coverage
+VOCAB_LIMITS = VocabLimits()
+# splits the articles into tokens, a SubwordTokenizer from dataset/subword.py when main.py --subword is set
+TOKENIZER = extract_words
+# precision of the forward passes, bfloat16 autocasts them with float32 weights, set by main.py --precision
+PRECISION = FLOAT32
+# batches whose gradients are accumulated into one optimizer step, set by main.py --accumulation_steps
+ACCUMULATION_STEPS = 1
 
 device = torch.cuda.device(CUDA_DEVICE)
 
 def get_embedding_weights(embedding):
-    embeddings_file = ''
-    cache = ''
-    if embedding == 'glove_specific':
-        embeddings_file='glove.vec'
-        cache='specific-embeddings'
-    elif embedding == 'glove_generic':
-        embeddings_file='glove.6B.300d.txt'
-        cache='.vector_cache'
-    elif embedding == 'fasttext_specific':
-        embeddings_file = 'fasttext.vec'
-        cache = 'specific-embeddings'
-    elif embedding == 'fasttext_generic':
-        embeddings_file = 'crawl-300d-2M.vec'
-        cache = '.fasttext_cache'
-    elif embedding == 'word2vec_specific':
-        embeddings_file = 'word2vec.vec'
-        cache = 'specific-embeddings'
-    elif embedding == 'word2vec_generic':
-        embeddings_file = 'embeddings.vec'
-        cache = '.word2vec_cache'
-
-    model = vocab.Vectors(name=embeddings_file, cache=cache)
-
-    return torch.FloatTensor(model.vectors)
\ No newline at end of file
+    # the weights stay memory-mapped, see embeddings/embedding_store.py
+    return MappedVectors(embedding).vectors
@@ -8,8 +8,15 @@ import torch.nn as nn
 import torch.onnx
 import numpy as np
 import pickle
+from functools import partial
+from dataset.batching import TokenBudgetBatchSampler, loader_options
+from dataset.options import add_data_arguments, vocab_limits_from_args
+from dataset.vocab_pruning import prune_dictionary, dictionary_pruning_report
+from dataset.splits import labeled_manifest
+from accumulation import GradientAccumulator
+from precision import FLOAT32, autocast, delta_report
 import gan.discriminator_model as model
-import gan.data
+import gan.data as data
 import pandas as pd
 
 parser = argparse.ArgumentParser(description='PyTorch RNN/LSTM classification Model')
@@ -33,6 +40,9 @@ parser.add_argument('--nclass', type=int, default=4,
                     help='number of class in classification')
 parser.add_argument('--epochs', type=int, default=400,
                     help='upper epoch limit')
+add_data_arguments(parser)
+parser.add_argument('--streaming', action='store_true',
+                    help='read and tokenize the csv files on the fly instead of loading them up front')
 parser.add_argument('--batch_size', type=int, default=128, metavar='N',
                     help='batch size')
 parser.add_argument('--bptt', type=int, default=35,
@@ -63,6 +73,11 @@ parser.add_argument('--pre_train', type=str,
                     help='path to save the final model')
 
 args = parser.parse_args()
+vocab_limits = vocab_limits_from_args(args, parser)
+tokenizer = None
+if args.subword:
+    from dataset.subword import SubwordTokenizer
+    tokenizer = SubwordTokenizer(args.subword)
 
 # create the directory to save model if the directory is not exist
 if not os.path.exists(args.save):
@@ -85,47 +100,75 @@ device = torch.device("cuda" if args.cuda else "cpu")
 ###############################################################################
 # Load data
 ###############################################################################
-dic_exists = os.path.isfile(os.path.join(args.data, 'action_dictionary.pkl'))
-if dic_exists:
-    with open(os.path.join(args.data, 'action_dictionary.pkl'), 'rb') as input:
-        Corpus_Dic = pickle.load(input)
-else:
+Corpus_Dic = data.Dictionary.open(args.data, tokenizer)
+dic_exists = Corpus_Dic is not None
+if not dic_exists:
     Corpus_Dic = data.Dictionary()
+dic_size = len(Corpus_Dic)
 
-train_data_name = os.path.join(args.data, str(args.number_per_class)+'_labeled_train.csv')
-test_data_name = os.path.join(args.data, 'test.csv')
-
-train_data = data.Csv_DataSet(train_data_name)
-test_data = data.Csv_DataSet(test_data_name)
-train_data.load(dictionary=Corpus_Dic)
-test_data.load(dictionary=Corpus_Dic, train_mode=False)
+train_data_name = data.data_file(args.data, 'train')
+test_data_name = data.data_file(args.data, 'test')
 
-# save the dictionary
-if not dic_exists:
-    with open(os.path.join(args.data, 'action_dictionary.pkl'), 'wb') as output:
-        pickle.dump(Corpus_Dic, output, pickle.HIGHEST_PROTOCOL)
+# only the labeled rows of train are used, picked by the manifest of split_labeled_unlabeled.py
+if args.streaming:
+    if not dic_exists:
+        data.build_dictionary(train_data_name, Corpus_Dic, tokenizer=tokenizer)
+    labeled_rows = labeled_manifest(data.read_labels(train_data_name), args.number_per_class)['labeled']
+else:
+    train_data = data.Csv_DataSet(train_data_name, policy=args.length_policy, tokenizer=tokenizer)
+    test_data = data.Csv_DataSet(test_data_name, policy=args.length_policy, tokenizer=tokenizer)
+    train_data.load(dictionary=Corpus_Dic)
+    test_data.load(dictionary=Corpus_Dic, train_mode=False)
+    train_data.rows = labeled_manifest(train_data.labels, args.number_per_class)['labeled']
+
+# save the dictionary when it is new or the training data added words to it
+if not dic_exists or len(Corpus_Dic) != dic_size:
+    Corpus_Dic.save(os.path.join(args.data, data.dictionary_file(tokenizer)))
     print("load data and save the dictionary to '{}'".
-          format(os.path.join(args.data, 'action_dictionary.pkl')))
-
-bitch_size = args.batch_size
-train_loader = torch.utils.data.DataLoader(dataset=train_data,
-                                           batch_size=bitch_size,
-                                           shuffle=True,
-                                           collate_fn=data.collate_fn)
-
-test_loader = torch.utils.data.DataLoader(dataset=test_data,
-                                          batch_size=bitch_size,
-                                          shuffle=True,
-                                          collate_fn=data.collate_fn)
+          format(os.path.join(args.data, data.dictionary_file(tokenizer))))
+
+# the dictionary keeps every word, the batches map the dropped ones to a last unknown word
+vocab_remap, ntokens = prune_dictionary(Corpus_Dic, vocab_limits)
+collate = partial(data.collate_fn, remap=vocab_remap)
+
+bitch_size = None if args.max_tokens else args.batch_size
+if args.streaming:
+    train_loader = torch.utils.data.DataLoader(dataset=data.Csv_Stream(train_data_name, Corpus_Dic, batch_size=bitch_size, max_tokens=args.max_tokens, rows=labeled_rows, policy=args.length_policy, tokenizer=tokenizer),
+                                               batch_size=None,
+                                               collate_fn=collate,
+                                               **loader_options(args.num_workers, pin_memory=args.cuda))
+    test_loader = torch.utils.data.DataLoader(dataset=data.Csv_Stream(test_data_name, Corpus_Dic, shuffle=False, batch_size=bitch_size, max_tokens=args.max_tokens, policy=args.length_policy, tokenizer=tokenizer),
+                                              batch_size=None,
+                                              collate_fn=collate,
+                                              **loader_options(args.num_workers, pin_memory=args.cuda))
+    # the number of batches of a stream is only known once it has been read
+    num_batches = '?'
+else:
+    train_sampler = TokenBudgetBatchSampler(train_data.lengths(), max_tokens=args.max_tokens, batch_size=bitch_size)
+    train_loader = torch.utils.data.DataLoader(dataset=train_data,
+                                               batch_sampler=train_sampler,
+                                               collate_fn=collate,
+                                               **loader_options(args.num_workers, pin_memory=args.cuda))
+
+    test_sampler = TokenBudgetBatchSampler(test_data.lengths(), max_tokens=args.max_tokens, batch_size=bitch_size)
+    test_loader = torch.utils.data.DataLoader(dataset=test_data,
+                                              batch_sampler=test_sampler,
+                                              collate_fn=collate,
+                                              **loader_options(args.num_workers, pin_memory=args.cuda))
+    num_batches = len(train_loader)
 
 print('The size of the dictionary is', len(Corpus_Dic))
+print('Length policy:', args.length_policy)
+print('Tokenizer:', tokenizer or 'words')
+print('Precision:', args.precision)
+if vocab_remap is not None:
+    print(dictionary_pruning_report(vocab_limits, Corpus_Dic, vocab_remap, ntokens, args.emsize))
 
 ###############################################################################
 # Build the model
 ###############################################################################
 learning_rate = args.lr
 
-ntokens = len(Corpus_Dic)
 model = model.RNNModel(args.model, ntokens, args.emsize, args.nhid,
                        args.nlayers, args.nclass, args.dropout_em, 
                        args.dropout_rnn, args.dropout_cl, args.tied).to(device)
@@ -144,65 +187,72 @@ def train():
     model.train()
     total_loss = 0.
     start_time = time.time()
+    # the gradients of --accumulation_steps batches are summed, averaged and clipped before every step;
+    # `clip_grad_norm` helps prevent the exploding gradient problem in RNNs / LSTMs.
+    accumulator = GradientAccumulator(optimizer, model, args.accumulation_steps,
+                                      clip=lambda model: torch.nn.utils.clip_grad_norm_(model.parameters(), args.clip))
     for i_batch, sample_batched in enumerate(train_loader):
         # the sample batched has the following information
         # {token_seqs, next_token_seqs, importance_seqs, labels, seq_lengths, pad_length}
         # Starting each batch, we detach the hidden state from how it was previously produced.
         # If we didn't, the model would try backpropagating all the way to start of the dataset.
-        token_seqs = torch.from_numpy(np.transpose(sample_batched[0])).to(device)
-        labels = torch.from_numpy(np.transpose(sample_batched[3])).to(device)
-        seq_lengths = np.transpose(sample_batched[4])
+        token_seqs = sample_batched[0].to(device, non_blocking=True)
+        labels = sample_batched[3].to(device, non_blocking=True)
+        seq_lengths = sample_batched[4]
         hidden = model.init_hidden(token_seqs.shape[1])
-        output = model(token_seqs, hidden, seq_lengths)
-        element_loss = criterion(output, labels)
+        with autocast(args.precision, token_seqs.device):
+            output = model(token_seqs, hidden, seq_lengths)
+        # the loss and its gradient are computed in float32
+        element_loss = criterion(output.float(), labels)
         loss = torch.mean(element_loss)
-        # Before the backward pass, use the optimizer object to zero all of the
-        # gradients for the variables it will update (which are the learnable
-        # weights of the model). This is because by default, gradients are
-        # accumulated in buffers( i.e, not overwritten) whenever .backward()
-        # is called.
-        optimizer.zero_grad()
-
-        loss.backward()
-
-        # `clip_grad_norm` helps prevent the exploding gradient problem in RNNs / LSTMs.
-        torch.nn.utils.clip_grad_norm_(model.parameters(), args.clip)
-        optimizer.step()
+        accumulator.backward(loss, len(labels))
 
         total_loss += loss.item()
 
         if i_batch % args.log_interval == 0 and i_batch > 0:
             cur_loss = total_loss / args.log_interval
             elapsed = time.time() - start_time
-            print('| epoch {:3d} | {:5d}/{:5d} batches | ms/batch {:5.2f} | '
+            print('| epoch {:3d} | {:5d}/{:>5} batches | ms/batch {:5.2f} | '
                   'loss {:5.4f} | ppl {:8.2f}'.format(
-                epoch, i_batch, len(train_data) // args.batch_size,
+                epoch, i_batch, num_batches,
                                 elapsed * 1000 / args.log_interval, cur_loss, math.exp(cur_loss)))
             total_loss = 0
             start_time = time.time()
+    # the last batches of the epoch make a smaller step of their own
+    accumulator.step()
 
 ###############################################################################
 # Evaluate code
 ###############################################################################
 
 
-def evaluate():
+def evaluate(compare_float32=False):
     # Turn on evaluate mode which disables dropout.
+    # compare_float32 runs every batch in float32 as well, which doubles the cost, so only the final pass does it
+    compare_float32 = compare_float32 and args.precision != FLOAT32
     correct = 0
+    float32_correct = 0
     total = 0
     model.eval()
     with torch.no_grad():
         for i_batch, sample_batched in enumerate(test_loader):
-            token_seqs = torch.from_numpy(np.transpose(sample_batched[0])).to(device)
-            labels = torch.from_numpy(np.transpose(sample_batched[3])).to(device)
-            seq_lengths = np.transpose(sample_batched[4])
+            token_seqs = sample_batched[0].to(device, non_blocking=True)
+            labels = sample_batched[3].to(device, non_blocking=True)
+            seq_lengths = sample_batched[4]
             hidden = model.init_hidden(token_seqs.shape[1])
-            output = model(token_seqs, hidden, seq_lengths)
+            with autocast(args.precision, token_seqs.device):
+                output = model(token_seqs, hidden, seq_lengths)
             _, predict_class = torch.max(output, 1)
             total += labels.size(0)
             correct += (predict_class == labels).sum().item()
+            if compare_float32:
+                # the same batch in float32, to report what the lower precision costs in accuracy
+                _, float32_class = torch.max(model(token_seqs, model.init_hidden(token_seqs.shape[1]), seq_lengths), 1)
+                float32_correct += (float32_class == labels).sum().item()
         print('Accuracy of the classifier on the test data is : {:5.4f}'.format(
                 100 * correct / total))
+        if compare_float32:
+            print(delta_report(args.precision, correct, float32_correct, total))
         return correct / total
 
 
@@ -251,6 +301,8 @@ try:
         epoch_start_time = time.time()
         scheduler.step()
         train()
+        if not args.streaming:
+            print('| epoch {:3d} | padding {:5.2f}% of the batch tokens'.format(epoch, 100 * train_sampler.padding_ratio))
         current_accuracy = evaluate()
         cdf = pd.DataFrame([[epoch, current_accuracy]], columns=['batch', 'accuracy'])
         all_result_df = all_result_df.append(cdf, ignore_index=True)
@@ -259,6 +311,8 @@ try:
             best_accuracy = current_accuracy
             with open(os.path.join(args.save, 'classifier_model.pt'), 'wb') as f:
                 torch.save(model, f)
+    if args.precision != FLOAT32:
+        evaluate(compare_float32=True)
     all_result_df.to_csv(result_file, index=False, header=True)
 
 
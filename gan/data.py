@@ -4,118 +4,291 @@ from torch.utils.data import Dataset
 import sys
 import csv
 import numpy as np
-import re
+import os
+import hashlib
+import pickle
+from functools import partial
+from dataset.token_store import TokenStore, TokenStoreWriter, exists as store_exists
+from dataset.tokenization import split_by_punct, tokenize_shards
+from dataset.streaming import StreamingDataset, budget_batches
+from dataset.columnar import read_rows, read_labels as read_row_labels, stream_rows, data_file
+from dataset.length_policy import LengthPolicy
 csv.field_size_limit(sys.maxsize)
 
+DICTIONARY_FILE = 'action_dictionary.npz'
+
+
+def dictionary_file(tokenizer=None):
+    # the pieces of a subword tokenizer get a dictionary of their own, next to the word one
+    if tokenizer is None:
+        return DICTIONARY_FILE
+    return 'action_dictionary-{}.npz'.format(tokenizer.digest[:12])
+
 
 class Dictionary(object):
+    # ids are given in order of first appearance and never change, so a dictionary can
+    # be extended with new documents while everything encoded with it stays valid
     def __init__(self):
         self.word2idx = {}
         self.idx2word = []
+        self.counts = []
 
-    def add_word(self, word):
+    def add_word(self, word, count=1):
         if word not in self.word2idx:
             self.idx2word.append(word)
             self.word2idx[word] = len(self.idx2word) - 1
-        return self.word2idx[word]
+            self.counts.append(0)
+        idx = self.word2idx[word]
+        self.counts[idx] += count
+        return idx
+
+    def add_document(self, words):
+        return [self.add_word(word) for word in words]
+
+    def update(self, counts):
+        # merge the token counts of a shard, e.g. from tokenize_shards
+        for word, count in counts.items():
+            self.add_word(word, count)
 
     def __len__(self):
         return len(self.idx2word)
 
+    def digest(self, size=None):
+        # hash of the first size words, the whole dictionary by default
+        return hashlib.sha1('\n'.join(self.idx2word[:size]).encode('utf-8')).hexdigest()
+
+    def save(self, path):
+        # the words sorted and joined into one utf-8 blob, with the id and count of every word
+        order = sorted(range(len(self.idx2word)), key=self.idx2word.__getitem__)
+        words = '\n'.join(self.idx2word[i] for i in order).encode('utf-8')
+        tmp_file = path + '.tmp'
+        with open(tmp_file, 'wb') as file:
+            np.savez(file, words=np.frombuffer(words, dtype=np.uint8), ids=np.array(order, dtype=np.int64),
+                     counts=np.array(self.counts, dtype=np.int64))
+        os.replace(tmp_file, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as saved:
+            words = saved['words'].tobytes().decode('utf-8').split('\n') if saved['words'].size else []
+            ids = saved['ids']
+            counts = saved['counts']
+        dictionary = cls()
+        dictionary.word2idx = dict(zip(words, ids.tolist()))
+        dictionary.idx2word = [None] * len(words)
+        for word, idx in dictionary.word2idx.items():
+            dictionary.idx2word[idx] = word
+        dictionary.counts = counts.tolist()
+        return dictionary
+
+    @classmethod
+    def open(cls, directory, tokenizer=None):
+        # action_dictionary.npz of a data directory, converted from the old pickle when there is only that
+        path = os.path.join(directory, dictionary_file(tokenizer))
+        if os.path.isfile(path):
+            return cls.load(path)
+        if tokenizer is not None:
+            return None
+        legacy_path = os.path.join(directory, 'action_dictionary.pkl')
+        if os.path.isfile(legacy_path):
+            with open(legacy_path, 'rb') as input:
+                legacy = pickle.load(input)
+            dictionary = cls()
+            dictionary.word2idx = legacy.word2idx
+            dictionary.idx2word = legacy.idx2word
+            dictionary.counts = getattr(legacy, 'counts', [0] * len(legacy.idx2word))
+            dictionary.save(path)
+            return dictionary
+        return None
 
-def split_by_punct(segment):
-    """Splits str segment by punctuation, filters our empties and spaces."""
-    return [s for s in re.split(r'\W+', segment) if s and not s.isspace()]
+
+def tokenize_content(content, lowercase=True, tokenizer=None):
+    # tokenizer, a SubwordTokenizer from dataset/subword.py, replaces the words by its pieces
+    content = content.strip()
+    if tokenizer is not None:
+        return tokenizer(content) + ['<eos>']
+    if lowercase:
+        content = content.lower()
+    return split_by_punct(content) + ['<eos>']
 
 
 class Csv_DataSet(Dataset):
     # this is used to get a csv format of action sequence with id and role
     # the data is like:
     #  id | action sequence | role sequence |
-    def __init__(self, csv_file):
+    def __init__(self, csv_file, rows=None, policy=None, tokenizer=None):
         self.file = csv_file
-        self.tokens = []  # used to store all text information
-        self.labels = []  # used to store the label information
+        self.store_path = csv_file + '.tokens'
+        self.store = None  # memory-mapped token ids and labels of every row
+        self.rows = rows  # positions of the rows to use, e.g. a split manifest, all rows when None
+        self.policy = policy or LengthPolicy()  # cap on the sequence length, applied when the items are read
+        self.tokenizer = tokenizer  # a subword tokenizer, split_by_punct words when None
         self.length = 0
 
+    def _source_info(self, lowercase, train_mode):
+        stat = os.stat(self.file)
+        source = {'size': stat.st_size, 'mtime': stat.st_mtime, 'lowercase': lowercase, 'train_mode': train_mode}
+        if self.tokenizer is not None:
+            source['tokenizer'] = self.tokenizer.fingerprint()
+        return source
+
     def load(self, lowercase=True, dictionary=None,train_mode=True):
-        with open(self.file) as db_f:
-            reader = csv.reader(db_f)
-            next(reader)  # skip header
-            for idx, row in enumerate(reader):
-                # get actions
-                content = row[1]
-                content = content.strip()
-                if lowercase:
-                    content = content.lower()
-                txt = split_by_punct(content) + ['<eos>']
-                token = []
-                for word in txt:
-                    # Add words to the dictionary in train_mode
-                    if train_mode:
-                        dictionary.add_word(word)
-                        # Tokenize file content
-                        token.append(dictionary.word2idx[word])
-                    else:
-                        if word in dictionary.word2idx:
-                            token.append(dictionary.word2idx[word])
-                # get id
-                self.labels.append(int(row[0])-1)
-                self.tokens.append(token)
-            self.length = len(self.labels)
+        # the token store is reused as long as the csv and the dictionary are the ones it was built with;
+        # in train_mode every word of the csv is in the dictionary, so it may have grown since
+        source = self._source_info(lowercase, train_mode)
+        if store_exists(self.store_path):
+            store = TokenStore(self.store_path)
+            size = store.meta.get('dictionary_size')
+            if store.meta.get('source') == source and store.meta.get('dictionary') == dictionary.digest(size) \
+                    and (train_mode or size == len(dictionary)):
+                self.store = store
+                self.length = len(store)
+                return
+
+        labels = []
+        texts = []
+        # csv files have a header row, parquet exports come back in the order of their permutation
+        for idx, row in enumerate(read_rows(self.file, header=True)):
+            # get id
+            labels.append(int(row[0])-1)
+            # get actions
+            texts.append(row[1])
+
+        writer = TokenStoreWriter(self.store_path)
+        idx = 0
+        for tokens, _ in tokenize_shards(texts, partial(tokenize_content, lowercase=lowercase, tokenizer=self.tokenizer)):
+            for txt in tokens:
+                # Add words to the dictionary in train_mode
+                if train_mode:
+                    token = dictionary.add_document(txt)
+                else:
+                    token = [dictionary.word2idx[word] for word in txt if word in dictionary.word2idx]
+                writer.add(token, labels[idx])
+                idx += 1
+        writer.close(source=source, dictionary=dictionary.digest(), dictionary_size=len(dictionary))
+        self.store = TokenStore(self.store_path)
+        self.length = len(self.store)
+
+    @property
+    def rows(self):
+        return self._rows
+
+    @rows.setter
+    def rows(self, rows):
+        self._rows = rows
+        self._items = None
+
+    @property
+    def labels(self):
+        # one label per document of rows, whatever the length policy
+        if self.rows is None:
+            return self.store.labels
+        return self.store.labels[self.rows]
+
+    def _document_lengths(self):
+        if self.rows is None:
+            return self.store.lengths()
+        return self.store.lengths()[self.rows]
+
+    def items(self):
+        # (row, piece) of every item, a document the chunk policy splits up gives several items
+        if self._items is None:
+            rows = np.arange(self.length) if self.rows is None else np.asarray(self.rows)
+            pieces = self.policy.pieces(self._document_lengths())
+            starts = np.repeat(np.cumsum(pieces) - pieces, pieces)
+            self._items = np.repeat(rows, pieces), np.arange(pieces.sum()) - starts
+        return self._items
+
+    def lengths(self):
+        return self.policy.lengths(self._document_lengths())
 
     def __len__(self):
-        return self.length
+        return len(self.items()[0])
 
     def __getitem__(self, index):
-        token_seq = np.array(self.tokens[index], dtype=int)
-        is_meaningful = np.ones(len(self.tokens[index])-1)
-        label = self.labels[index]
-        return token_seq, label, is_meaningful
+        rows, pieces = self.items()
+        row = rows[index]
+        # a view into the token store, collate_fn copies it straight into the batch
+        return self.policy.apply(self.store[row])[pieces[index]], self.store.labels[row]
+
+
+def read_labels(csv_file):
+    # the class of every row, numbered from 0 like the labels of Csv_DataSet
+    return np.array([int(label)-1 for label in read_row_labels(csv_file, header=True)], dtype=np.int64)
+
+
+def encode_row(word2idx, lowercase, policy, tokenizer, row):
+    # words missing from the dictionary are dropped, like Csv_DataSet does outside train_mode
+    token = [word2idx[word] for word in tokenize_content(row[1], lowercase, tokenizer) if word in word2idx]
+    label = int(row[0])-1
+    return [(sequence, label) for sequence in policy.apply(np.array(token, dtype=np.int32))]
+
+
+def sequence_length(item):
+    return len(item[0])
 
 
-def collate_fn(data):
-    """Creates mini-batch tensors from the list of tuples
-    (token_seqs, role_seqs, case_ids, texts_seq).
+def build_dictionary(csv_file, dictionary, lowercase=True, tokenizer=None):
+    # one streaming pass over the csv, only the dictionary is kept in memory
+    texts = (row[1] for row in stream_rows(csv_file, header=True))
+    for _, counts in tokenize_shards(texts, partial(tokenize_content, lowercase=lowercase, tokenizer=tokenizer)):
+        dictionary.update(counts)
+
+
+class Csv_Stream(StreamingDataset):
+    # streaming counterpart of Csv_DataSet for csv files that do not fit in memory:
+    # the rows are tokenized as they are read and yielded as batches of (token_seq, label)
+    def __init__(self, csv_file, dictionary, lowercase=True, shuffle=True, batch_size=None, max_tokens=None, rows=None, policy=None, tokenizer=None):
+        batch = partial(budget_batches, length=sequence_length, batch_size=batch_size, max_tokens=max_tokens)
+        super(Csv_Stream, self).__init__(partial(stream_rows, csv_file, header=True, rows=rows), partial(encode_row, dictionary.word2idx, lowercase, policy or LengthPolicy(), tokenizer),
+                                         shuffle=shuffle, batch=batch)
+
+
+def collate_fn(data, remap=None):
+    """Creates mini-batch tensors from the list of tuples (token_seq, label).
     Seqeuences are padded to the maximum length of
     mini-batch sequences (dynamic padding).
     Args:
-        data: list of tuple (token_seqs, role_seqs, case_ids, texts_seq).
-            - token_seqs: np.array of shape (?); variable length.
-            - role_seqs: np.array of shape (?); variable length.
-            - case_id: the id of the case
-            - texts_seq: List of actions
+        data: list of tuple (token_seq, label).
+            - token_seq: np.array of shape (?); variable length.
+            - label: the class of the sequence
+        remap: LongTensor that maps the dictionary ids to the ids of a pruned
+            vocabulary, see dataset/vocab_pruning.py, or None.
     Returns:
-        token_seqs: np.array of shape (batch_size, padded_length).
-        role_seqs: np.array of shape (batch_size, padded_length).
-        texts_seq: same as input
-        src_lengths: np.array of length (batch_size);
-        case_ids: same as input
+        token_seqs: LongTensor of shape (padded_length, batch_size).
+        next_token_seqs: LongTensor of shape (padded_length, batch_size),
+            token_seqs shifted by one step.
+        importance_seqs: FloatTensor of shape (padded_length, batch_size),
+            1 where the next token is a real token.
+        labels: LongTensor of length (batch_size).
+        seq_lengths: LongTensor of length (batch_size).
         pad_length: int length for each padded seq
     """
-    def merge(sequences, pad_length):
-        lengths = np.array([len(seq) for seq in sequences])
-        padded_seqs = np.zeros((len(sequences), pad_length))
-        for i, seq in enumerate(sequences):
-            end = lengths[i]
-            padded_seqs[i, :end] = seq[:end]
-        return padded_seqs, lengths
-
-    # separate data, sequences
-    token_seqs, labels, is_meaningful = zip(*data)
-
-    # get the pad_length
-    lengths = [len(seq) for seq in token_seqs]
-    pad_length = max(lengths)
-    # merge sequences (from tuple of 1D tensor to 2D tensor)
-    token_seqs, seq_lengths = merge(token_seqs, pad_length)
-    importance_seqs, importance_lengths = merge(is_meaningful, pad_length)
-    if not (seq_lengths == importance_lengths + 1).all():
-        raise ValueError("The length of token sequence is not "
-                         "equal to the length of the importance sequence!")
-    bitch_size = len(lengths)
-    next_token_seqs = np.zeros((bitch_size, pad_length))
-    next_token_seqs[:, :-1] = token_seqs[:, 1:]
-
-    return token_seqs.astype(int), next_token_seqs.astype(int), importance_seqs, labels, seq_lengths, pad_length
+    token_seqs, labels = zip(*data)
+    seq_lengths = torch.tensor([len(seq) for seq in token_seqs], dtype=torch.long)
+    pad_length = int(seq_lengths.max())
+    bitch_size = len(token_seqs)
+
+    # one time-major buffer with an extra row of padding: the inputs are its
+    # first pad_length rows and the next tokens the last pad_length, both views
+    steps = torch.zeros(pad_length + 1, bitch_size, dtype=torch.long)
+    positions = torch.arange(pad_length + 1)
+    # fill batch-major through the transposed view, so the tokens go in sequence by sequence
+    steps.t()[positions < seq_lengths.unsqueeze(1)] = torch.from_numpy(np.concatenate(token_seqs).astype(np.int64))
+    importance_seqs = (positions[:pad_length].unsqueeze(1) < seq_lengths - 1).float()
+    if remap is not None:
+        steps = remap[steps]
+
+    return steps[:-1], steps[1:], importance_seqs, torch.tensor(labels, dtype=torch.long), seq_lengths, pad_length
+
 
+if __name__ == '__main__':
+    # usage: python -m gan.data <data directory> <csv or parquet file> ...
+    # extends the dictionary of the data directory with the words of new documents
+    directory = sys.argv[1]
+    dictionary = Dictionary.open(directory) or Dictionary()
+    size = len(dictionary)
+    for new_file in sys.argv[2:]:
+        build_dictionary(new_file, dictionary)
+    dictionary.save(os.path.join(directory, DICTIONARY_FILE))
+    print('{} new words, {} in the dictionary'.format(len(dictionary) - size, len(dictionary)))
@@ -1,7 +1,8 @@
 # coding: utf-8
 import argparse
-import pandas as pd
 import os
+import gan.data as data
+from dataset.splits import labeled_manifest
 
 parser = argparse.ArgumentParser(description='PyTorch RNN/LSTM classification Model')
 parser.add_argument('--data', type=str, default=os.getcwd()+'/ag_news_csv/',
@@ -10,11 +11,8 @@ parser.add_argument('--number_per_class', type=int, default=1000,
                     help='location of the data corpus')
 
 args = parser.parse_args()
-train_file_name = os.path.join(args.data, 'train.csv')
-train_data = pd.read_csv(train_file_name, header=None)
-# the labeled data are set to be the top "number_per_class" rows of each group
-labeled_data = train_data.groupby(train_data[0]).head(args.number_per_class)
-unlabeled_data = train_data.drop(labeled_data.index)
-# save data to labeled and unlabeled data separately
-labeled_data.to_csv(os.path.join(args.data, str(args.number_per_class)+'_labeled_train.csv'), header=False, index=False)
-unlabeled_data.to_csv(os.path.join(args.data, str(args.number_per_class)+'_unlabeled_train.csv'), header=False, index=False)
+train_file_name = data.data_file(args.data, 'train')
+# the labeled data are set to be the top "number_per_class" rows of each group; only the row
+# positions are saved, in a manifest that the training scripts select the rows with
+manifest = labeled_manifest(data.read_labels(train_file_name), args.number_per_class)
+print('{} labeled and {} unlabeled rows in {}'.format(len(manifest['labeled']), len(manifest['unlabeled']), train_file_name))
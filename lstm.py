@@ -16,11 +16,11 @@ class LongShortTermMemory():
         hidden_size = 256
         embedding_length = 300
 
-        self.model = LSTMClassifier(batch_size, output_size, hidden_size, vocab_size, embedding_length, word_embeddings)
+        self.model = LSTMClassifier(output_size, hidden_size, vocab_size, embedding_length, word_embeddings)
 
         optimizer = torch.optim.Adam(filter(lambda p: p.requires_grad, self.model.parameters()), weight_decay=0.0005, lr=0.0001)
         loss_fn = F.cross_entropy
-        self.training_handler = TrainingHandler(optimizer, loss_fn, batch_size)
+        self.training_handler = TrainingHandler(optimizer, loss_fn)
 
     def train(self, numberOfEpochs):
         patience_threshold = 3
@@ -37,13 +37,13 @@ class LongShortTermMemory():
             patience -= 1
             if val_loss < min_valid_loss and abs(min_valid_loss - val_loss) > 0.005:
                 patience = patience_threshold
-                torch.save(self.model, "./saved_models/lstm-" + self.embedding)
+                self.training_handler.save_model(self.model, "./saved_models/lstm-" + self.embedding)
                 min_valid_loss = val_loss
 
             if patience == 0:
                 break
 
     def test(self):
-        self.model = torch.load("./saved_models/lstm-" + self.embedding)
-        test_loss, test_acc = self.training_handler.eval_model(self.model, self.test_iter)
+        self.model = self.training_handler.load_model("./saved_models/lstm-" + self.embedding)
+        test_loss, test_acc = self.training_handler.eval_model(self.model, self.test_iter, compare_float32=True)
         return test_loss, test_acc
\ No newline at end of file
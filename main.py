@@ -13,9 +13,15 @@ from metrics import metrics_handler
 import output_handler
 import torch
 import env_settings
+from dataset.length_policy import LengthPolicy
+from dataset.vocab_pruning import VocabLimits
+from dataset.tokenization import extract_words
+from precision import PRECISIONS
+from dataset.shards import rank_file
 
 def init(filename):
-    output_handler.outputFileHandler = output_handler.OutputHandler(filename)
+    # in a distributed job every rank logs the metrics of its own model to a file of its own
+    output_handler.outputFileHandler = output_handler.OutputHandler(rank_file(filename))
     metrics_handler.metricsHandler = metrics_handler.MetricsHandler()
 
 def main(argv):
@@ -41,6 +47,9 @@ def main(argv):
         'normal': 'normal'
     }
     embedding = None
+    minFreq = 1
+    maxVocab = None
+    vocabCoverage = None
     embeddingPossibilities = {
         'ft_generic': 'fasttext_generic',
         'glv_generic': 'glove_generic',
@@ -51,7 +60,7 @@ def main(argv):
     }
 
     try:
-        opts, args = getopt.getopt(argv, 'hmote:', ['help', 'model=', 'output=', 'type=', 'embedding=', 'gpu=', 'batch_size='])
+        opts, args = getopt.getopt(argv, 'hmote:', ['help', 'model=', 'output=', 'type=', 'embedding=', 'gpu=', 'batch_size=', 'eval_batch_size=', 'max_tokens=', 'streaming', 'split_seed=', 'num_workers=', 'length_policy=', 'per_label=', 'min_freq=', 'max_vocab=', 'vocab_coverage=', 'subword=', 'precision=', 'accumulation_steps='])
     except getopt.GetoptError:
         print('usage: main.py -m <modelname> or main.py --model=<modelname>, where <modelname>: rnn, lstm, cnn, rcnn or logreg')
         sys.exit(2)
@@ -71,6 +80,48 @@ def main(argv):
             env_settings.CUDA_DEVICE = 'cuda:' + arg
         elif opt in ('-bs', '--batch_size'):
             batchSize = int(arg)
+        elif opt == '--eval_batch_size':
+            env_settings.EVAL_BATCH_SIZE = int(arg)
+        elif opt == '--max_tokens':
+            env_settings.MAX_TOKENS = int(arg)
+        elif opt == '--streaming':
+            env_settings.STREAMING = True
+        elif opt == '--split_seed':
+            env_settings.SPLIT_SEED = int(arg)
+        elif opt == '--num_workers':
+            env_settings.NUM_WORKERS = int(arg)
+        elif opt == '--per_label':
+            env_settings.PER_LABEL = int(arg)
+        elif opt == '--length_policy':
+            try:
+                env_settings.LENGTH_POLICY = LengthPolicy.parse(arg)
+            except ValueError as error:
+                print(error)
+                sys.exit(2)
+        elif opt == '--min_freq':
+            minFreq = int(arg)
+        elif opt == '--max_vocab':
+            maxVocab = int(arg)
+        elif opt == '--vocab_coverage':
+            vocabCoverage = float(arg)
+        elif opt == '--subword':
+            from dataset.subword import SubwordTokenizer
+            env_settings.TOKENIZER = SubwordTokenizer(arg)
+        elif opt == '--precision':
+            if arg not in PRECISIONS:
+                print(f'unknown precision {arg!r}, expected one of {", ".join(PRECISIONS)}')
+                sys.exit(2)
+            env_settings.PRECISION = arg
+        elif opt == '--accumulation_steps':
+            env_settings.ACCUMULATION_STEPS = int(arg)
+            if env_settings.ACCUMULATION_STEPS < 1:
+                print('--accumulation_steps has to be at least 1')
+                sys.exit(2)
+    try:
+        env_settings.VOCAB_LIMITS = VocabLimits(minFreq, maxVocab, vocabCoverage)
+    except ValueError as error:
+        print(error)
+        sys.exit(2)
     
     modelHandlerName = modelPossibilities.get(modelName, 'Invalid model')
     if modelHandlerName == 'Invalid model':
@@ -79,6 +130,11 @@ def main(argv):
     
     init(outputFile)
     output_handler.outputFileHandler.write("Start log \n")
+    output_handler.outputFileHandler.write(f'Length policy: {env_settings.LENGTH_POLICY}\n')
+    output_handler.outputFileHandler.write(f'Vocabulary limits: {env_settings.VOCAB_LIMITS}\n')
+    output_handler.outputFileHandler.write(f'Tokenizer: {"words" if env_settings.TOKENIZER is extract_words else env_settings.TOKENIZER}\n')
+    output_handler.outputFileHandler.write(f'Precision: {env_settings.PRECISION}\n')
+    output_handler.outputFileHandler.write(f'Batch size: {batchSize}, accumulation steps: {env_settings.ACCUMULATION_STEPS}\n')
 
     numberOfEpochs = 100
 
@@ -4,13 +4,12 @@ from torch.autograd import Variable
 from torch.nn import functional as F
 
 class CNN(nn.Module):
-	def __init__(self, batch_size, output_size, in_channels, out_channels, kernel_heights, stride, padding, keep_probab, vocab_size, embedding_length, weights):
+	def __init__(self, output_size, in_channels, out_channels, kernel_heights, stride, padding, keep_probab, vocab_size, embedding_length, weights):
 		super(CNN, self).__init__()
 		
 		"""
 		Arguments
 		---------
-		batch_size : Size of each batch which is same as the batch_size of the data returned by the TorchText BucketIterator
 		output_size : 2 = (pos, neg)
 		in_channels : Number of input channels. Here it is 1 as the input data has dimension = (batch_size, num_seq, embedding_length)
 		out_channels : Number of output channels after convolution operation performed on the input matrix
@@ -22,7 +21,6 @@ class CNN(nn.Module):
 		--------
 		
 		"""
-		self.batch_size = batch_size
 		self.output_size = output_size
 		self.in_channels = in_channels
 		self.out_channels = out_channels
@@ -50,7 +48,7 @@ class CNN(nn.Module):
 		
 		return max_out.squeeze(2)
 	
-	def forward(self, input_sentences, batch_size=None):
+	def forward(self, input_sentences, lengths=None):
 		
 		"""
 		The idea of the Convolutional Neural Netwok for Text Classification is very simple. We perform convolution operation on the embedding matrix 
@@ -62,7 +60,7 @@ class CNN(nn.Module):
 		Parameters
 		----------
 		input_sentences: input_sentences of shape = (batch_size, num_sequences)
-		batch_size : default = None. Used only for prediction on a single sentence after training (batch_size = 1)
+		lengths : unused, the convolutions run over the padded batch
 		
 		Returns
 		-------
@@ -1,17 +1,15 @@
 import torch
 import torch.nn as nn
-from torch.autograd import Variable
 from torch.nn import functional as F
-import env_settings
+from model.packing import run_packed
 
 class GRUClassifier(nn.Module):
-	def __init__(self, batch_size, output_size, hidden_size, vocab_size, embedding_length, weights):
+	def __init__(self, output_size, hidden_size, vocab_size, embedding_length, weights):
 		super(GRUClassifier, self).__init__()
 		
 		"""
 		Arguments
 		---------
-		batch_size : Size of the batch which is same as the batch_size of the data returned by the TorchText BucketIterator
 		output_size : 2 = (pos, neg)
 		hidden_sie : Size of the hidden_state of the LSTM
 		vocab_size : Size of the vocabulary containing unique words
@@ -20,7 +18,6 @@ class GRUClassifier(nn.Module):
 		
 		"""
 		
-		self.batch_size = batch_size
 		self.output_size = output_size
 		self.hidden_size = hidden_size
 		self.vocab_size = vocab_size
@@ -31,13 +28,13 @@ class GRUClassifier(nn.Module):
 		self.gru = nn.GRU(embedding_length, hidden_size)
 		self.label = nn.Linear(hidden_size, output_size)
 		
-	def forward(self, input_sentence, batch_size=None):
+	def forward(self, input_sentence, lengths=None):
 	
 		""" 
 		Parameters
 		----------
 		input_sentence: input_sentence of shape = (batch_size, num_sequences)
-		batch_size : default = None. Used only for prediction on a single sentence after training (batch_size = 1)
+		lengths : default = None. Lengths of the sequences without their padding, which the recurrent layer then skips
 		
 		Returns
 		-------
@@ -49,18 +46,9 @@ class GRUClassifier(nn.Module):
 		''' Here we will map all the indexes present in the input sequence to the corresponding word vector using our pre-trained word_embedddins.'''
 		input = self.word_embeddings(input_sentence) # embedded input of shape = (batch_size, num_sequences,  embedding_length)
 		input = input.permute(1, 0, 2) # input.size() = (num_sequences, batch_size, embedding_length)
-		if torch.cuda.is_available():
-			if batch_size is None:
-				h_0 = Variable(torch.zeros(1, self.batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE)) # Initial hidden state of the LSTM
-			else:
-				h_0 = Variable(torch.zeros(1, batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE))
-		else:
-			if batch_size is None:
-				h_0 = Variable(torch.zeros(1, self.batch_size, self.hidden_size)) # Initial hidden state of the LSTM
-			else:
-				h_0 = Variable(torch.zeros(1, batch_size, self.hidden_size))
+		h_0 = torch.zeros(1, input.size(1), self.hidden_size, device=input.device) # Initial hidden state
 
-		output, final_hidden_state = self.gru(input, h_0)
+		output, final_hidden_state = run_packed(self.gru, input, h_0, lengths)
 		final_output = self.label(final_hidden_state[-1]) # final_hidden_state.size() = (1, batch_size, hidden_size) & final_output.size() = (batch_size, output_size)
 		
 		return final_output
\ No newline at end of file
@@ -9,7 +9,7 @@ class LogisticRegressionModel(nn.Module):
         self.word_embeddings.weight = nn.Parameter(weights, requires_grad=False) # Assigning the look-up table to the word embedding.
         self.linear = nn.Linear(embedding_length, output_dim)
 
-    def forward(self, x):
+    def forward(self, x, lengths=None):
         input = self.word_embeddings(x)
         input = input.permute(0, 2, 1) # y.size() = (batch_size, hidden_size, num_sequences)
         input = F.max_pool1d(input, input.size()[2]) # y.size() = (batch_size, hidden_size, 1)
@@ -1,18 +1,16 @@
 import torch
 import torch.nn as nn
-from torch.autograd import Variable
 from torch.nn import functional as F
 import numpy as np
-import env_settings
+from model.packing import run_packed, padding_mask
 
 class AttentionModel(torch.nn.Module):
-	def __init__(self, batch_size, output_size, hidden_size, vocab_size, embedding_length, weights):
+	def __init__(self, output_size, hidden_size, vocab_size, embedding_length, weights):
 		super(AttentionModel, self).__init__()
 		
 		"""
 		Arguments
 		---------
-		batch_size : Size of the batch which is same as the batch_size of the data returned by the TorchText BucketIterator
 		output_size : 2 = (pos, neg)
 		hidden_sie : Size of the hidden_state of the LSTM
 		vocab_size : Size of the vocabulary containing unique words
@@ -23,7 +21,6 @@ class AttentionModel(torch.nn.Module):
 		
 		"""
 		
-		self.batch_size = batch_size
 		self.output_size = output_size
 		self.hidden_size = hidden_size
 		self.vocab_size = vocab_size
@@ -34,7 +31,7 @@ class AttentionModel(torch.nn.Module):
 		self.lstm = nn.LSTM(embedding_length, hidden_size)
 		self.label = nn.Linear(hidden_size, output_size)
 		
-	def attention_net(self, lstm_output, final_state):
+	def attention_net(self, lstm_output, final_state, lengths=None):
 
 		""" 
 		Now we will incorporate Attention mechanism in our LSTM model. In this new model, we will use attention to compute soft alignment score corresponding
@@ -61,18 +58,21 @@ class AttentionModel(torch.nn.Module):
 		
 		hidden = final_state.squeeze(0)
 		attn_weights = torch.bmm(lstm_output, hidden.unsqueeze(2)).squeeze(2)
+		if lengths is not None:
+			# no attention goes to the padding
+			attn_weights = attn_weights.masked_fill(padding_mask(lengths, attn_weights.size(1), attn_weights.device), float('-inf'))
 		soft_attn_weights = F.softmax(attn_weights, 1)
 		new_hidden_state = torch.bmm(lstm_output.transpose(1, 2), soft_attn_weights.unsqueeze(2)).squeeze(2)
 		
 		return new_hidden_state
 	
-	def forward(self, input_sentences, batch_size=None):
+	def forward(self, input_sentences, lengths=None):
 	
 		""" 
 		Parameters
 		----------
 		input_sentence: input_sentence of shape = (batch_size, num_sequences)
-		batch_size : default = None. Used only for prediction on a single sentence after training (batch_size = 1)
+		lengths : default = None. Lengths of the sequences without their padding, which the recurrent layer then skips
 		
 		Returns
 		-------
@@ -83,17 +83,13 @@ class AttentionModel(torch.nn.Module):
 		
 		input = self.word_embeddings(input_sentences)
 		input = input.permute(1, 0, 2)
-		if batch_size is None:
-			h_0 = Variable(torch.zeros(1, self.batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE))
-			c_0 = Variable(torch.zeros(1, self.batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE))
-		else:
-			h_0 = Variable(torch.zeros(1, batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE))
-			c_0 = Variable(torch.zeros(1, batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE))
-			
-		output, (final_hidden_state, final_cell_state) = self.lstm(input, (h_0, c_0)) # final_hidden_state.size() = (1, batch_size, hidden_size) 
+		h_0 = torch.zeros(1, input.size(1), self.hidden_size, device=input.device) # Initial hidden state
+		c_0 = torch.zeros(1, input.size(1), self.hidden_size, device=input.device) # Initial cell state
+
+		output, (final_hidden_state, final_cell_state) = run_packed(self.lstm, input, (h_0, c_0), lengths) # final_hidden_state.size() = (1, batch_size, hidden_size) 
 		output = output.permute(1, 0, 2) # output.size() = (batch_size, num_seq, hidden_size)
 		
-		attn_output = self.attention_net(output, final_hidden_state)
+		attn_output = self.attention_net(output, final_hidden_state, lengths)
 		logits = self.label(attn_output)
 		
 		return logits
\ No newline at end of file
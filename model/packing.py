@@ -0,0 +1,24 @@
+import torch
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
+
+def run_packed(rnn, input, states, lengths=None):
+	"""
+	Runs a recurrent layer over a padded, time-major batch.
+
+	With lengths, the batch is packed, so the layer stops at the end of every
+	sequence instead of running over its padding: the final states are the
+	ones of the last real token, and the outputs at the padded positions are
+	zeros. Returns (output, final states) like the layer itself.
+	"""
+	if lengths is None:
+		return rnn(input, states)
+	# an empty document still gets one (padding) step, packing needs a positive length
+	packed = pack_padded_sequence(input, lengths.cpu().clamp(min=1), enforce_sorted=False)
+	output, states = rnn(packed, states)
+	output, _ = pad_packed_sequence(output, total_length=input.size(0))
+	return output, states
+
+def padding_mask(lengths, max_length, device=None):
+	# True at the padded positions of a (batch_size, max_length) batch
+	lengths = lengths.to(device).clamp(min=1)
+	return torch.arange(max_length, device=lengths.device).unsqueeze(0) >= lengths.unsqueeze(1)
@@ -1,17 +1,15 @@
 import torch
 import torch.nn as nn
-from torch.autograd import Variable
 from torch.nn import functional as F
-import env_settings
+from model.packing import run_packed, padding_mask
 
 class RCNN(nn.Module):
-	def __init__(self, batch_size, output_size, hidden_size, vocab_size, embedding_length, weights):
+	def __init__(self, output_size, hidden_size, vocab_size, embedding_length, weights):
 		super(RCNN, self).__init__()
 		
 		"""
 		Arguments
 		---------
-		batch_size : Size of the batch which is same as the batch_size of the data returned by the TorchText BucketIterator
 		output_size : 2 = (pos, neg)
 		hidden_sie : Size of the hidden_state of the LSTM
 		vocab_size : Size of the vocabulary containing unique words
@@ -20,7 +18,6 @@ class RCNN(nn.Module):
 		
 		"""
 		
-		self.batch_size = batch_size
 		self.output_size = output_size
 		self.hidden_size = hidden_size
 		self.vocab_size = vocab_size
@@ -34,13 +31,13 @@ class RCNN(nn.Module):
 		self.W2 = nn.Linear(2*hidden_size+embedding_length, hidden_size)
 		self.label = nn.Linear(hidden_size, output_size)
 		
-	def forward(self, input_sentence, batch_size=None):
+	def forward(self, input_sentence, lengths=None):
 	
 		""" 
 		Parameters
 		----------
 		input_sentence: input_sentence of shape = (batch_size, num_sequences)
-		batch_size : default = None. Used only for prediction on a single sentence after training (batch_size = 1)
+		lengths : default = None. Lengths of the sequences without their padding, which the recurrent layer then skips
 		
 		Returns
 		-------
@@ -60,29 +57,16 @@ class RCNN(nn.Module):
 		"""
 		input = self.word_embeddings(input_sentence) # embedded input of shape = (batch_size, num_sequences, embedding_length)
 		input = input.permute(1, 0, 2) # input.size() = (num_sequences, batch_size, embedding_length)
-		if torch.cuda.is_available():
-			if batch_size is None:
-				h_0 = Variable(torch.zeros(2, self.batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE)) # Initial hidden state of the LSTM
-				c_0 = Variable(torch.zeros(2, self.batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE)) # Initial cell state of the LSTM
-				# h_0 = Variable(torch.zeros(2, self.batch_size, self.hidden_size)) # Initial hidden state of the LSTM
-				# c_0 = Variable(torch.zeros(2, self.batch_size, self.hidden_size)) # Initial cell state of the LSTM
-			else:
-				h_0 = Variable(torch.zeros(2, batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE))
-				c_0 = Variable(torch.zeros(2, batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE))
-				# h_0 = Variable(torch.zeros(2, batch_size, self.hidden_size))
-				# c_0 = Variable(torch.zeros(2, batch_size, self.hidden_size))
-		else:
-			if batch_size is None:
-				h_0 = Variable(torch.zeros(2, self.batch_size, self.hidden_size)) # Initial hidden state of the LSTM
-				c_0 = Variable(torch.zeros(2, self.batch_size, self.hidden_size)) # Initial cell state of the LSTM
-			else:
-				h_0 = Variable(torch.zeros(2, batch_size, self.hidden_size))
-				c_0 = Variable(torch.zeros(2, batch_size, self.hidden_size))
+		h_0 = torch.zeros(2, input.size(1), self.hidden_size, device=input.device) # Initial hidden state
+		c_0 = torch.zeros(2, input.size(1), self.hidden_size, device=input.device) # Initial cell state
 
-		output, (final_hidden_state, final_cell_state) = self.lstm(input, (h_0, c_0))
+		output, (final_hidden_state, final_cell_state) = run_packed(self.lstm, input, (h_0, c_0), lengths)
 		
 		final_encoding = torch.cat((output, input), 2).permute(1, 0, 2)
 		y = self.W2(final_encoding) # y.size() = (batch_size, num_sequences, hidden_size)
+		if lengths is not None:
+			# the padded positions are left out of the max pooling
+			y = y.masked_fill(padding_mask(lengths, y.size(1), y.device).unsqueeze(2), float('-inf'))
 		y = y.permute(0, 2, 1) # y.size() = (batch_size, hidden_size, num_sequences)
 		y = F.max_pool1d(y, y.size()[2]) # y.size() = (batch_size, hidden_size, 1)
 		y = y.squeeze(2)
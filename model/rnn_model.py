@@ -1,16 +1,14 @@
 import torch
 import torch.nn as nn
-from torch.autograd import Variable
-import env_settings
+from model.packing import run_packed
 
 class RNN(nn.Module):
-	def __init__(self, batch_size, output_size, hidden_size, vocab_size, embedding_length, weights):
+	def __init__(self, output_size, hidden_size, vocab_size, embedding_length, weights):
 		super(RNN, self).__init__()
 
 		"""
 		Arguments
 		---------
-		batch_size : Size of the batch which is same as the batch_size of the data returned by the TorchText BucketIterator
 		output_size : 2 = (pos, neg)
 		hidden_sie : Size of the hidden_state of the LSTM
 		vocab_size : Size of the vocabulary containing unique words
@@ -19,7 +17,6 @@ class RNN(nn.Module):
 		
 		"""
 
-		self.batch_size = batch_size
 		self.output_size = output_size
 		self.hidden_size = hidden_size
 		self.vocab_size = vocab_size
@@ -30,13 +27,13 @@ class RNN(nn.Module):
 		self.rnn = nn.RNN(embedding_length, hidden_size)
 		self.label = nn.Linear(hidden_size, output_size)
 	
-	def forward(self, input_sentences, batch_size=None):
+	def forward(self, input_sentences, lengths=None):
 		
 		""" 
 		Parameters
 		----------
 		input_sentence: input_sentence of shape = (batch_size, num_sequences)
-		batch_size : default = None. Used only for prediction on a single sentence after training (batch_size = 1)
+		lengths : default = None. Lengths of the sequences without their padding, which the recurrent layer then skips
 		
 		Returns
 		-------
@@ -47,17 +44,8 @@ class RNN(nn.Module):
 
 		input = self.word_embeddings(input_sentences)
 		input = input.permute(1, 0, 2)
-		if torch.cuda.is_available():
-			if batch_size is None:
-				h_0 = Variable(torch.zeros(1, self.batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE)) # 4 = num_layers*num_directions
-			else:
-				h_0 =  Variable(torch.zeros(1, batch_size, self.hidden_size).cuda(env_settings.CUDA_DEVICE))
-		else:
-			if batch_size is None:
-				h_0 = Variable(torch.zeros(1, self.batch_size, self.hidden_size)) # 4 = num_layers*num_directions
-			else:
-				h_0 =  Variable(torch.zeros(1, batch_size, self.hidden_size))
-		output, h_n = self.rnn(input, h_0)
+		h_0 = torch.zeros(1, input.size(1), self.hidden_size, device=input.device) # Initial hidden state
+		output, h_n = run_packed(self.rnn, input, h_0, lengths)
 		# h_n.size() = (1, batch_size, hidden_size)
 		h_n = h_n.permute(1, 0, 2) # h_n.size() = (batch_size, 1, hidden_size)
 		h_n = h_n.contiguous().view(h_n.size()[0], h_n.size()[1]*h_n.size()[2])
@@ -0,0 +1,28 @@
+import contextlib
+import torch
+
+FLOAT32 = 'float32'
+BFLOAT16 = 'bfloat16'
+PRECISIONS = (FLOAT32, BFLOAT16)
+
+def autocast(precision, device):
+    """
+    Context the forward passes run in.
+
+    With bfloat16 the matrix products and the recurrent layers run in bfloat16
+    on the device of the batch (CPU or GPU), while the weights, their
+    gradients and the optimizer state stay float32. bfloat16 has the range of
+    float32, so unlike float16 the loss needs no scaling. The outputs come out
+    in bfloat16: compute the loss on output.float(), outside of the context.
+    """
+    if precision == FLOAT32:
+        return contextlib.nullcontext()
+    if precision != BFLOAT16:
+        raise ValueError('unknown precision %r, expected one of %s' % (precision, ', '.join(PRECISIONS)))
+    return torch.autocast(torch.device(device).type, dtype=torch.bfloat16)
+
+def delta_report(precision, corrects, float32_corrects, examples):
+    # the accuracy of the same model on the same batches in both precisions
+    accuracy = 100.0 * corrects / max(examples, 1)
+    float32_accuracy = 100.0 * float32_corrects / max(examples, 1)
+    return f'{precision} accuracy {accuracy:.2f}%, float32 accuracy {float32_accuracy:.2f}%, delta {accuracy - float32_accuracy:+.2f} points'
@@ -0,0 +1,84 @@
+import copy
+import pytest
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import output_handler
+from accumulation import GradientAccumulator
+from training_handler import TrainingHandler
+
+SIZES = [5, 2, 7, 2]
+
+class Batch():
+    def __init__(self, text, label):
+        self.content = (text, torch.full((text.size(0),), text.size(1), dtype=torch.long))
+        self.label = label
+
+    def __len__(self):
+        return self.label.size(0)
+
+class BagOfEmbeddings(nn.Module):
+    def __init__(self):
+        super(BagOfEmbeddings, self).__init__()
+        self.embedding = nn.Embedding(20, 8)
+        self.label = nn.Linear(8, 3)
+
+    def forward(self, text, lengths=None):
+        return self.label(self.embedding(text).mean(1))
+
+def examples(seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randint(0, 20, (sum(SIZES), 6), generator=generator), torch.randint(0, 3, (sum(SIZES),), generator=generator)
+
+def uneven_batches(text, label):
+    return [Batch(text, label) for text, label in zip(text.split(SIZES), label.split(SIZES))]
+
+def test_accumulated_gradients_equal_those_of_one_large_batch():
+    torch.manual_seed(0)
+    model = BagOfEmbeddings()
+    large = copy.deepcopy(model)
+    text, label = examples()
+    F.cross_entropy(large(text), label).backward()
+
+    gradients = []
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    accumulator = GradientAccumulator(optimizer, model, len(SIZES), clip=lambda model: gradients.extend(p.grad.clone() for p in model.parameters()))
+    for batch in uneven_batches(text, label):
+        accumulator.backward(F.cross_entropy(model(batch.content[0]), batch.label), len(batch))
+    # clip sees the averaged gradients, once, right before the step
+    assert len(gradients) == len(list(model.parameters()))
+    for gradient, parameter in zip(gradients, large.parameters()):
+        assert torch.allclose(gradient, parameter.grad, atol=1e-6)
+    assert all(p.grad is None or not p.grad.any() for p in model.parameters())
+
+def test_step_makes_a_smaller_step_of_the_batches_left():
+    torch.manual_seed(0)
+    model = BagOfEmbeddings()
+    steps = []
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+    accumulator = GradientAccumulator(optimizer, model, 3, clip=lambda model: steps.append(accumulator.batches))
+    text, label = examples()
+    for batch in uneven_batches(text, label):
+        accumulator.backward(F.cross_entropy(model(batch.content[0]), batch.label), len(batch))
+    accumulator.step()
+    accumulator.step()
+    assert steps == [3, 1]
+
+def test_steps_have_to_be_positive():
+    with pytest.raises(ValueError):
+        GradientAccumulator(torch.optim.SGD(BagOfEmbeddings().parameters(), lr=0.1), BagOfEmbeddings(), 0)
+
+@pytest.mark.skipif(torch.cuda.is_available(), reason='train_model moves the model to the GPU when there is one')
+def test_training_handler_step_equals_one_large_batch(tmp_path, monkeypatch):
+    handler = output_handler.OutputHandler(str(tmp_path / 'output.txt'))
+    monkeypatch.setattr(output_handler, 'outputFileHandler', handler)
+    torch.manual_seed(0)
+    accumulated = BagOfEmbeddings()
+    large = copy.deepcopy(accumulated)
+    text, label = examples()
+    for model, batches, steps in [(accumulated, uneven_batches(text, label), len(SIZES)), (large, [Batch(text, label)], 1)]:
+        optimizer = torch.optim.SGD(model.parameters(), lr=0.5)
+        TrainingHandler(optimizer, F.cross_entropy, accumulation_steps=steps).train_model(model, batches, 0)
+    handler.close()
+    for accumulated_parameter, large_parameter in zip(accumulated.parameters(), large.parameters()):
+        assert torch.allclose(accumulated_parameter, large_parameter, atol=1e-6)
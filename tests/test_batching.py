@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from dataset.batching import TokenBudgetBatchSampler
+
+def document_lengths(count=500, seed=0):
+    return np.random.RandomState(seed).lognormal(np.log(40), 0.8, count).astype(np.int64) + 1
+
+def padded_tokens(lengths, batches):
+    return sum(len(batch) * lengths[batch].max() for batch in batches)
+
+def test_every_document_is_batched_once():
+    lengths = document_lengths()
+    batches = list(TokenBudgetBatchSampler(lengths, max_tokens=400, bucket_size=100))
+    assert sorted(index for batch in batches for index in batch) == list(range(len(lengths)))
+
+@pytest.mark.parametrize('max_tokens', [50, 400, 2000])
+def test_batches_stay_within_the_token_budget(max_tokens):
+    lengths = document_lengths()
+    for batch in TokenBudgetBatchSampler(lengths, max_tokens=max_tokens, bucket_size=100):
+        # a document longer than the budget gets a batch of its own
+        assert len(batch) * lengths[batch].max() <= max_tokens or len(batch) == 1
+
+def test_batch_size_without_a_budget():
+    lengths = document_lengths(103)
+    batches = list(TokenBudgetBatchSampler(lengths, batch_size=10, bucket_size=1000))
+    assert sorted(len(batch) for batch in batches) == [3] + [10] * 10
+
+def test_padding_ratio_is_that_of_the_planned_batches():
+    lengths = document_lengths()
+    sampler = TokenBudgetBatchSampler(lengths, max_tokens=400, bucket_size=100)
+    batches = list(sampler)
+    assert sampler.padding_ratio == pytest.approx(1 - lengths.sum() / padded_tokens(lengths, batches))
+
+def test_len_plans_the_batches_that_are_iterated():
+    lengths = document_lengths()
+    sampler = TokenBudgetBatchSampler(lengths, max_tokens=400, bucket_size=100)
+    assert len(sampler) == len(list(sampler))
+
+def test_sorting_by_length_pads_less_than_random_batches():
+    lengths = document_lengths()
+    sampler = TokenBudgetBatchSampler(lengths, batch_size=16)
+    list(sampler)
+    random_batches = np.array_split(np.random.RandomState(1).permutation(len(lengths)), len(lengths) // 16)
+    assert sampler.padding_ratio < 1 - lengths.sum() / padded_tokens(lengths, random_batches)
+
+def test_either_a_budget_or_a_batch_size():
+    with pytest.raises(ValueError):
+        TokenBudgetBatchSampler([1, 2, 3])
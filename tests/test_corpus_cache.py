@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KEY_SCRIPT = '''
+import os
+from dataset.corpus_cache import files_key, tokenizer_fingerprint
+from dataset.tokenization import extract_words
+print(tokenizer_fingerprint(extract_words), files_key([os.path.join('dataset', 'corpus_cache.py')], extract_words))
+'''
+
+def run_in_new_process(script, hash_seed):
+    # a new interpreter, with its own memory layout and string hash seed, like a later run of the trainers
+    env = dict(os.environ, PYTHONHASHSEED=str(hash_seed))
+    return subprocess.run([sys.executable, '-c', script], cwd=REPO, env=env, check=True,
+                          stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+def test_cache_key_is_the_same_in_every_process():
+    first = run_in_new_process(KEY_SCRIPT, 1)
+    second = run_in_new_process(KEY_SCRIPT, 2)
+    assert first.split() and first == second
@@ -0,0 +1,33 @@
+import numpy as np
+import torch
+from gan.data import collate_fn
+
+def batch():
+    return [(np.array([5, 6, 7]), 1), (np.array([8]), 0), (np.array([9, 10, 11, 12, 13]), 3)]
+
+def test_batches_are_time_major():
+    token_seqs, next_token_seqs, importance_seqs, labels, seq_lengths, pad_length = collate_fn(batch())
+    assert pad_length == 5
+    assert token_seqs.shape == next_token_seqs.shape == importance_seqs.shape == (5, 3)
+    assert token_seqs.dtype == next_token_seqs.dtype == torch.long
+    assert importance_seqs.dtype == torch.float
+    assert seq_lengths.tolist() == [3, 1, 5]
+    assert labels.tolist() == [1, 0, 3]
+    # every column is a sequence followed by its padding
+    assert token_seqs[:, 0].tolist() == [5, 6, 7, 0, 0]
+    assert token_seqs[:, 1].tolist() == [8, 0, 0, 0, 0]
+    assert token_seqs[:, 2].tolist() == [9, 10, 11, 12, 13]
+
+def test_next_tokens_are_shifted_by_one_step():
+    token_seqs, next_token_seqs, importance_seqs, _, _, _ = collate_fn(batch())
+    assert torch.equal(next_token_seqs[:-1], token_seqs[1:])
+    assert next_token_seqs[-1].tolist() == [0, 0, 0]
+    # only the steps whose next token is a real one count in the language model loss
+    assert importance_seqs.t().tolist() == [[1, 1, 0, 0, 0], [0, 0, 0, 0, 0], [1, 1, 1, 1, 0]]
+
+def test_remap_applies_to_inputs_and_next_tokens():
+    remap = torch.arange(20) + 100
+    token_seqs, next_token_seqs, _, _, _, _ = collate_fn(batch(), remap=remap)
+    plain_tokens, plain_next, _, _, _, _ = collate_fn(batch())
+    assert torch.equal(token_seqs, remap[plain_tokens])
+    assert torch.equal(next_token_seqs, remap[plain_next])
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from dataset.length_policy import LengthPolicy
+
+DOCUMENT_LENGTHS = [0, 1, 9, 10, 11, 25]
+
+def document(length):
+    return np.arange(length, dtype=np.int64)
+
+def test_none_keeps_every_document():
+    policy = LengthPolicy.parse('none')
+    for length in DOCUMENT_LENGTHS:
+        [sequence] = policy.apply(document(length))
+        assert len(sequence) == length
+    assert policy.lengths(DOCUMENT_LENGTHS).tolist() == DOCUMENT_LENGTHS
+
+def test_truncate_keeps_the_head():
+    policy = LengthPolicy.parse('truncate:10')
+    [sequence] = policy.apply(document(25))
+    assert sequence.tolist() == list(range(10))
+    assert policy.lengths(DOCUMENT_LENGTHS).tolist() == [0, 1, 9, 10, 10, 10]
+
+def test_head_tail_keeps_both_ends():
+    policy = LengthPolicy.parse('head_tail:10:3')
+    [sequence] = policy.apply(document(25))
+    assert sequence.tolist() == [0, 1, 2] + list(range(18, 25))
+    [short] = policy.apply(document(9))
+    assert short.tolist() == list(range(9))
+    assert policy.lengths(DOCUMENT_LENGTHS).tolist() == [0, 1, 9, 10, 10, 10]
+
+def test_head_tail_defaults_to_a_quarter_head():
+    policy = LengthPolicy.parse('head_tail:12')
+    assert policy.head == 3
+    assert str(policy) == 'head_tail:12:3'
+
+@pytest.mark.parametrize('text', ['head_tail:10:10', 'head_tail:10:11', 'head_tail:10:-1', 'truncate', 'chunk:0', 'middle:10'])
+def test_invalid_policies_are_rejected(text):
+    with pytest.raises(ValueError):
+        LengthPolicy.parse(text)
+
+def test_chunk_splits_into_full_pieces():
+    policy = LengthPolicy.parse('chunk:10')
+    pieces = policy.apply(document(25))
+    assert [piece.tolist() for piece in pieces] == [list(range(10)), list(range(10, 20)), list(range(20, 25))]
+    assert policy.pieces(DOCUMENT_LENGTHS).tolist() == [1, 1, 1, 1, 2, 3]
+    assert policy.lengths(DOCUMENT_LENGTHS).tolist() == [0, 1, 9, 10, 10, 1, 10, 10, 5]
+
+@pytest.mark.parametrize('text', ['none', 'truncate:10', 'head_tail:10:3', 'chunk:10'])
+def test_lengths_match_apply(text):
+    policy = LengthPolicy.parse(text)
+    applied = [len(sequence) for length in DOCUMENT_LENGTHS for sequence in policy.apply(document(length))]
+    assert policy.lengths(DOCUMENT_LENGTHS).tolist() == applied
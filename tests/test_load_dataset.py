@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip('mongomock')
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# fills an in-memory collection with the first n documents and syncs the corpus cache of the working directory
+SYNC_SCRIPT = '''
+import sys
+sys.path.insert(0, {repo!r})
+import mongomock
+import mongomock.database
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from torchtext import data
+from dataset.load_dataset import sync_corpus
+from dataset.tokenization import extract_words
+
+def no_commands(*args, **kwargs):
+    raise OperationFailure('not supported')
+mongomock.database.Database.command = no_commands
+
+collection = mongomock.MongoClient().fake_news.fake_news_corpus
+for i in range(int(sys.argv[1])):
+    collection.insert_one({{'_id': ObjectId('%024x' % (i + 1)), 'content': 'article %d about topic %d' % (i, i % 7), 'label': ['fake', 'reliable'][i % 2]}})
+TEXT = data.Field(sequential=True, tokenize=extract_words, lower=True, include_lengths=True, batch_first=True)
+LABEL = data.LabelField()
+cache = sync_corpus(collection, TEXT, LABEL)
+print('documents', cache.meta()['documents'])
+'''
+
+def sync_in_new_process(directory, documents):
+    script = SYNC_SCRIPT.format(repo=REPO)
+    return subprocess.run([sys.executable, '-c', script, str(documents)], cwd=directory, check=True,
+                          stdout=subprocess.PIPE, universal_newlines=True).stdout
+
+def test_later_runs_only_tokenize_the_new_documents(tmp_path):
+    first = sync_in_new_process(str(tmp_path), 40)
+    assert 'Saved tokenized corpus' in first and 'documents 40' in first
+    second = sync_in_new_process(str(tmp_path), 55)
+    assert 'Appended 15 documents' in second and 'documents 55' in second
+    third = sync_in_new_process(str(tmp_path), 55)
+    assert 'Loading tokenized corpus' in third and 'documents 55' in third
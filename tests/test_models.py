@@ -0,0 +1,78 @@
+import pytest
+import torch
+import torch.nn as nn
+from model.cnn_model import CNN
+from model.gru_attention_model import GRUAttentionModel
+from model.gru_model import GRUClassifier
+from model.logistic_regression_model import LogisticRegressionModel
+from model.lstm_attention_model import AttentionModel
+from model.lstm_model import LSTMClassifier
+from model.packing import run_packed
+from model.rcnn_model import RCNN
+from model.rnn_attn_model import RNNAttentionModel
+from model.rnn_model import RNN
+from model.rnn_model_bidirectional import BiRNN
+
+VOCAB_SIZE = 50
+EMBEDDING_LENGTH = 8
+HIDDEN_SIZE = 6
+OUTPUT_SIZE = 3
+PAD = 1
+
+RECURRENT_MODELS = [LSTMClassifier, GRUClassifier, RNN, BiRNN, RCNN, AttentionModel, RNNAttentionModel, GRUAttentionModel]
+
+def build(model_class):
+    weights = torch.randn(VOCAB_SIZE, EMBEDDING_LENGTH)
+    if model_class is CNN:
+        return CNN(OUTPUT_SIZE, 1, 4, [3, 5, 7], 1, [1, 2, 3], 0, VOCAB_SIZE, EMBEDDING_LENGTH, weights)
+    if model_class is LogisticRegressionModel:
+        return LogisticRegressionModel(OUTPUT_SIZE, VOCAB_SIZE, EMBEDDING_LENGTH, weights)
+    return model_class(OUTPUT_SIZE, HIDDEN_SIZE, VOCAB_SIZE, EMBEDDING_LENGTH, weights)
+
+def padded_batch(lengths):
+    # a batch-first batch like the loaders build, padded with the padding index after every document
+    lengths = torch.tensor(lengths)
+    text = torch.randint(2, VOCAB_SIZE, (len(lengths), int(lengths.max())))
+    text[torch.arange(text.size(1)).unsqueeze(0) >= lengths.unsqueeze(1)] = PAD
+    return text, lengths
+
+@pytest.mark.parametrize('model_class', RECURRENT_MODELS + [CNN, LogisticRegressionModel])
+@pytest.mark.parametrize('lengths', [[9], [9, 1, 5, 7, 2, 9, 6]])
+def test_forward_takes_any_batch_size(model_class, lengths):
+    torch.manual_seed(0)
+    model = build(model_class).eval()
+    text, lengths = padded_batch(lengths)
+    with torch.no_grad():
+        padded = model(text)
+        packed = model(text, lengths=lengths)
+    assert padded.shape == packed.shape == (len(lengths), OUTPUT_SIZE)
+    assert torch.isfinite(packed).all()
+
+@pytest.mark.parametrize('rnn_class', [nn.LSTM, nn.GRU, nn.RNN])
+def test_run_packed_matches_the_trimmed_sequences(rnn_class):
+    torch.manual_seed(0)
+    rnn = rnn_class(EMBEDDING_LENGTH, HIDDEN_SIZE, bidirectional=True)
+    lengths = torch.tensor([3, 7, 1, 5])
+    input = torch.randn(7, len(lengths), EMBEDDING_LENGTH)
+    h_0 = torch.zeros(2, len(lengths), HIDDEN_SIZE)
+    states = (h_0, torch.zeros_like(h_0)) if rnn_class is nn.LSTM else h_0
+    output, final = run_packed(rnn, input, states, lengths)
+    final = final[0] if rnn_class is nn.LSTM else final
+    for i, length in enumerate(lengths.tolist()):
+        # every document alone, without any padding
+        single = (h_0[:, i:i + 1], torch.zeros_like(h_0[:, i:i + 1])) if rnn_class is nn.LSTM else h_0[:, i:i + 1]
+        expected_output, expected_final = rnn(input[:length, i:i + 1], single)
+        expected_final = expected_final[0] if rnn_class is nn.LSTM else expected_final
+        assert torch.allclose(output[:length, i], expected_output[:, 0], atol=1e-6)
+        assert torch.allclose(final[:, i], expected_final[:, 0], atol=1e-6)
+        assert (output[length:, i] == 0).all()
+
+@pytest.mark.parametrize('model_class', [AttentionModel, RNNAttentionModel, GRUAttentionModel, RCNN])
+def test_output_ignores_appended_padding(model_class):
+    torch.manual_seed(0)
+    model = build(model_class).eval()
+    text, lengths = padded_batch([4, 9, 2, 6])
+    longer = torch.full((text.size(0), text.size(1) + 5), PAD, dtype=text.dtype)
+    longer[:, :text.size(1)] = text
+    with torch.no_grad():
+        assert torch.allclose(model(text, lengths=lengths), model(longer, lengths=lengths), atol=1e-6)
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import pytest
+from dataset.near_duplicates import NearDuplicateIndex, band_keys, lsh_fields, minhash, shingles, similarity
+
+mongomock = pytest.importorskip('mongomock')
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def article(seed, words=200):
+    return ' '.join('w%d' % word for word in np.random.RandomState(seed).randint(0, 5000, words))
+
+def jaccard(first, second):
+    first, second = shingles(first), shingles(second)
+    return len(first & second) / len(first | second)
+
+def edited(content, changes, seed=0):
+    # replaces every changes-th word, which changes about 5 shingles for each
+    words = content.split()
+    for i in range(np.random.RandomState(seed).randint(changes), len(words), changes):
+        words[i] = 'edit%d' % i
+    return ' '.join(words)
+
+@pytest.mark.parametrize('changes', [10, 20, 50])
+def test_minhash_estimates_the_jaccard_similarity(changes):
+    original = article(1)
+    copy = edited(original, changes)
+    estimate = similarity(minhash(original), minhash(copy))
+    # the standard error of an estimate from 128 minima is at most 0.045
+    assert abs(estimate - jaccard(original, copy)) < 0.15
+
+def test_similarity_of_copies_and_unrelated_articles():
+    original = article(1)
+    assert similarity(minhash(original), minhash(original.upper() + ' ')) == 1.0
+    assert similarity(minhash(original), minhash(article(2))) < 0.1
+
+def test_no_signature_without_words():
+    assert minhash('') is None
+    assert minhash(' !? ') is None
+    assert lsh_fields('') == {}
+
+def test_band_keys_differ_between_bands():
+    signature = np.zeros(128, dtype=np.uint32)
+    assert len(set(band_keys(signature))) == len(band_keys(signature))
+
+def stored(content, **fields):
+    return dict(fields, content=content, **lsh_fields(content))
+
+def test_index_matches_stored_and_added_documents():
+    collection = mongomock.MongoClient().fake_news.fake_news_corpus
+    original = article(1)
+    collection.insert_one(stored(original, source_id='a'))
+    index = NearDuplicateIndex(collection)
+    batch = [stored(edited(original, 100), source_id='b'), stored(article(2), source_id='c'), stored(article(2) + ' more', source_id='d')]
+    index.load(batch)
+    assert index.match(batch[0])['source_id'] == 'a'
+    assert index.match(batch[1]) is None
+    index.add(batch[1])
+    # documents of the same batch are checked against each other once added
+    assert index.match(batch[2])['source_id'] == 'c'
+    assert index.match(stored('')) is None
+
+def test_deduplicate_keeps_the_first_copy_in_file_order(monkeypatch):
+    monkeypatch.syspath_prepend(os.path.join(REPO, 'dataset'))
+    save_dataset = pytest.importorskip('save_dataset')
+    monkeypatch.setattr(save_dataset, 'MAX_LINE_COUNT', 2)
+    collection = mongomock.MongoClient().fake_news.fake_news_corpus
+    index = NearDuplicateIndex(collection)
+    first, second, third = article(1), article(2), article(3)
+    documents = [stored(first, label='fake', source_id='1'),
+                 stored(edited(first, 100), label='reliable', source_id='2'),
+                 stored(second, label='fake', source_id='3'),
+                 stored(third, label='fake', source_id='4'),
+                 stored(third, label='reliable', source_id='5')]
+    counts = {'fake': 0, 'reliable': 0}
+    batch, duplicates = save_dataset.deduplicate(index, documents, counts)
+    # the edited copy is dropped whatever its label, and the third fake article is over the quota of 2
+    assert [document['source_id'] for document in batch] == ['1', '3', '5']
+    assert counts == {'fake': 2, 'reliable': 1}
+    assert duplicates == {'fake': 0, 'reliable': 1}
+
+def test_deduplicate_counts_documents_of_an_interrupted_run(monkeypatch):
+    monkeypatch.syspath_prepend(os.path.join(REPO, 'dataset'))
+    save_dataset = pytest.importorskip('save_dataset')
+    collection = mongomock.MongoClient().fake_news.fake_news_corpus
+    content = article(1)
+    collection.insert_one(stored(content, label='fake', source_id='1'))
+    index = NearDuplicateIndex(collection)
+    counts = {'fake': 0}
+    batch, duplicates = save_dataset.deduplicate(index, [stored(content, label='fake', source_id='1')], counts)
+    assert batch == [] and counts == {'fake': 1} and duplicates == {'fake': 0}
@@ -0,0 +1,85 @@
+import pytest
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import output_handler
+from metrics import metrics_handler
+from precision import BFLOAT16, FLOAT32, autocast, delta_report
+from training_handler import TrainingHandler
+
+class Batch():
+    def __init__(self, text, label):
+        self.content = (text, torch.full((text.size(0),), text.size(1), dtype=torch.long))
+        self.label = label
+
+    def __len__(self):
+        return self.label.size(0)
+
+class RecordingModel(nn.Module):
+    # a bag of embeddings that records the dtype of every forward pass
+    def __init__(self):
+        super(RecordingModel, self).__init__()
+        self.embedding = nn.Embedding(20, 8)
+        self.label = nn.Linear(8, 3)
+        self.dtypes = []
+
+    def forward(self, text, lengths=None):
+        output = self.label(self.embedding(text).mean(1))
+        self.dtypes.append(output.dtype)
+        return output
+
+def test_float32_runs_as_is():
+    with autocast(FLOAT32, 'cpu'):
+        assert nn.Linear(4, 2)(torch.randn(3, 4)).dtype == torch.float32
+
+def test_bfloat16_autocasts_the_matrix_products():
+    layer = nn.Linear(4, 2)
+    with autocast(BFLOAT16, torch.device('cpu')):
+        assert layer(torch.randn(3, 4)).dtype == torch.bfloat16
+    assert layer.weight.dtype == torch.float32
+
+def test_unknown_precision_is_rejected():
+    with pytest.raises(ValueError):
+        autocast('float16', 'cpu')
+
+def test_delta_report():
+    assert delta_report(BFLOAT16, 45, 46, 50) == 'bfloat16 accuracy 90.00%, float32 accuracy 92.00%, delta -2.00 points'
+    assert delta_report(BFLOAT16, 0, 0, 0) == 'bfloat16 accuracy 0.00%, float32 accuracy 0.00%, delta +0.00 points'
+
+@pytest.fixture
+def handlers(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_handler, 'metricsHandler', metrics_handler.MetricsHandler())
+    log = tmp_path / 'output.txt'
+    handler = output_handler.OutputHandler(str(log))
+    monkeypatch.setattr(output_handler, 'outputFileHandler', handler)
+    yield handler
+    handler.close()
+
+def written(handler):
+    handler.fileDescriptor.seek(0)
+    return handler.fileDescriptor.read()
+
+def evaluation(precision, compare_float32):
+    torch.manual_seed(0)
+    model = RecordingModel()
+    batches = [Batch(torch.randint(0, 20, (size, 6)), torch.randint(0, 3, (size,))) for size in (4, 3)]
+    handler = TrainingHandler(None, F.cross_entropy, precision=precision)
+    loss, accuracy = handler.eval_model(model, batches, compare_float32=compare_float32)
+    return model.dtypes, accuracy
+
+@pytest.mark.skipif(torch.cuda.is_available(), reason='eval_model moves the model to the GPU when there is one')
+def test_bfloat16_test_pass_is_compared_with_float32(handlers, capsys):
+    dtypes, accuracy = evaluation(BFLOAT16, compare_float32=True)
+    # every batch runs in bfloat16 and again in float32
+    assert dtypes == [torch.bfloat16, torch.float32] * 2
+    report = capsys.readouterr().out
+    assert report.startswith('bfloat16 accuracy %.2f%%, float32 accuracy' % accuracy)
+    assert written(handlers) == report
+
+@pytest.mark.skipif(torch.cuda.is_available(), reason='eval_model moves the model to the GPU when there is one')
+@pytest.mark.parametrize('precision, compare_float32', [(BFLOAT16, False), (FLOAT32, True), (FLOAT32, False)])
+def test_other_passes_run_once(handlers, capsys, precision, compare_float32):
+    dtypes, _ = evaluation(precision, compare_float32)
+    assert dtypes == [torch.bfloat16 if precision == BFLOAT16 else torch.float32] * 2
+    assert capsys.readouterr().out == ''
+    assert written(handlers) == ''
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from dataset.splits import stratified_split, segmented_split, split_manifest
+
+RATIOS = [('train', 0.7), ('valid', 0.1), ('test', 0.2)]
+
+def corpus_labels(count=2000, seed=0):
+    # unbalanced labels, like the fake and real news of a collection
+    return np.random.RandomState(seed).choice(['fake', 'real', 'satire'], count, p=[0.6, 0.3, 0.1])
+
+def test_same_seed_same_split():
+    labels = corpus_labels()
+    first = stratified_split(labels, RATIOS, seed=7)
+    second = stratified_split(labels, RATIOS, seed=7)
+    other = stratified_split(labels, RATIOS, seed=8)
+    for name, _ in RATIOS:
+        assert np.array_equal(first[name], second[name])
+    assert not np.array_equal(first['train'], other['train'])
+
+def test_splits_partition_the_rows_in_corpus_order():
+    labels = corpus_labels()
+    splits = stratified_split(labels, RATIOS)
+    rows = np.concatenate([splits[name] for name, _ in RATIOS])
+    assert sorted(rows.tolist()) == list(range(len(labels)))
+    for name, _ in RATIOS:
+        assert np.all(np.diff(splits[name]) > 0)
+
+def test_label_proportions_are_kept():
+    labels = corpus_labels()
+    splits = stratified_split(labels, RATIOS)
+    for label in np.unique(labels):
+        total = np.sum(labels == label)
+        for name, fraction in RATIOS:
+            # every split gets its fraction of every label, up to rounding
+            assert abs(np.sum(labels[splits[name]] == label) - fraction * total) <= 1
+
+def test_appended_rows_keep_the_split_of_the_old_rows():
+    labels = corpus_labels()
+    old = stratified_split(labels[:1500], RATIOS)
+    grown = segmented_split(labels, RATIOS, segments=[1500, 2000])
+    for name, _ in RATIOS:
+        assert np.array_equal(grown[name][grown[name] < 1500], old[name])
+
+def test_manifest_is_computed_once(tmp_path):
+    labels = corpus_labels()
+    first = split_manifest(labels, RATIOS, directory=str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+    second = split_manifest(labels, RATIOS, directory=str(tmp_path))
+    for name, _ in RATIOS:
+        assert np.array_equal(first[name], second[name])
@@ -0,0 +1,73 @@
+from collections import Counter
+import pytest
+from torchtext import data
+from dataset.tokenization import build_field_vocab
+from dataset.vocab_pruning import VocabLimits, prune_dictionary, prune_field_vocab
+from gan.data import Dictionary
+
+# a word to frequency mapping with ties, 100 tokens in all
+COUNTS = {'the': 40, 'news': 20, 'fake': 20, 'vaccine': 10, 'hoax': 5, 'moon': 2, 'landing': 2, 'zebra': 1}
+
+def test_no_limits_keep_every_word():
+    limits = VocabLimits()
+    assert not limits
+    assert str(limits) == 'none'
+    assert limits.kept(COUNTS) == ['the', 'fake', 'news', 'vaccine', 'hoax', 'landing', 'moon', 'zebra']
+
+def test_min_freq_drops_the_rare_words():
+    assert VocabLimits(min_freq=2).kept(COUNTS) == ['the', 'fake', 'news', 'vaccine', 'hoax', 'landing', 'moon']
+    assert VocabLimits(min_freq=10).kept(COUNTS) == ['the', 'fake', 'news', 'vaccine']
+    assert VocabLimits(min_freq=41).kept(COUNTS) == []
+
+def test_max_size_keeps_the_most_frequent_words():
+    # ties are broken alphabetically, as in torchtext's Vocab
+    assert VocabLimits(max_size=2).kept(COUNTS) == ['the', 'fake']
+    assert VocabLimits(max_size=100).kept(COUNTS) == VocabLimits().kept(COUNTS)
+
+def test_coverage_keeps_the_fewest_words_that_cover_the_tokens():
+    assert VocabLimits(coverage=0.8).kept(COUNTS) == ['the', 'fake', 'news']
+    assert VocabLimits(coverage=0.81).kept(COUNTS) == ['the', 'fake', 'news', 'vaccine']
+    assert VocabLimits(coverage=1.0).kept(COUNTS) == VocabLimits().kept(COUNTS)
+
+def test_all_limits_apply():
+    limits = VocabLimits(min_freq=5, max_size=3, coverage=0.95)
+    assert limits.kept(COUNTS) == ['the', 'fake', 'news']
+    assert str(limits) == 'min_freq=5, max_size=3, coverage=0.95'
+
+@pytest.mark.parametrize('arguments', [{'min_freq': 0}, {'max_size': 0}, {'coverage': 0}, {'coverage': 1.5}])
+def test_invalid_limits_are_rejected(arguments):
+    with pytest.raises(ValueError):
+        VocabLimits(**arguments)
+
+def test_pruned_field_vocab_maps_the_dropped_words_to_unk():
+    field = data.Field(sequential=True, lower=True, include_lengths=True, batch_first=True)
+    build_field_vocab(field, Counter(COUNTS))
+    full, remap = prune_field_vocab(field, VocabLimits(min_freq=10))
+    assert len(full) == len(COUNTS) + 2
+    assert field.vocab.itos == ['<unk>', '<pad>', 'the', 'fake', 'news', 'vaccine']
+    unk = field.vocab.stoi['<unk>']
+    for word, index in full.stoi.items():
+        expected = field.vocab.stoi[word] if word in field.vocab.itos else unk
+        assert remap[index] == expected
+    # the dropped words were looked up with get(), so the pruned stoi did not grow
+    assert len(field.vocab.stoi) == len(field.vocab.itos)
+
+def test_field_without_limits_is_not_remapped():
+    field = data.Field(sequential=True)
+    build_field_vocab(field, Counter(COUNTS))
+    full, remap = prune_field_vocab(field, VocabLimits())
+    assert remap is None and field.vocab is full
+
+def test_pruned_dictionary_keeps_the_ids_in_order():
+    dictionary = Dictionary()
+    dictionary.update(COUNTS)
+    remap, size = prune_dictionary(dictionary, VocabLimits(max_size=3))
+    # the kept words keep the order of the dictionary and one last id stands for all the others
+    assert size == 4
+    assert [int(remap[dictionary.word2idx[word]]) for word in ['the', 'news', 'fake']] == [0, 1, 2]
+    assert all(int(remap[dictionary.word2idx[word]]) == 3 for word in ['vaccine', 'hoax', 'moon', 'landing', 'zebra'])
+
+def test_dictionary_without_limits_is_not_remapped():
+    dictionary = Dictionary()
+    dictionary.update(COUNTS)
+    assert prune_dictionary(dictionary, VocabLimits()) == (None, len(COUNTS))
@@ -1,77 +1,127 @@
+import copy
 import torch
 from torch.autograd import Variable
 from metrics import metrics_handler
+import output_handler
 import env_settings
+from dataset.shards import distributed_rank
+from precision import FLOAT32, autocast, delta_report
+from accumulation import GradientAccumulator
 
 class TrainingHandler():
-    def __init__(self, optimizer, loss_fn, batch_size):
+    def __init__(self, optimizer, loss_fn, precision=None, accumulation_steps=None):
         self.optimizer = optimizer
         self.loss_fn = loss_fn
-        self.batch_size = batch_size
+        # precision of the forward passes, see precision.py, set by main.py --precision
+        self.precision = precision or env_settings.PRECISION
+        # batches whose gradients are summed before every optimizer step, set by main.py --accumulation_steps
+        self.accumulation_steps = accumulation_steps or env_settings.ACCUMULATION_STEPS
+        self.best_model = None
+
+    def save_model(self, model, path):
+        # the ranks of a distributed job train models of their own, only rank 0 writes its model and the others keep theirs in memory
+        if distributed_rank()[0] == 0:
+            torch.save(model, path)
+        else:
+            self.best_model = copy.deepcopy(model)
+
+    def load_model(self, path):
+        if distributed_rank()[0] == 0:
+            return torch.load(path)
+        return self.best_model
 
     def clip_gradient(self, model, clip_value):
         params = list(filter(lambda p: p.grad is not None, model.parameters()))
         for p in params:
             p.grad.data.clamp_(-clip_value, clip_value)
-        
+
     def train_model(self, model, train_iter, epoch):
+        # batches differ in size, so loss and accuracy are averaged over examples rather than batches
         total_epoch_loss = 0
-        total_epoch_acc = 0
+        total_epoch_corrects = 0
+        total_examples = 0
+        total_tokens = 0
+        total_padded_tokens = 0
         if torch.cuda.is_available():
             model.cuda(env_settings.CUDA_DEVICE)
         steps = 0
         model.train()
+        if hasattr(train_iter, 'set_epoch'):
+            # a sharded loader deals its shards to the ranks in a new order every epoch
+            train_iter.set_epoch(epoch)
+        # batches differ in size, so their gradients are summed over the examples and averaged before every step
+        accumulator = GradientAccumulator(self.optimizer, model, self.accumulation_steps, clip=lambda model: self.clip_gradient(model, 1e-1))
         for idx, batch in enumerate(train_iter):
-            text = batch.content[0]
+            text, lengths = batch.content
             target = batch.label
             target = torch.autograd.Variable(target).long()
             if torch.cuda.is_available():
                 text = text.cuda(env_settings.CUDA_DEVICE)
                 target = target.cuda(env_settings.CUDA_DEVICE)
-            if (text.size()[0] is not self.batch_size):
-                continue
-            self.optimizer.zero_grad()
-            prediction = model(text)
+            # the recurrent models skip the padding of every sequence, see model/packing.py
+            with autocast(self.precision, text.device):
+                prediction = model(text, lengths=lengths)
+            # the loss and its gradient are computed in float32
+            prediction = prediction.float()
             loss = self.loss_fn(prediction, target)
             num_corrects = (torch.max(prediction, 1)[1].view(target.size()).data == target.data).float().sum()
             acc = 100.0 * num_corrects/len(batch)
-            loss.backward()
-            self.clip_gradient(model, 1e-1)
-            self.optimizer.step()
+            accumulator.backward(loss, len(batch))
             steps += 1
             
             if steps % 100 == 0:
                 print (f'Epoch: {epoch+1}, Idx: {idx+1}, Training Loss: {loss.item():.4f}, Training Accuracy: {acc.item(): .2f}%')
             
-            total_epoch_loss += loss.item()
-            total_epoch_acc += acc.item()
-            
-        return total_epoch_loss/len(train_iter), total_epoch_acc/len(train_iter)
+            total_epoch_loss += loss.item() * len(batch)
+            total_epoch_corrects += num_corrects.item()
+            total_examples += len(batch)
+            total_tokens += int(lengths.sum())
+            total_padded_tokens += text.numel()
+        # the last batches of the epoch make a smaller step of their own
+        accumulator.step()
+
+        # every rank of a distributed job trains a model of its own on its shards, so the totals are its own
+        padding_ratio = 100.0 * (1 - total_tokens / max(total_padded_tokens, 1))
+        print(f'Epoch: {epoch+1:02}, Padding: {padding_ratio:.2f}% of {total_padded_tokens} batch tokens')
+        output_handler.outputFileHandler.write(f'Epoch: {epoch+1:02}, Padding: {padding_ratio:.2f}% of {total_padded_tokens} batch tokens\n')
+        return total_epoch_loss/max(total_examples, 1), 100.0 * total_epoch_corrects/max(total_examples, 1)
 
-    def eval_model(self, model, val_iter):
+    def eval_model(self, model, val_iter, compare_float32=False):
+        # compare_float32 runs every batch in float32 as well, to report what a lower precision costs in accuracy;
+        # it doubles the cost of the pass, so the trainers only ask for it on the final test pass
+        compare_float32 = compare_float32 and self.precision != FLOAT32
         total_epoch_loss = 0
-        total_epoch_acc = 0
+        total_epoch_corrects = 0
+        total_float32_corrects = 0
+        total_examples = 0
         model.eval()
         if torch.cuda.is_available():
             model.cuda(env_settings.CUDA_DEVICE)
         with torch.no_grad():
             for idx, batch in enumerate(val_iter):
-                text = batch.content[0]
-                if (text.size()[0] is not self.batch_size):
-                    continue
+                text, lengths = batch.content
                 target = batch.label
                 target = torch.autograd.Variable(target).long()
                 if torch.cuda.is_available():
                     text = text.cuda(env_settings.CUDA_DEVICE)
                     target = target.cuda(env_settings.CUDA_DEVICE)
-                prediction = model(text)
+                with autocast(self.precision, text.device):
+                    prediction = model(text, lengths=lengths)
+                prediction = prediction.float()
                 loss = self.loss_fn(prediction, target)
+                if compare_float32:
+                    reference = model(text, lengths=lengths)
+                    total_float32_corrects += (torch.max(reference, 1)[1].view(target.size()) == target).sum().item()
                 predictedLabel = torch.max(prediction, 1)[1].view(target.size()).data
                 for i in range(list(predictedLabel.size())[0]):
                     metrics_handler.metricsHandler.update((predictedLabel.data)[i].item(), (target.data)[i].item())
                 num_corrects = (torch.max(prediction, 1)[1].view(target.size()).data == target.data).sum()
-                acc = 100.0 * num_corrects/len(batch)
-                total_epoch_loss += loss.item()
-                total_epoch_acc += acc.item()
+                total_epoch_loss += loss.item() * len(batch)
+                total_epoch_corrects += num_corrects.item()
+                total_examples += len(batch)
 
-        return total_epoch_loss/len(val_iter), total_epoch_acc/len(val_iter)
\ No newline at end of file
+        if compare_float32:
+            report = delta_report(self.precision, total_epoch_corrects, total_float32_corrects, total_examples)
+            print(report)
+            output_handler.outputFileHandler.write(report + '\n')
+        return total_epoch_loss/max(total_examples, 1), 100.0 * total_epoch_corrects/max(total_examples, 1)
\ No newline at end of file